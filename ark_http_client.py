@@ -0,0 +1,173 @@
+"""
+豆包（火山方舟 Ark）共享HTTP传输
+进程内复用一个 httpx.AsyncClient：长连接保活，安装了 h2 时启用HTTP/2，连接池上限可配置；
+超时分为建连、读取（流式相邻数据块之间）和首token（从发出请求到收到第一行SSE数据）三段
+"""
+
+import os
+import time
+import asyncio
+import importlib.util
+from collections import Counter
+from typing import AsyncGenerator, Optional
+import httpx
+from loguru import logger
+from tts_hedging import RollingLatencyStats
+
+
+class ArkHTTPError(RuntimeError):
+    """Ark接口返回非200状态码"""
+
+    def __init__(self, status_code: int, body: str):
+        super().__init__(f"Ark请求失败: {status_code} - {body[:200]}")
+        self.status_code = status_code
+        self.body = body
+
+
+class ArkTransport:
+    """共享的Ark HTTP客户端"""
+
+    def __init__(self, connect_timeout: Optional[float] = None, read_timeout: Optional[float] = None,
+                 first_token_timeout: Optional[float] = None, max_connections: Optional[int] = None,
+                 max_keepalive: Optional[int] = None, keepalive_expiry: Optional[float] = None,
+                 http2: Optional[bool] = None):
+        self.connect_timeout = connect_timeout or float(os.getenv("ARK_CONNECT_TIMEOUT", "5"))
+        self.read_timeout = read_timeout or float(os.getenv("ARK_READ_TIMEOUT", "30"))
+        # 深度思考模式下首token较慢，按需调大
+        self.first_token_timeout = first_token_timeout or float(os.getenv("ARK_FIRST_TOKEN_TIMEOUT", "20"))
+        self.max_connections = max_connections or int(os.getenv("ARK_HTTP_MAX_CONNECTIONS", "20"))
+        self.max_keepalive = max_keepalive or int(os.getenv("ARK_HTTP_MAX_KEEPALIVE", "10"))
+        self.keepalive_expiry = keepalive_expiry or float(os.getenv("ARK_HTTP_KEEPALIVE_EXPIRY", "60"))
+        if http2 is None:
+            http2 = os.getenv("ARK_HTTP2", "1") != "0" and importlib.util.find_spec("h2") is not None
+        self.http2 = http2
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self.first_token_latency = RollingLatencyStats()
+
+        # 统计信息
+        self.requests = 0
+        self.errors = 0
+        self.first_token_timeouts = 0
+        self.http_versions: Counter = Counter()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_keepalive,
+                                    keepalive_expiry=self.keepalive_expiry)
+            )
+        return self._client
+
+    async def post(self, url: str, headers: dict, payload: dict) -> httpx.Response:
+        """非流式请求（预热等），返回完整响应"""
+        self.requests += 1
+        try:
+            response = await self._get_client().post(url, headers=headers, json=payload)
+        except Exception:
+            self.errors += 1
+            raise
+        self.http_versions[response.http_version] += 1
+        return response
+
+    async def stream_chat(self, url: str, headers: dict, payload: dict) -> AsyncGenerator[str, None]:
+        """
+        流式请求，逐条返回SSE的data内容（不含 "data: " 前缀，收到 [DONE] 时结束）
+        非200状态码抛出ArkHTTPError；首token超时抛出TimeoutError
+        """
+        client = self._get_client()
+        request = client.build_request("POST", url, headers=headers, json=payload)
+        self.requests += 1
+        started = time.monotonic()
+
+        def first_token_budget() -> float:
+            return max(0.0, started + self.first_token_timeout - time.monotonic())
+
+        try:
+            response = await asyncio.wait_for(client.send(request, stream=True), first_token_budget())
+        except asyncio.TimeoutError:
+            self.first_token_timeouts += 1
+            raise TimeoutError(f"Ark首token超时（{self.first_token_timeout}s）")
+        except Exception:
+            self.errors += 1
+            raise
+
+        try:
+            self.http_versions[response.http_version] += 1
+            if response.status_code != 200:
+                self.errors += 1
+                body = await response.aread()
+                raise ArkHTTPError(response.status_code, body.decode('utf-8', errors='replace'))
+
+            lines = response.aiter_lines()
+            got_first = False
+            while True:
+                try:
+                    if got_first:
+                        line = await lines.__anext__()
+                    else:
+                        line = await asyncio.wait_for(lines.__anext__(), first_token_budget())
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    self.first_token_timeouts += 1
+                    raise TimeoutError(f"Ark首token超时（{self.first_token_timeout}s）")
+
+                if not line.startswith("data: "):
+                    continue
+                data = line[6:].strip()
+                if data == "[DONE]":
+                    # 读完响应剩余部分，连接才能回到连接池复用
+                    async for _ in lines:
+                        pass
+                    break
+                if not got_first:
+                    got_first = True
+                    self.first_token_latency.record(time.monotonic() - started)
+                yield data
+        finally:
+            await response.aclose()
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        p50 = self.first_token_latency.percentile(0.5)
+        p95 = self.first_token_latency.percentile(0.95)
+        return {
+            "http2": self.http2,
+            "max_connections": self.max_connections,
+            "requests": self.requests,
+            "errors": self.errors,
+            "first_token_timeouts": self.first_token_timeouts,
+            "http_versions": dict(self.http_versions),
+            "first_token_p50_ms": round(p50 * 1000) if p50 is not None else None,
+            "first_token_p95_ms": round(p95 * 1000) if p95 is not None else None
+        }
+
+
+_shared_transport: Optional[ArkTransport] = None
+
+
+def get_shared_ark_transport() -> ArkTransport:
+    """获取进程内共享的Ark HTTP传输（由环境变量配置）"""
+    global _shared_transport
+    if _shared_transport is None:
+        _shared_transport = ArkTransport()
+        logger.info(f"🌐 Ark HTTP传输: HTTP/2={'启用' if _shared_transport.http2 else '未启用'}, "
+                    f"连接上限 {_shared_transport.max_connections}, 建连 {_shared_transport.connect_timeout}s, "
+                    f"读取 {_shared_transport.read_timeout}s, 首token {_shared_transport.first_token_timeout}s")
+    return _shared_transport
+
+
+async def close_shared_ark_transport():
+    """关闭共享Ark HTTP传输（服务关闭时调用）"""
+    global _shared_transport
+    if _shared_transport is not None:
+        await _shared_transport.close()
+        _shared_transport = None
@@ -0,0 +1,210 @@
+"""
+讯飞ASR预建连接
+讯飞IAT每个连接只能跑一次识别会话，且连接建立后长时间不发数据会被服务端断开，因此不能像TTS那样复用连接；
+这里在最近有识别请求（或调用方预告即将识别）的一段时间内，保持少量已签名、已完成DNS+TLS+WebSocket握手的连接，
+超过最长空闲时间（远早于签名日期失效）就换新，识别请求取到现成连接后即可发送首帧
+新连接复用缓存的DNS解析结果和共享的SSLContext（证书只加载一次）
+"""
+
+import os
+import ssl
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional
+from urllib.parse import urlparse
+import websockets
+from loguru import logger
+
+
+class ASRConnectionPool:
+    """预建的一次性ASR连接"""
+
+    def __init__(self, client, size: Optional[int] = None, max_idle: Optional[float] = None,
+                 warm_window: Optional[float] = None, dns_ttl: Optional[float] = None,
+                 connect_timeout: float = 10.0):
+        self.client = client
+        self.size = int(os.getenv("XFYUN_ASR_POOL_SIZE", "1")) if size is None else size
+        # 讯飞在连接建立后约10s不发数据即断开，签名日期的有效期为5分钟，两者取前者并留余量
+        self.max_idle = max_idle or float(os.getenv("XFYUN_ASR_POOL_MAX_IDLE", "8"))
+        # 最近一次识别（或预热）之后保持预建连接的时长，空闲期不持续建连
+        self.warm_window = warm_window or float(os.getenv("XFYUN_ASR_POOL_WARM_WINDOW", "120"))
+        self.dns_ttl = dns_ttl or float(os.getenv("XFYUN_ASR_DNS_TTL", "300"))
+        self.connect_timeout = connect_timeout
+
+        self._ready: deque[tuple[object, float]] = deque()  # (websocket, 建立时间)
+        self._ssl_context = ssl.create_default_context()
+        self._dns: dict[tuple[str, int], tuple[str, float]] = {}
+        self._last_demand = 0.0
+        self._wakeup: Optional[asyncio.Event] = None  # 在事件循环内首次预热时创建
+        self._maintainer: Optional[asyncio.Task] = None
+        self._closing = False
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.opened = 0
+        self.expired = 0
+        self.failures = 0
+        self.dns_lookups = 0
+
+    async def _resolve(self, host: str, port: int) -> str:
+        """解析主机地址并缓存 dns_ttl 秒；解析失败时交给连接过程自行解析"""
+        cached = self._dns.get((host, port))
+        if cached and time.monotonic() - cached[1] < self.dns_ttl:
+            return cached[0]
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=ssl.SOCK_STREAM)
+        except OSError as e:
+            logger.warning(f"ASR域名解析失败: {e}")
+            return host
+        self.dns_lookups += 1
+        address = infos[0][4][0]
+        self._dns[(host, port)] = (address, time.monotonic())
+        return address
+
+    async def _open(self):
+        """签名并建立一个新连接（DNS用缓存，TLS用共享的SSLContext）"""
+        url = self.client._build_websocket_url()
+        parsed = urlparse(url)
+        port = parsed.port or (443 if parsed.scheme == "wss" else 80)
+        kwargs = {"host": await self._resolve(parsed.hostname, port), "port": port}
+        if parsed.scheme == "wss":
+            kwargs.update(ssl=self._ssl_context, server_hostname=parsed.hostname)
+        websocket = await asyncio.wait_for(websockets.connect(url, **kwargs), self.connect_timeout)
+        self.opened += 1
+        return websocket
+
+    def _fresh(self, connected_at: float) -> bool:
+        return time.monotonic() - connected_at < self.max_idle
+
+    def prewarm(self):
+        """预告即将识别（如用户按下录音键）：在 warm_window 内保持预建连接"""
+        if self.size <= 0 or self._closing:
+            return
+        self._last_demand = time.monotonic()
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._maintainer is None or self._maintainer.done():
+            self._maintainer = asyncio.create_task(self._maintain())
+        else:
+            self._wakeup.set()
+
+    async def acquire(self):
+        """取一个可立即发送首帧的连接，没有现成连接时当场建立"""
+        websocket = None
+        while self._ready:
+            candidate, connected_at = self._ready.popleft()
+            if self._fresh(connected_at) and not candidate.closed:
+                websocket = candidate
+                break
+            self.expired += 1
+            asyncio.ensure_future(candidate.close())
+        if len(self._ready) < self.size:
+            self.prewarm()  # 补充被取走的连接，并延长预建窗口
+
+        if websocket is not None:
+            self.hits += 1
+            return websocket
+        self.misses += 1
+        return await self._open()
+
+    @asynccontextmanager
+    async def connection(self):
+        """借用一个连接完成一次识别会话，结束后关闭（讯飞连接不可复用）"""
+        websocket = await self.acquire()
+        try:
+            yield websocket
+        finally:
+            await websocket.close()
+
+    async def _maintain(self):
+        """预建窗口内保持 size 个新鲜连接，窗口结束后关闭剩余连接"""
+        failures = 0
+        try:
+            while not self._closing and time.monotonic() - self._last_demand < self.warm_window:
+                # 丢弃过期或已被服务端断开的连接
+                for _ in range(len(self._ready)):
+                    websocket, connected_at = self._ready.popleft()
+                    if self._fresh(connected_at) and not websocket.closed:
+                        self._ready.append((websocket, connected_at))
+                    else:
+                        self.expired += 1
+                        asyncio.ensure_future(websocket.close())
+
+                while len(self._ready) < self.size and not self._closing:
+                    try:
+                        self._ready.append((await self._open(), time.monotonic()))
+                        failures = 0
+                    except Exception as e:
+                        self.failures += 1
+                        failures += 1
+                        logger.warning(f"ASR预建连接失败（第{failures}次）: {e}")
+                        break
+
+                # 等到最早的连接过期、被取走或失败退避结束
+                if failures:
+                    delay = min(30.0, 2 ** failures)
+                elif self._ready:
+                    delay = max(0.1, self._ready[0][1] + self.max_idle - time.monotonic())
+                else:
+                    delay = 1.0
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        except Exception as e:
+            logger.error(f"ASR预建连接维护异常: {e}")
+        finally:
+            while self._ready:
+                websocket, _ = self._ready.popleft()
+                await websocket.close()
+
+    async def close(self):
+        """停止预建并关闭所有预建连接"""
+        self._closing = True
+        if self._maintainer and not self._maintainer.done():
+            self._maintainer.cancel()
+            try:
+                await self._maintainer
+            except asyncio.CancelledError:
+                pass
+        while self._ready:
+            websocket, _ = self._ready.popleft()
+            await websocket.close()
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "ready": len(self._ready),
+            "warm": self._maintainer is not None and not self._maintainer.done(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "opened": self.opened,
+            "expired": self.expired,
+            "failures": self.failures,
+            "dns_lookups": self.dns_lookups
+        }
+
+
+# 进程内共享的预建连接，按鉴权信息区分
+_shared_pools: dict[tuple, ASRConnectionPool] = {}
+
+
+def get_shared_asr_pool(client) -> ASRConnectionPool:
+    """获取与客户端鉴权信息对应的共享预建连接池"""
+    key = (client.websocket_url, client.app_id, client.api_key)
+    pool = _shared_pools.get(key)
+    if pool is None or pool._closing:
+        pool = ASRConnectionPool(client)
+        _shared_pools[key] = pool
+    return pool
+
+
+async def close_shared_asr_pools():
+    """关闭所有共享预建连接池（服务关闭时调用）"""
+    for pool in list(_shared_pools.values()):
+        await pool.close()
+    _shared_pools.clear()
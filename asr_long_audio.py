@@ -0,0 +1,109 @@
+"""
+长录音分段并行识别
+讯飞IAT会话面向短语音，speech_to_text 在一个连接上顺序处理整段音频；长录音按VAD检测到的停顿切成不超过上限的片段，
+在多个会话上并发识别（限制并发数），再按原顺序拼接，并给出每段在原音频中的起止时间
+"""
+
+import os
+import time
+import asyncio
+from dataclasses import dataclass
+from typing import Optional
+from loguru import logger
+from asr_vad import VADConfig, collapse_pauses, find_speech_segments
+
+
+@dataclass
+class SpeechChunk:
+    """一个识别片段：原音频中的采样点范围，以及片段内要上传的范围（长停顿已压缩）"""
+    index: int
+    start: int
+    end: int
+    ranges: list[list[int]]
+
+    def pcm(self, view: memoryview) -> bytes:
+        return b''.join(view[start * 2:end * 2] for start, end in self.ranges)
+
+
+def plan_chunks(pcm, sample_rate: int, vad_config: Optional[VADConfig],
+                max_chunk_seconds: float) -> list[SpeechChunk]:
+    """
+    按停顿把音频切成片段：相邻语音段依次装入当前片段，装不下时在停顿处另起一段
+    单个语音段超过上限时按上限硬切；没有VAD或未检测到语音时按固定长度切分
+    """
+    total = len(pcm) // 2
+    max_len = int(sample_rate * max_chunk_seconds)
+    speech = find_speech_segments(pcm, sample_rate, vad_config) if vad_config else []
+    if not speech:
+        speech = [(0, total)]
+    max_pause = int(sample_rate * vad_config.max_pause_ms / 1000) if vad_config else 0
+
+    pieces = []
+    for start, end in speech:
+        while end - start > max_len:
+            pieces.append((start, start + max_len))
+            start += max_len
+        pieces.append((start, end))
+
+    groups = [[]]
+    group_len = 0
+    for start, end in pieces:
+        gap = min(start - groups[-1][-1][1], max_pause) if groups[-1] else 0
+        if groups[-1] and group_len + gap + (end - start) > max_len:
+            groups.append([])
+            group_len = gap = 0
+        groups[-1].append((start, end))
+        group_len += gap + end - start
+
+    return [SpeechChunk(index, group[0][0], group[-1][1], collapse_pauses(group, max_pause))
+            for index, group in enumerate(groups)]
+
+
+async def recognize_pcm(asr_client, pcm: bytes) -> tuple[str, bool]:
+    """
+    单个会话识别一段16kHz PCM（文件模式），返回 (识别文本, 是否因会话超时只得到部分结果)
+    识别出错时抛出RuntimeError
+    """
+    async def one_shot():
+        yield pcm
+
+    recognized_text = ""
+    async for result in asr_client.speech_to_text(one_shot()):
+        if result.get('error'):
+            raise RuntimeError(result['error'])
+        if result.get('text'):
+            recognized_text = result['text']
+        if result.get('is_final'):
+            return recognized_text, result.get('timed_out', False)
+    return recognized_text, False
+
+
+async def recognize_long_audio(asr_client, pcm, vad_config: Optional[VADConfig], sample_rate: int = 16000,
+                               max_chunk_seconds: Optional[float] = None,
+                               concurrency: Optional[int] = None) -> dict:
+    """
+    分段并行识别长录音
+    返回 {"text": 拼接后的全文, "segments": [{"index", "start", "end", "text", "timedOut"(, "error")}]}，时间单位为秒
+    """
+    max_chunk_seconds = max_chunk_seconds or float(os.getenv("ASR_SEGMENT_MAX_SECONDS", "20"))
+    concurrency = concurrency or int(os.getenv("ASR_SEGMENT_CONCURRENCY", "4"))
+    started = time.monotonic()
+    chunks = plan_chunks(pcm, sample_rate, vad_config, max_chunk_seconds)
+    view = memoryview(pcm)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def recognize_chunk(chunk: SpeechChunk) -> dict:
+        segment = {"index": chunk.index, "start": round(chunk.start / sample_rate, 2),
+                   "end": round(chunk.end / sample_rate, 2), "text": "", "timedOut": False}
+        async with semaphore:
+            try:
+                segment["text"], segment["timedOut"] = await recognize_pcm(asr_client, chunk.pcm(view))
+            except Exception as e:
+                logger.error(f"长录音片段#{chunk.index}（{segment['start']}s~{segment['end']}s）识别失败: {e}")
+                segment["error"] = str(e)
+        return segment
+
+    segments = await asyncio.gather(*(recognize_chunk(chunk) for chunk in chunks))
+    logger.info(f"✅ 长录音分段识别: {len(pcm) / 2 / sample_rate:.1f}s音频, {len(chunks)}段, "
+                f"并发{concurrency}, 用时{(time.monotonic() - started) * 1000:.0f}ms")
+    return {"text": ''.join(segment["text"] for segment in segments), "segments": segments}
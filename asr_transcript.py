@@ -0,0 +1,52 @@
+"""
+讯飞动态修正（dwa=wpgs）识别结果拼装
+每条结果带序号 sn；pgs=apd 表示追加，pgs=rpl 表示用本条替换 rg=[起, 止] 范围内的旧结果
+收到 apd 时此前的结果不会再被替换，可作为"稳定前缀"提前交给下游（如LLM预填充）
+"""
+
+from loguru import logger
+
+
+def result_words(result: dict) -> str:
+    """一条结果的文本（每个词取第一个候选）"""
+    return ''.join(ws['cw'][0].get('w', '') for ws in result.get('ws', []) if ws.get('cw'))
+
+
+class WpgsTranscript:
+    """按 sn / pgs / rg 拼装完整识别文本，并给出不会再被修订的稳定前缀"""
+
+    def __init__(self):
+        self._pieces: dict[int, str] = {}
+        self._stable_until = 0  # 序号不大于它的结果已稳定
+        self.is_final = False
+        self.revisions = 0  # 稳定前缀被服务端改写的次数（正常应为0）
+
+    def apply(self, result: dict, final: bool = False) -> None:
+        """应用一条 data.result；final=True（data.status=2 或 ls=true）时全部结果视为稳定"""
+        sn = result.get('sn')
+        if sn is not None:
+            pgs = result.get('pgs')
+            if pgs == 'rpl':
+                first, last = result.get('rg') or (sn, sn)
+                if first <= self._stable_until:
+                    self.revisions += 1
+                    logger.warning(f"ASR稳定前缀被修订: rg={first}~{last}, 稳定至sn={self._stable_until}")
+                for replaced in range(first, last + 1):
+                    self._pieces.pop(replaced, None)
+            else:
+                # 追加（或未开启wpgs）：之前的结果不会再被替换
+                self._stable_until = max(self._stable_until, sn - 1)
+            self._pieces[sn] = result_words(result)
+
+        if final or result.get('ls'):
+            self.is_final = True
+            if self._pieces:
+                self._stable_until = max(self._stable_until, max(self._pieces))
+
+    @property
+    def text(self) -> str:
+        return ''.join(self._pieces[sn] for sn in sorted(self._pieces))
+
+    @property
+    def stable_text(self) -> str:
+        return ''.join(self._pieces[sn] for sn in sorted(self._pieces) if sn <= self._stable_until)
@@ -0,0 +1,162 @@
+"""
+ASR上传前的语音活动检测（VAD）
+按短时帧的能量和过零率判断语音帧：能量高于噪声底噪一定倍数为浊音，能量略高且过零率高为清音（擦音）
+裁掉首尾静音、把过长的句中停顿压缩到上限，减少上传到讯飞的音频时长；过长停顿也不会再触发讯飞的后端点（vad_eos）提前结束识别
+"""
+
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional
+from loguru import logger
+
+try:
+    import numpy as np
+except ImportError:  # 未安装numpy时不做VAD
+    np = None
+
+
+@dataclass(frozen=True)
+class VADConfig:
+    """VAD参数"""
+    frame_ms: float = 20.0         # 分析帧长度
+    floor_db: float = -55.0        # 最低噪声底噪（dBFS），安静录音时阈值不会低于它
+    margin_db: float = 9.0         # 能量高于底噪多少dB视为语音
+    zcr_threshold: float = 0.25    # 清音判定的过零率（每个采样点）
+    min_speech_ms: float = 60.0    # 短于该时长的孤立语音段视为噪声（按键声等）
+    hangover_ms: float = 250.0     # 短于该时长的停顿不算停顿（避免切断字间间隙）
+    lead_pad_ms: float = 150.0     # 语音段前保留的余量
+    tail_pad_ms: float = 250.0     # 语音段后保留的余量
+    max_pause_ms: float = 600.0    # 句中停顿压缩到的最大时长
+
+
+# 激进程度 0~3：越高阈值越高、保留的停顿越短
+AGGRESSIVENESS_PRESETS = {
+    0: VADConfig(margin_db=6.0, hangover_ms=300.0, lead_pad_ms=200.0, tail_pad_ms=300.0, max_pause_ms=800.0),
+    1: VADConfig(),
+    2: VADConfig(margin_db=12.0, hangover_ms=200.0, lead_pad_ms=120.0, tail_pad_ms=200.0, max_pause_ms=400.0),
+    3: VADConfig(margin_db=15.0, hangover_ms=150.0, lead_pad_ms=100.0, tail_pad_ms=150.0, max_pause_ms=250.0),
+}
+
+
+def load_vad_config() -> Optional[VADConfig]:
+    """从环境变量读取VAD参数；ASR_VAD=false 或未安装numpy时返回None（不做VAD）"""
+    if os.getenv("ASR_VAD", "true").lower() == "false":
+        return None
+    if np is None:
+        logger.warning("未安装 numpy，跳过ASR VAD")
+        return None
+    level = min(3, max(0, int(os.getenv("ASR_VAD_AGGRESSIVENESS", "1"))))
+    return AGGRESSIVENESS_PRESETS[level]
+
+
+def find_speech_segments(pcm, sample_rate: int, config: VADConfig) -> list[tuple[int, int]]:
+    """返回语音段的采样点范围 [start, end)（16bit单声道PCM，已加余量）；没有语音时返回空列表"""
+    samples = np.frombuffer(pcm, dtype='<i2', count=len(pcm) // 2)
+    frame = max(1, int(sample_rate * config.frame_ms / 1000))
+    frame_count = len(samples) // frame
+    if frame_count == 0:
+        return []
+
+    frames = samples[:frame_count * frame].reshape(frame_count, frame)
+    as_float = frames.astype(np.float32)
+    energy = np.einsum('ij,ij->i', as_float, as_float) / frame
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame
+
+    # 底噪取最安静的10%帧的能量，不低于floor_db
+    floor = max(float(np.percentile(energy, 10)), (32768.0 * 10 ** (config.floor_db / 20)) ** 2)
+    voiced = energy > floor * 10 ** (config.margin_db / 10)
+    unvoiced = (energy > floor * 10 ** (config.margin_db / 20)) & (zcr > config.zcr_threshold)
+    speech = voiced | unvoiced
+    if not speech.any():
+        return []
+
+    # 连续语音帧 → 段（帧序号）
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], speech.view(np.int8), [0]))))
+    runs = edges.reshape(-1, 2)
+
+    # 合并间隔短于hangover的段，丢掉过短的段
+    hangover = config.hangover_ms / config.frame_ms
+    merged = [list(runs[0])]
+    for start, end in runs[1:]:
+        if start - merged[-1][1] < hangover:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    min_frames = config.min_speech_ms / config.frame_ms
+    lead_pad = int(sample_rate * config.lead_pad_ms / 1000)
+    tail_pad = int(sample_rate * config.tail_pad_ms / 1000)
+    return [
+        (max(0, int(start) * frame - lead_pad), min(len(samples), int(end) * frame + tail_pad))
+        for start, end in merged if end - start >= min_frames
+    ]
+
+
+def collapse_pauses(segments: list[tuple[int, int]], max_pause: int) -> list[list[int]]:
+    """把语音段连成要保留的采样点范围：不超过max_pause的停顿整段保留，更长的停顿只保留max_pause"""
+    keep = [list(segments[0])]
+    for start, end in segments[1:]:
+        gap = start - keep[-1][1]
+        if gap <= max_pause:
+            keep[-1][1] = end
+        else:
+            keep[-1][1] += max_pause
+            keep.append([start, end])
+    return keep
+
+
+def apply_vad(pcm, config: Optional[VADConfig], sample_rate: int = 16000) -> bytes:
+    """
+    裁掉16bit单声道PCM的首尾静音，并把长于max_pause_ms的停顿压缩到max_pause_ms
+    未配置、未安装numpy或没有检测到语音时原样返回（避免把轻声整段丢掉）
+    """
+    if config is None or np is None or not pcm:
+        return pcm
+    segments = find_speech_segments(pcm, sample_rate, config)
+    if not segments:
+        return pcm
+
+    keep = collapse_pauses(segments, int(sample_rate * config.max_pause_ms / 1000))
+    view = memoryview(pcm)
+    return b''.join(view[start * 2:end * 2] for start, end in keep)
+
+
+def synthetic_utterance(sample_rate: int = 16000, lead_s: float = 1.5, pause_s: float = 1.2,
+                        tail_s: float = 2.0, seed: int = 0) -> bytes:
+    """基准用的典型录音：前静音 + 语音 + 长停顿 + 语音 + 后静音（带环境噪声，语音含清音段）"""
+    rng = np.random.default_rng(seed)
+
+    def speech(seconds):
+        t = np.arange(int(sample_rate * seconds)) / sample_rate
+        voiced = 6000 * np.sin(2 * np.pi * 180 * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 4 * t) ** 2)
+        fricative = rng.normal(0, 900, t.size) * (np.sin(2 * np.pi * 1.5 * t) > 0.8)
+        return voiced + fricative
+
+    def silence(seconds):
+        return np.zeros(int(sample_rate * seconds))
+
+    signal = np.concatenate([silence(lead_s), speech(1.8), silence(pause_s), speech(1.4), silence(tail_s)])
+    signal += rng.normal(0, 30, signal.size)
+    return signal.astype('<i2').tobytes()
+
+
+def benchmark(iterations: int = 500, sample_rate: int = 16000):
+    """基准测试：各激进程度下的压缩比和单段耗时"""
+    pcm = synthetic_utterance(sample_rate)
+    seconds = len(pcm) / 2 / sample_rate
+    results = {}
+    for level, config in AGGRESSIVENESS_PRESETS.items():
+        kept = apply_vad(pcm, config, sample_rate)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            apply_vad(pcm, config, sample_rate)
+        per_clip_us = (time.perf_counter() - start) / iterations * 1e6
+        results[level] = {"kept_seconds": len(kept) / 2 / sample_rate, "per_clip_us": per_clip_us}
+        logger.info(f"🎚️  VAD激进程度{level}: {seconds:.1f}s → {results[level]['kept_seconds']:.1f}s, "
+                    f"平均耗时 {per_clip_us:.0f}µs（{iterations}次）")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,103 @@
+"""
+讯飞ASR会话看门狗
+每个识别会话有三个截止时间：首个识别结果、收到结果后服务端的静默时长、会话总时长
+超过任一截止时间即不再等待，返回已拼装的最佳部分结果并标记 timed_out，同时统计超时次数和首结果延迟
+"""
+
+import os
+import time
+from typing import Optional
+from loguru import logger
+from tts_hedging import RollingLatencyStats
+
+TIMEOUT_FIRST_RESULT = "first_result"
+TIMEOUT_INACTIVITY = "inactivity"
+TIMEOUT_TOTAL = "total"
+
+
+class ASRSessionDeadlines:
+    """单个识别会话的截止时间"""
+
+    def __init__(self, watchdog: "ASRWatchdog"):
+        self.watchdog = watchdog
+        self.started = self.last_activity = time.monotonic()
+        self.first_result_at: Optional[float] = None
+
+    def next_timeout(self) -> tuple[float, str]:
+        """距最近一个截止时间的秒数，以及该截止时间的类型"""
+        now = time.monotonic()
+        watchdog = self.watchdog
+        if self.first_result_at is None:
+            remaining, kind = self.started + watchdog.first_result_timeout - now, TIMEOUT_FIRST_RESULT
+        else:
+            remaining, kind = self.last_activity + watchdog.inactivity_timeout - now, TIMEOUT_INACTIVITY
+        total_remaining = self.started + watchdog.total_timeout - now
+        if total_remaining <= remaining:
+            remaining, kind = total_remaining, TIMEOUT_TOTAL
+        return max(0.0, remaining), kind
+
+    def activity(self, has_result: bool):
+        """收到服务端消息；has_result表示带识别文本"""
+        now = time.monotonic()
+        self.last_activity = now
+        if has_result and self.first_result_at is None:
+            self.first_result_at = now
+            self.watchdog.first_result_latency.record(now - self.started)
+
+    def finish(self, outcome: str):
+        """会话结束：completed / error / closed 或超时类型"""
+        self.watchdog.record_finish(outcome, time.monotonic() - self.started)
+
+
+class ASRWatchdog:
+    """截止时间配置与会话统计"""
+
+    def __init__(self, first_result_timeout: Optional[float] = None, inactivity_timeout: Optional[float] = None,
+                 total_timeout: Optional[float] = None):
+        self.first_result_timeout = first_result_timeout or float(os.getenv("XFYUN_ASR_FIRST_RESULT_TIMEOUT", "8"))
+        self.inactivity_timeout = inactivity_timeout or float(os.getenv("XFYUN_ASR_INACTIVITY_TIMEOUT", "3"))
+        self.total_timeout = total_timeout or float(os.getenv("XFYUN_ASR_TOTAL_TIMEOUT", "70"))
+        self.first_result_latency = RollingLatencyStats()
+        self.durations = RollingLatencyStats()
+
+        # 统计信息
+        self.sessions = 0
+        self.outcomes = {"completed": 0, "error": 0, "closed": 0,
+                         TIMEOUT_FIRST_RESULT: 0, TIMEOUT_INACTIVITY: 0, TIMEOUT_TOTAL: 0}
+
+    def start_session(self) -> ASRSessionDeadlines:
+        self.sessions += 1
+        return ASRSessionDeadlines(self)
+
+    def record_finish(self, outcome: str, duration: float):
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+        self.durations.record(duration)
+
+    def stats(self) -> dict:
+        def ms(value):
+            return round(value * 1000) if value is not None else None
+
+        return {
+            "first_result_timeout_ms": ms(self.first_result_timeout),
+            "inactivity_timeout_ms": ms(self.inactivity_timeout),
+            "total_timeout_ms": ms(self.total_timeout),
+            "sessions": self.sessions,
+            "outcomes": self.outcomes,
+            "timed_out": sum(self.outcomes[kind] for kind in (TIMEOUT_FIRST_RESULT, TIMEOUT_INACTIVITY, TIMEOUT_TOTAL)),
+            "first_result_p50_ms": ms(self.first_result_latency.percentile(0.5)),
+            "first_result_p95_ms": ms(self.first_result_latency.percentile(0.95)),
+            "duration_p95_ms": ms(self.durations.percentile(0.95))
+        }
+
+
+_shared_watchdog: Optional[ASRWatchdog] = None
+
+
+def get_shared_asr_watchdog() -> ASRWatchdog:
+    """获取进程内共享的ASR会话看门狗（由环境变量配置）"""
+    global _shared_watchdog
+    if _shared_watchdog is None:
+        _shared_watchdog = ASRWatchdog()
+        logger.info(f"⏱️  ASR会话看门狗: 首结果 {_shared_watchdog.first_result_timeout}s, "
+                    f"静默 {_shared_watchdog.inactivity_timeout}s, 总时长 {_shared_watchdog.total_timeout}s")
+    return _shared_watchdog
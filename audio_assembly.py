@@ -0,0 +1,140 @@
+"""
+音频拼接
+去掉每句WAV自带的RIFF头，按原始PCM拼接/流式输出；需要文件时只写一个正确的头，流式输出时使用不带长度的头
+"""
+
+import struct
+from dataclasses import dataclass
+from typing import AsyncGenerator, AsyncIterable, Iterable, Optional
+from loguru import logger
+
+# 流式WAV头中未知长度的占位值
+STREAMING_SIZE = 0xFFFFFFFF
+
+# 豆包TTS支持的输出格式及对应的MIME类型
+AUDIO_MIME_TYPES = {
+    "wav": "audio/wav",
+    "mp3": "audio/mpeg",
+    "ogg_opus": "audio/ogg",
+    "pcm": "audio/L16",
+}
+
+# 豆包TTS支持的采样率
+SUPPORTED_SAMPLE_RATES = (8000, 16000, 22050, 24000, 32000, 44100, 48000)
+
+
+@dataclass(frozen=True)
+class PCMFormat:
+    """PCM参数（默认与豆包TTS输出一致：24kHz 16bit 单声道）"""
+    sample_rate: int = 24000
+    channels: int = 1
+    sample_width: int = 2  # 字节
+
+    @property
+    def block_align(self) -> int:
+        return self.channels * self.sample_width
+
+    @property
+    def byte_rate(self) -> int:
+        return self.sample_rate * self.block_align
+
+
+def is_wav(data: bytes) -> bool:
+    return len(data) >= 12 and data[:4] == b'RIFF' and data[8:12] == b'WAVE'
+
+
+def parse_wav(data: bytes) -> tuple[Optional[PCMFormat], memoryview]:
+    """
+    解析WAV，返回 (格式, PCM数据视图)
+    不是WAV时原样当作PCM返回；data块长度为0或0xFFFFFFFF（流式头）时取到末尾
+    """
+    view = memoryview(data)
+    if not is_wav(data):
+        return None, view
+
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        chunk_size = struct.unpack_from('<I', data, offset + 4)[0]
+        body = offset + 8
+
+        if chunk_id == b'fmt ' and body + 16 <= len(data):
+            _, channels, sample_rate, _, _, bits = struct.unpack_from('<HHIIHH', data, body)
+            fmt = PCMFormat(sample_rate=sample_rate, channels=channels, sample_width=bits // 8)
+        elif chunk_id == b'data':
+            end = len(data) if chunk_size in (0, STREAMING_SIZE) else min(len(data), body + chunk_size)
+            return fmt, view[body:end]
+
+        # RIFF块按偶数字节对齐
+        offset = body + chunk_size + (chunk_size & 1)
+
+    logger.warning("WAV中未找到data块，按空音频处理")
+    return fmt, view[0:0]
+
+
+def build_wav_header(fmt: PCMFormat, data_size: Optional[int] = None) -> bytes:
+    """构建44字节WAV头；data_size为None时生成流式头（长度未知）"""
+    if data_size is None:
+        riff_size = data_size = STREAMING_SIZE
+    else:
+        riff_size = 36 + data_size
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', riff_size, b'WAVE',
+        b'fmt ', 16, 1, fmt.channels, fmt.sample_rate, fmt.byte_rate, fmt.block_align, fmt.sample_width * 8,
+        b'data', data_size
+    )
+
+
+class PCMStreamAssembler:
+    """把多段WAV/PCM拼成一路PCM流，只保留一个头"""
+
+    def __init__(self, fmt: Optional[PCMFormat] = None):
+        self.fmt = fmt
+        self.pcm_bytes = 0
+
+    def feed_clip(self, clip: bytes) -> memoryview:
+        """输入一段完整音频（带或不带WAV头），返回其PCM数据"""
+        clip_fmt, pcm = parse_wav(clip)
+        if clip_fmt:
+            if self.fmt is None:
+                self.fmt = clip_fmt
+            elif clip_fmt != self.fmt:
+                logger.warning(f"音频格式不一致: {clip_fmt} != {self.fmt}，按首段格式拼接")
+        self.pcm_bytes += len(pcm)
+        return pcm
+
+    def header(self, streaming: bool = True) -> bytes:
+        """流式输出用不带长度的头；写文件用已累计的PCM长度"""
+        return build_wav_header(self.fmt or PCMFormat(), None if streaming else self.pcm_bytes)
+
+
+def concat_wav(clips: Iterable[bytes], fmt: Optional[PCMFormat] = None) -> bytes:
+    """把多段WAV拼成一个带正确长度头的WAV文件"""
+    assembler = PCMStreamAssembler(fmt)
+    pcm_parts = [assembler.feed_clip(clip) for clip in clips if clip]
+    if not pcm_parts:
+        return b''
+    return assembler.header(streaming=False) + b''.join(pcm_parts)
+
+
+def concat_audio(clips: Iterable[bytes], audio_format: str = "wav") -> bytes:
+    """按格式拼接多段音频：WAV重写头，mp3/ogg_opus/pcm直接顺序拼接"""
+    if audio_format == "wav":
+        return concat_wav(clips)
+    return b''.join(clip for clip in clips if clip)
+
+
+async def stream_wav(clips: AsyncIterable[bytes], fmt: Optional[PCMFormat] = None) -> AsyncGenerator[bytes, None]:
+    """把逐句到达的WAV转成一路流式WAV：先输出一个不带长度的头，之后只输出PCM"""
+    assembler = PCMStreamAssembler(fmt)
+    header_sent = False
+    async for clip in clips:
+        if not clip:
+            continue
+        pcm = assembler.feed_clip(clip)
+        if not header_sent:
+            yield assembler.header(streaming=True)
+            header_sent = True
+        yield bytes(pcm)
@@ -0,0 +1,205 @@
+"""
+ASR输入音频解码
+把浏览器上传的音频（WebM/Ogg封装的Opus、非16kHz的PCM等）转换为讯飞ASR需要的16kHz单声道16bit PCM
+解码都在ffmpeg子进程中进行，不阻塞事件循环；已是16kHz PCM/WAV的输入直接透传
+"""
+
+import os
+import time
+import asyncio
+import tempfile
+from typing import AsyncIterable, AsyncGenerator, Optional, Union
+from loguru import logger
+from audio_assembly import PCMFormat, is_wav, parse_wav
+
+ASR_SAMPLE_RATE = 16000
+ASR_PCM_FORMAT = PCMFormat(sample_rate=ASR_SAMPLE_RATE, channels=1, sample_width=2)
+
+# 实时识别接受的输入格式：pcm为16bit单声道小端裸数据，其余为带封装的压缩流（由ffmpeg探测封装）
+STREAM_INPUT_FORMATS = ("pcm", "opus", "webm", "ogg")
+
+
+class StreamingPCMDecoder:
+    """用一个ffmpeg子进程把连续到达的音频流实时解码为16kHz单声道PCM（边输入边输出）"""
+
+    def __init__(self, input_format: str = "opus", sample_rate: int = ASR_SAMPLE_RATE, chunk_bytes: int = 1280):
+        self.input_format = input_format
+        self.sample_rate = sample_rate
+        self.chunk_bytes = chunk_bytes  # 每次读出的PCM大小，默认40ms
+
+    def _command(self) -> list[str]:
+        if self.input_format == "pcm":
+            input_args = ["-f", "s16le", "-ar", str(self.sample_rate), "-ac", "1"]
+        else:
+            input_args = []
+        return [
+            "ffmpeg", "-hide_banner", "-loglevel", "error", "-fflags", "nobuffer",
+            *input_args, "-i", "pipe:0",
+            "-f", "s16le", "-ac", "1", "-ar", str(ASR_SAMPLE_RATE), "pipe:1"
+        ]
+
+    async def decode(self, chunks: AsyncIterable[bytes]) -> AsyncGenerator[bytes, None]:
+        process = await asyncio.create_subprocess_exec(
+            *self._command(),
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+
+        async def feed():
+            try:
+                async for chunk in chunks:
+                    process.stdin.write(chunk)
+                    await process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                process.stdin.close()
+
+        feeder = asyncio.create_task(feed())
+        try:
+            while True:
+                pcm = await process.stdout.read(self.chunk_bytes)
+                if not pcm:
+                    break
+                yield pcm
+            await feeder
+            await process.wait()
+            if process.returncode:
+                error = (await process.stderr.read()).decode('utf-8', 'replace').strip()
+                logger.error(f"音频流解码失败（{self.input_format}）: {error[-300:]}")
+        finally:
+            if not feeder.done():
+                feeder.cancel()
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+
+
+def decode_stream(chunks: AsyncIterable[bytes], input_format: str = "pcm",
+                  sample_rate: int = ASR_SAMPLE_RATE) -> AsyncIterable[bytes]:
+    """16kHz PCM原样透传，其余格式经ffmpeg流式解码"""
+    if input_format == "pcm" and sample_rate == ASR_SAMPLE_RATE:
+        return chunks
+    return StreamingPCMDecoder(input_format, sample_rate).decode(chunks)
+
+
+class DecoderBusy(RuntimeError):
+    """解码排队已满"""
+
+
+def passthrough_pcm(audio_data: bytes, input_format: Optional[str] = None) -> Optional[Union[bytes, memoryview]]:
+    """输入已是16kHz单声道16bit PCM（声明为pcm，或该格式的WAV）时返回PCM数据（WAV不拷贝），否则返回None"""
+    if input_format == "pcm":
+        return audio_data
+    if is_wav(audio_data):
+        fmt, pcm = parse_wav(audio_data)
+        if fmt == ASR_PCM_FORMAT:
+            return pcm
+    return None
+
+
+class AudioDecodePool:
+    """
+    ASR上传音频的解码池：最多 max_workers 个ffmpeg子进程同时解码，
+    排队（含解码中）超过 max_pending 时直接拒绝，单个任务超过 timeout 秒即终止子进程
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 timeout: Optional[float] = None):
+        self.max_workers = max_workers or int(os.getenv("ASR_DECODE_WORKERS", "2"))
+        self.max_pending = max_pending or int(os.getenv("ASR_DECODE_MAX_PENDING", "16"))
+        self.timeout = timeout or float(os.getenv("ASR_DECODE_TIMEOUT", "10"))
+        self._workers = asyncio.Semaphore(self.max_workers)
+        self._pending = 0
+
+        # 统计信息
+        self.decoded = 0
+        self.skipped = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.total_decode_time = 0.0
+
+    async def to_pcm(self, audio_data: bytes, input_format: Optional[str] = None) -> Union[bytes, memoryview]:
+        """
+        转换为16kHz单声道16bit PCM
+        排队已满抛出 DecoderBusy，超时抛出 asyncio.TimeoutError，解码失败抛出 RuntimeError
+        """
+        pcm = passthrough_pcm(audio_data, input_format)
+        if pcm is not None:
+            self.skipped += 1
+            return pcm
+
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise DecoderBusy(f"音频解码排队已满（{self._pending}个任务）")
+        self._pending += 1
+        try:
+            async with self._workers:
+                return await self._decode(audio_data)
+        finally:
+            self._pending -= 1
+
+    async def _decode(self, audio_data: bytes) -> bytes:
+        start = time.monotonic()
+        # MP4/M4A（Safari录音）的索引可能在文件末尾，无法从管道解码，先写入临时文件
+        source = None
+        if audio_data[4:8] == b'ftyp':
+            source = await asyncio.to_thread(self._write_temp, audio_data)
+
+        process = await asyncio.create_subprocess_exec(
+            "ffmpeg", "-hide_banner", "-loglevel", "error", "-i", source or "pipe:0",
+            "-f", "s16le", "-ac", "1", "-ar", str(ASR_SAMPLE_RATE), "pipe:1",
+            stdin=asyncio.subprocess.DEVNULL if source else asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            pcm, error = await asyncio.wait_for(process.communicate(None if source else audio_data), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.warning(f"音频解码超时（{self.timeout}s），已终止ffmpeg")
+            raise
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            if source:
+                os.unlink(source)
+
+        if process.returncode:
+            self.failures += 1
+            raise RuntimeError(f"ffmpeg解码失败: {error.decode('utf-8', 'replace').strip()[-300:]}")
+
+        self.decoded += 1
+        self.total_decode_time += time.monotonic() - start
+        return pcm
+
+    @staticmethod
+    def _write_temp(audio_data: bytes) -> str:
+        with tempfile.NamedTemporaryFile(suffix=".m4a", delete=False) as f:
+            f.write(audio_data)
+            return f.name
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "pending": self._pending,
+            "decoded": self.decoded,
+            "skipped": self.skipped,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "avg_decode_ms": round(self.total_decode_time / self.decoded * 1000) if self.decoded else 0
+        }
+
+
+_shared_decode_pool: Optional[AudioDecodePool] = None
+
+
+def get_shared_decode_pool() -> AudioDecodePool:
+    """获取进程内共享的ASR音频解码池（由环境变量配置）"""
+    global _shared_decode_pool
+    if _shared_decode_pool is None:
+        _shared_decode_pool = AudioDecodePool()
+        logger.info(f"🎛️  ASR音频解码池: {_shared_decode_pool.max_workers} 个解码进程, "
+                    f"最多排队 {_shared_decode_pool.max_pending} 个, 超时 {_shared_decode_pool.timeout}s")
+    return _shared_decode_pool
@@ -0,0 +1,124 @@
+"""
+TTS音频首尾静音裁剪
+按短时窗口能量（RMS）找到第一个/最后一个有声窗口，裁掉前后的静音，并保留少量余量避免切掉字头字尾
+"""
+
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional
+from loguru import logger
+from audio_assembly import PCMFormat, build_wav_header, is_wav, parse_wav
+
+try:
+    import numpy as np
+except ImportError:  # 未安装numpy时不裁剪
+    np = None
+
+
+@dataclass(frozen=True)
+class SilenceTrimConfig:
+    """静音裁剪参数"""
+    threshold_db: float = -45.0  # 窗口RMS低于该值（dBFS）视为静音
+    window_ms: float = 5.0       # 能量窗口长度
+    lead_pad_ms: float = 20.0    # 句首保留的静音余量
+    tail_pad_ms: float = 60.0    # 句尾保留的静音余量，句间保留自然停顿
+
+    @property
+    def threshold_amplitude(self) -> float:
+        return 32768.0 * 10 ** (self.threshold_db / 20)
+
+
+def load_trim_config() -> Optional[SilenceTrimConfig]:
+    """从环境变量读取裁剪参数；TTS_TRIM_SILENCE=false 或未安装numpy时返回None（不裁剪）"""
+    if os.getenv("TTS_TRIM_SILENCE", "true").lower() == "false":
+        return None
+    if np is None:
+        logger.warning("未安装 numpy，跳过TTS静音裁剪")
+        return None
+    return SilenceTrimConfig(
+        threshold_db=float(os.getenv("TTS_TRIM_THRESHOLD_DB", "-45")),
+        window_ms=float(os.getenv("TTS_TRIM_WINDOW_MS", "5")),
+        lead_pad_ms=float(os.getenv("TTS_TRIM_LEAD_PAD_MS", "20")),
+        tail_pad_ms=float(os.getenv("TTS_TRIM_TAIL_PAD_MS", "60"))
+    )
+
+
+def find_voiced_range(pcm, fmt: PCMFormat, config: SilenceTrimConfig) -> tuple[int, int]:
+    """返回有声部分的字节范围 [start, end)（已加余量、按帧对齐）；整段静音时返回 (0, 0)"""
+    total_frames = len(pcm) // fmt.block_align
+    samples = np.frombuffer(pcm, dtype='<i2', count=total_frames * fmt.channels)
+
+    window = max(1, int(fmt.sample_rate * config.window_ms / 1000))
+    window_count = total_frames // window
+    if window_count == 0:
+        return 0, total_frames * fmt.block_align
+
+    # 每个窗口的均方能量（多声道一起算），与阈值的平方比较，省去开方
+    frames = samples[:window_count * window * fmt.channels].reshape(window_count, -1).astype(np.float32)
+    energy = np.einsum('ij,ij->i', frames, frames) / frames.shape[1]
+    voiced = np.flatnonzero(energy > config.threshold_amplitude ** 2)
+    if voiced.size == 0:
+        return 0, 0
+
+    lead_pad = int(fmt.sample_rate * config.lead_pad_ms / 1000)
+    tail_pad = int(fmt.sample_rate * config.tail_pad_ms / 1000)
+    start_frame = max(0, int(voiced[0]) * window - lead_pad)
+    end_frame = min(total_frames, (int(voiced[-1]) + 1) * window + tail_pad)
+    return start_frame * fmt.block_align, end_frame * fmt.block_align
+
+
+def trim_silence(audio_data: bytes, audio_format: str = "wav", sample_rate: int = 24000,
+                 config: Optional[SilenceTrimConfig] = None) -> bytes:
+    """
+    裁剪一段TTS音频的首尾静音
+    只处理16bit的WAV/PCM；压缩格式、未安装numpy或整段静音时原样返回
+    """
+    if not audio_data or config is None or np is None or audio_format not in ("wav", "pcm"):
+        return audio_data
+
+    if is_wav(audio_data):
+        fmt, pcm = parse_wav(audio_data)
+        fmt = fmt or PCMFormat(sample_rate=sample_rate)
+    else:
+        fmt, pcm = PCMFormat(sample_rate=sample_rate), memoryview(audio_data)
+    if fmt.sample_width != 2:
+        return audio_data
+
+    start, end = find_voiced_range(pcm, fmt, config)
+    if end <= start:
+        # 整段都低于阈值时不裁剪，避免把轻声句子整句丢掉
+        return audio_data
+    if start == 0 and end == len(pcm):
+        return audio_data
+
+    trimmed = pcm[start:end]
+    if audio_format == "pcm" and not is_wav(audio_data):
+        return bytes(trimmed)
+    return build_wav_header(fmt, len(trimmed)) + trimmed
+
+
+def benchmark(iterations: int = 2000, seconds: float = 3.0, silence_ms: float = 300.0):
+    """基准测试：24kHz单声道，首尾各带静音的合成语音片段"""
+    fmt = PCMFormat()
+    rng = np.random.default_rng(0)
+    silence = rng.normal(0, 20, int(fmt.sample_rate * silence_ms / 1000))
+    t = np.arange(int(fmt.sample_rate * seconds)) / fmt.sample_rate
+    voice = 8000 * np.sin(2 * np.pi * 220 * t) * (0.6 + 0.4 * np.sin(2 * np.pi * 3 * t))
+    pcm = np.concatenate([silence, voice, silence]).astype('<i2').tobytes()
+    clip = build_wav_header(fmt, len(pcm)) + pcm
+    config = SilenceTrimConfig()
+
+    trimmed = trim_silence(clip, config=config)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        trim_silence(clip, config=config)
+    per_clip_us = (time.perf_counter() - start) / iterations * 1e6
+
+    logger.info(f"✂️  静音裁剪: {len(clip)} → {len(trimmed)} bytes, "
+                f"{seconds:.1f}s片段平均耗时 {per_clip_us:.0f}µs（{iterations}次）")
+    return per_clip_us
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -576,13 +576,13 @@ export default function AvatarDisplay({ isExpanded: externalIsExpanded, onExpand
                   for (let i = 0; i < audioData.length; i++) {
                     bytes[i] = audioData.charCodeAt(i);
                   }
-                  const audioBlob = new Blob([bytes], { type: 'audio/wav' });
+                  const audioBlob = new Blob([bytes], { type: parsed.mimeType || 'audio/wav' });
                   const order = parsed.order || 1;
                   
                   // 添加到队列Map中
                   audioQueueRef.current.set(order, audioBlob);
 
-                  const orderInfo = parsed.order ? `#${parsed.order}/${parsed.total}` : `#${order}`;
+                  const orderInfo = `#${order}`;
                   console.log(`📥 收到音频 ${orderInfo}，大小: ${bytes.length} bytes，队列中: ${Array.from(audioQueueRef.current.keys()).join(',')}`);
 
                   // 尝试播放（如果轮到它了就会播放）
@@ -1,17 +1,56 @@
 import os
-import json
 import asyncio
-import struct
+import time
 import uuid
-import websockets
-from typing import AsyncGenerator, Optional
+from dataclasses import dataclass
+from typing import AsyncGenerator, Callable, Optional
 from loguru import logger
 from dotenv import load_dotenv
+from doubao_tts_pool import get_shared_pool
+from doubao_tts_codec import EVENT_FINISH_SESSION, EVENT_START_SESSION, EVENT_TASK_REQUEST, encode_json_request, parse_frame
+from tts_hedging import HedgePolicy, get_shared_hedge_policy
+from tts_scheduler import PRIORITY_FIRST_SENTENCE, PRIORITY_SENTENCE, get_shared_tts_scheduler
+from tts_audio_cache import get_shared_audio_cache, make_cache_key
+from audio_assembly import PCMFormat, concat_audio, concat_wav
 
 # 加载.env.local文件
 load_dotenv('.env.local')
 load_dotenv()  # 备用
 
+
+@dataclass(frozen=True)
+class TTSOptions:
+    """单次合成的参数（不可变），随调用传入，避免并发请求互相修改共享客户端"""
+    voice_type: str
+    speed: float = 1.0
+    emotion: str = "neutral"
+    audio_format: str = "wav"  # wav/mp3/ogg_opus/pcm，默认WAV更易去除句首静音
+    sample_rate: int = 24000
+
+    @property
+    def speech_rate(self) -> int:
+        """
+        将语速转换为豆包TTS的speech_rate格式
+        根据文档：speech_rate范围[-50,100]，100代表2.0倍速，-50代表0.5倍速，0代表1.0倍速
+        公式：speech_rate = (倍速 - 1.0) * 100
+        """
+        speech_rate = int((self.speed - 1.0) * 100)
+        return max(-50, min(100, speech_rate))  # 限制范围[-50, 100]
+
+    def audio_params(self) -> dict:
+        """构建StartSession的audio_params，包含情感"""
+        audio_params = {
+            "format": self.audio_format,
+            "sample_rate": self.sample_rate,
+            "speech_rate": self.speech_rate,
+            "loudness_rate": 0
+        }
+        # 如果指定了情感，添加到音频参数中
+        if self.emotion and self.emotion != "neutral":
+            audio_params["emotion"] = self.emotion
+        return audio_params
+
+
 class DoubaoTTSClient:
     """豆包双向流式TTS客户端"""
     
@@ -20,107 +59,19 @@ class DoubaoTTSClient:
         self.access_token = os.getenv("DOUBAO_TTS_ACCESS_TOKEN")
         self.voice_type = os.getenv("DOUBAO_TTS_VOICE_TYPE", "zh_female_meilinvyou_emo_v2_mars_bigtts")
         self.secret_key = os.getenv("DOUBAO_TTS_SECRET_KEY")
-        self.speed = 1.0  # 默认语速，会被voice_server动态设置
+        self.speed = 1.0  # 默认语速（未传入TTSOptions时使用）
         self.is_warmed_up = False  # 预热状态标记
         
-        self.websocket_url = "wss://openspeech.bytedance.com/api/v3/tts/bidirection"
+        # 可指向本地替身服务压测（见 doubao_tts_mock_server.py）
+        self.websocket_url = os.getenv("DOUBAO_TTS_WS_URL", "wss://openspeech.bytedance.com/api/v3/tts/bidirection")
         self.resource_id = "volc.service_type.10029"  # 大模型语音合成
         
         if not all([self.app_id, self.access_token, self.secret_key]):
             logger.warning("豆包TTS配置不完整，请检查环境变量")
     
-    def _create_binary_frame(self, message_type: int, event: Optional[int] = None, 
-                           session_id: Optional[str] = None, payload: bytes = b'{}',
-                           serialization: int = 1, compression: int = 0):
-        """创建二进制协议帧"""
-        # Protocol version (4-bit) + Header size (4-bit) 
-        header_byte0 = 0x11  # v1 + 4-byte header
-        
-        # Message type (4-bit) + Message type specific flags (4-bit)
-        if event is not None:
-            header_byte1 = (message_type << 4) | 0x04  # with event number
-        else:
-            header_byte1 = (message_type << 4) | 0x00  # no event number
-        
-        # Serialization method (4-bit) + Compression method (4-bit)
-        header_byte2 = (serialization << 4) | compression
-        
-        # Reserved
-        header_byte3 = 0x00
-        
-        # 构建帧
-        frame = struct.pack('!BBBB', header_byte0, header_byte1, header_byte2, header_byte3)
-        
-        # 添加可选字段
-        if event is not None:
-            frame += struct.pack('!I', event)
-        
-        if session_id:
-            session_bytes = session_id.encode('utf-8')
-            frame += struct.pack('!I', len(session_bytes))
-            frame += session_bytes
-        
-        # 添加payload长度和内容
-        frame += struct.pack('!I', len(payload))
-        frame += payload
-        
-        return frame
-    
-    def _parse_binary_frame(self, data: bytes):
-        """解析二进制协议帧"""
-        if len(data) < 4:
-            return None
-        
-        # 解析头部
-        header_byte0, header_byte1, header_byte2, header_byte3 = struct.unpack('!BBBB', data[:4])
-        
-        message_type = (header_byte1 >> 4) & 0x0F
-        has_event = (header_byte1 & 0x04) != 0
-        serialization = (header_byte2 >> 4) & 0x0F
-        compression = header_byte2 & 0x0F
-        
-        offset = 4
-        event = None
-        session_id = None
-        
-        # 解析可选字段
-        if has_event and len(data) >= offset + 4:
-            event = struct.unpack('!I', data[offset:offset+4])[0]
-            offset += 4
-        
-        # 如果有session_id字段
-        if len(data) >= offset + 8:
-            try:
-                session_id_len = struct.unpack('!I', data[offset:offset+4])[0]
-                offset += 4
-                if len(data) >= offset + session_id_len:
-                    session_id = data[offset:offset+session_id_len].decode('utf-8')
-                    offset += session_id_len
-            except:
-                pass
-        
-        # 解析payload
-        if len(data) >= offset + 4:
-            payload_len = struct.unpack('!I', data[offset:offset+4])[0]
-            offset += 4
-            if len(data) >= offset + payload_len:
-                payload = data[offset:offset+payload_len]
-                
-                # 如果是JSON序列化，尝试解析
-                if serialization == 1:
-                    try:
-                        payload = json.loads(payload.decode('utf-8'))
-                    except:
-                        pass
-                
-                return {
-                    'message_type': message_type,
-                    'event': event,
-                    'session_id': session_id,
-                    'payload': payload
-                }
-        
-        return None
+    def default_options(self, emotion: str = "neutral") -> TTSOptions:
+        """由客户端默认音色/语速构建合成参数"""
+        return TTSOptions(voice_type=self.voice_type, speed=self.speed, emotion=emotion)
     
     async def warm_up(self):
         """TTS预热 - 建立连接测试"""
@@ -133,266 +84,327 @@ class DoubaoTTSClient:
         
         try:
             logger.info("开始TTS预热...")
-            connection_id = str(uuid.uuid4())
-            
-            headers = {
-                'X-Api-App-Key': self.app_id,
-                'X-Api-Access-Key': self.access_token,
-                'X-Api-Resource-Id': self.resource_id,
-                'X-Api-Connect-Id': connection_id
-            }
-            
-            # 尝试建立WebSocket连接进行预热
-            async with websockets.connect(self.websocket_url, extra_headers=headers) as websocket:
-                logger.info(f"TTS预热WebSocket连接成功: {connection_id}")
-                
-                # 发送StartConnection进行握手测试
-                start_conn_payload = json.dumps({}).encode('utf-8')
-                start_conn_frame = self._create_binary_frame(
-                    message_type=1,  # Full-client request
-                    event=1,  # StartConnection
-                    payload=start_conn_payload
-                )
-                await websocket.send(start_conn_frame)
-                
-                # 等待ConnectionStarted响应
-                response = await asyncio.wait_for(websocket.recv(), timeout=10.0)
-                parsed = self._parse_binary_frame(response)
-                
-                if parsed and parsed.get('event') == 50:
-                    self.is_warmed_up = True
-                    logger.info("TTS预热完成 - 连接测试成功")
-                else:
-                    logger.warning("TTS预热连接测试失败")
+            # 预建连接放入共享连接池，首个请求无需再握手
+            pool = get_shared_pool(self)
+            await pool.prefill(1)
+            self.is_warmed_up = True
+            logger.info(f"TTS预热完成 - 连接池已就绪: {pool.stats()}")
                     
         except asyncio.TimeoutError:
             logger.warning("TTS预热超时")
         except Exception as e:
             logger.error(f"TTS预热错误: {e}")
     
-    async def text_to_speech(self, text: str, user_id: str = "default", emotion: str = "neutral") -> AsyncGenerator[bytes, None]:
-        """文本转语音流式生成"""
+    async def text_to_speech(self, text: str, user_id: str = "default", emotion: str = "neutral",
+                             session_status: Optional[dict] = None,
+                             options: Optional[TTSOptions] = None,
+                             hedge: Optional[bool] = None,
+                             priority: int = PRIORITY_SENTENCE,
+                             on_start: Optional[Callable[[], None]] = None) -> AsyncGenerator[bytes, None]:
+        """
+        文本转语音流式生成
+        options为本次调用的音色/语速/情感/格式，未传入时使用客户端默认值和emotion参数
+        session_status传入dict时，会话正常结束会写入finished=True
+        hedge为True（或未传入且DOUBAO_TTS_HEDGE_ENABLED=true）时启用对冲请求
+        priority为会话排队优先级（见tts_scheduler），超出并发上限时按优先级放行
+        on_start在会话拿到调度名额、真正开始合成时调用（排队时间不算在内）
+        """
         if not all([self.app_id, self.access_token]):
             logger.error("豆包TTS配置不完整")
             return
         
-        connection_id = str(uuid.uuid4())
-        session_id = str(uuid.uuid4())
+        options = options or self.default_options(emotion)
+        policy = get_shared_hedge_policy()
+        policy.sessions += 1
         
-        headers = {
-            'X-Api-App-Key': self.app_id,
-            'X-Api-Access-Key': self.access_token,
-            'X-Api-Resource-Id': self.resource_id,
-            'X-Api-Connect-Id': connection_id
-        }
+        if policy.enabled if hedge is None else hedge:
+            stream = self._hedged_session(text, user_id, options, session_status, policy, priority, on_start)
+        else:
+            stream = self._session_stream(text, user_id, options, session_status, priority, on_start=on_start)
+        async for chunk in stream:
+            yield chunk
+    
+    async def _hedged_session(self, text: str, user_id: str, options: TTSOptions,
+                              session_status: Optional[dict], policy: HedgePolicy,
+                              priority: int = PRIORITY_SENTENCE,
+                              on_start: Optional[Callable[[], None]] = None) -> AsyncGenerator[bytes, None]:
+        """
+        对冲会话：截止时间内没有收到首个音频、且此刻有空闲会话名额时，在另一条池化连接上发起重复会话
+        （名额已满时不对冲，避免排在其他回复的首个会话之后或占用它们需要的名额）
+        首个会话未产出音频就失败时，立即按原优先级重试一次
+        先产出音频的会话胜出，另一个被取消（其连接未正常结束，不会归还连接池）
+        截止时间从会话真正开始（拿到调度名额）时算起，本地排队不会触发对冲
+        """
+        scheduler = get_shared_tts_scheduler()
+        attempts = []  # (任务, 音频队列, 会话状态)
+        
+        def launch(slot_acquired: bool = False):
+            queue = asyncio.Queue()
+            status = {}
+            started = False
+            notify = None if attempts else on_start  # 只有首个会话通知开始，对冲/重试不重复通知
+            
+            async def pump():
+                nonlocal started
+                started = True
+                try:
+                    async for chunk in self._session_stream(text, user_id, options, status, priority, slot_acquired, notify):
+                        queue.put_nowait(chunk)
+                finally:
+                    queue.put_nowait(None)  # 会话结束标记
+            
+            task = asyncio.create_task(pump())
+            if slot_acquired:
+                # 任务开始前就被取消时，由这里归还已占用的名额
+                task.add_done_callback(lambda _: started or scheduler.release())
+            attempts.append((task, queue, status))
+            return asyncio.ensure_future(queue.get())
+        
+        deadline = policy.deadline()
+        pending = {launch(): 0}
+        winner = None
+        first_chunk = None
+        hedged = False
         
         try:
-            async with websockets.connect(self.websocket_url, extra_headers=headers) as websocket:
-                logger.info(f"豆包TTS WebSocket连接成功: {connection_id}")
-                
-                # 1. 发送StartConnection
-                start_conn_payload = json.dumps({}).encode('utf-8')
-                start_conn_frame = self._create_binary_frame(
-                    message_type=1,  # Full-client request
-                    event=1,  # StartConnection
-                    payload=start_conn_payload
-                )
-                await websocket.send(start_conn_frame)
-                
-                # 等待ConnectionStarted响应
-                response = await websocket.recv()
-                parsed = self._parse_binary_frame(response)
-                if not parsed or parsed.get('event') != 50:
-                    logger.error("StartConnection失败")
-                    return
-                
-                logger.info("Connection建立成功")
-                
-                # 2. 发送StartSession
-                # 将语速转换为豆包TTS的speech_rate格式
-                # 根据文档：speech_rate范围[-50,100]，100代表2.0倍速，-50代表0.5倍速，0代表1.0倍速
-                # 公式：speech_rate = (倍速 - 1.0) * 100
-                speech_rate = int((self.speed - 1.0) * 100)
-                speech_rate = max(-50, min(100, speech_rate))  # 限制范围[-50, 100]
-                logger.info(f"⚡ 语速设置: {self.speed}x → speech_rate={speech_rate}")
-                
-                # 构建音频参数，包含情感
-                audio_params = {
-                    "format": "wav",  # 使用WAV格式，更易去除句首静音
-                    "sample_rate": 24000,
-                    "speech_rate": speech_rate,
-                    "loudness_rate": 0
-                }
-                
-                # 如果指定了情感，添加到音频参数中
-                if emotion and emotion != "neutral":
-                    audio_params["emotion"] = emotion
-                    logger.info(f"TTS使用情感: {emotion}")
-                
-                session_payload = {
-                    "user": {"uid": user_id},
-                    "event": 100,
-                    "namespace": "BidirectionalTTS",
-                    "req_params": {
-                        "text": text,
-                        "speaker": self.voice_type,
-                        "audio_params": audio_params
+            timeout = deadline
+            while winner is None:
+                if not pending:
+                    # 会话都已结束且没有音频：首个会话失败时重试一次
+                    if len(attempts) > 1 or attempts[0][2].get('finished'):
+                        break
+                    logger.warning(f"⏱️  TTS会话未产出音频即结束，重试: {text[:20]}")
+                    policy.failovers += 1
+                    pending[launch()] = 1
+                    timeout = None
+                    continue
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    started_at = attempts[0][2].get('started_at')
+                    remaining = deadline if started_at is None else deadline - (time.monotonic() - started_at)
+                    if remaining > 0:
+                        timeout = remaining
+                        continue
+                    timeout = None
+                    if not scheduler.try_acquire():
+                        policy.hedge_skipped += 1
+                        logger.info(f"⏱️  TTS首包超过 {deadline * 1000:.0f}ms，但没有空闲会话名额，不对冲: {text[:20]}")
+                        continue
+                    # 截止时间内没有首包，在另一条连接上发起对冲会话
+                    logger.warning(f"⏱️  TTS首包超过 {deadline * 1000:.0f}ms，发起对冲会话: {text[:20]}")
+                    policy.hedged += 1
+                    hedged = True
+                    pending[launch(slot_acquired=True)] = 1
+                    continue
+                for getter in done:
+                    index = pending.pop(getter)
+                    chunk = getter.result()
+                    if chunk is not None and winner is None:
+                        winner, first_chunk = index, chunk
+            
+            if winner is None:
+                return
+            
+            # 取消落后的会话
+            for index, (task, _, _) in enumerate(attempts):
+                if index != winner:
+                    task.cancel()
+            if winner == 1 and hedged:
+                policy.hedge_wins += 1
+                logger.info(f"⏱️  对冲会话胜出: {text[:20]}")
+            
+            _, queue, status = attempts[winner]
+            yield first_chunk
+            while (chunk := await queue.get()) is not None:
+                yield chunk
+            
+            if session_status is not None and status.get('finished'):
+                session_status['finished'] = True
+        finally:
+            for getter in pending:
+                getter.cancel()
+            for task, _, _ in attempts:
+                task.cancel()
+    
+    async def _session_stream(self, text: str, user_id: str, options: TTSOptions,
+                              session_status: Optional[dict] = None,
+                              priority: int = PRIORITY_SENTENCE,
+                              slot_acquired: bool = False,
+                              on_start: Optional[Callable[[], None]] = None) -> AsyncGenerator[bytes, None]:
+        """
+        在一条池化连接上完成一次 StartSession → TaskRequest → FinishSession 会话
+        slot_acquired=True表示调用方已占到会话名额（对冲会话），这里只负责归还
+        """
+        session_id = str(uuid.uuid4())
+        policy = get_shared_hedge_policy()
+        first_audio = True
+        
+        try:
+            # 先占用会话名额（超出并发上限时按优先级排队）
+            async with get_shared_tts_scheduler().slot(priority, acquired=slot_acquired):
+                started_at = time.monotonic()
+                if session_status is not None:
+                    session_status['started_at'] = started_at
+                if on_start is not None:
+                    on_start()
+                
+                # 从连接池借用已完成StartConnection的连接
+                async with get_shared_pool(self).connection() as conn:
+                    websocket = conn.websocket
+                    logger.info(f"豆包TTS复用连接: {conn.connection_id}（第{conn.session_count}个会话）")
+                    
+                    # 1. 发送StartSession
+                    logger.info(f"⚡ 音色={options.voice_type}, 语速: {options.speed}x → speech_rate={options.speech_rate}, 情感={options.emotion}")
+                    
+                    session_payload = {
+                        "user": {"uid": user_id},
+                        "event": 100,
+                        "namespace": "BidirectionalTTS",
+                        "req_params": {
+                            "text": text,
+                            "speaker": options.voice_type,
+                            "audio_params": options.audio_params()
+                        }
                     }
-                }
-                
-                session_payload_bytes = json.dumps(session_payload).encode('utf-8')
-                start_session_frame = self._create_binary_frame(
-                    message_type=1,  # Full-client request
-                    event=100,  # StartSession
-                    session_id=session_id,
-                    payload=session_payload_bytes
-                )
-                await websocket.send(start_session_frame)
-                
-                # 等待SessionStarted响应
-                response = await websocket.recv()
-                parsed = self._parse_binary_frame(response)
-                if not parsed or parsed.get('event') != 150:
-                    logger.error("StartSession失败")
-                    return
-                
-                logger.info("Session建立成功，开始接收音频数据")
-                
-                # 3. 发送TaskRequest
-                task_payload = {
-                    "req_params": {
-                        "text": text
+                    
+                    start_session_frame = encode_json_request(EVENT_START_SESSION, session_id, session_payload)
+                    await websocket.send(start_session_frame)
+                    
+                    # 等待SessionStarted响应
+                    response = await websocket.recv()
+                    frame = parse_frame(response)
+                    if not frame or frame.event != 150:
+                        logger.error("StartSession失败")
+                        return
+                    
+                    logger.info("Session建立成功，开始接收音频数据")
+                    
+                    # 2. 发送TaskRequest
+                    task_payload = {
+                        "req_params": {
+                            "text": text
+                        }
                     }
-                }
-                task_payload_bytes = json.dumps(task_payload).encode('utf-8')
-                task_frame = self._create_binary_frame(
-                    message_type=1,  # Full-client request
-                    event=200,  # TaskRequest
-                    session_id=session_id,
-                    payload=task_payload_bytes
-                )
-                await websocket.send(task_frame)
-                
-                # 4. 发送FinishSession
-                finish_payload = json.dumps({}).encode('utf-8')
-                finish_frame = self._create_binary_frame(
-                    message_type=1,  # Full-client request
-                    event=102,  # FinishSession
-                    session_id=session_id,
-                    payload=finish_payload
-                )
-                await websocket.send(finish_frame)
-                
-                # 5. 接收音频数据
-                while True:
-                    try:
-                        response = await asyncio.wait_for(websocket.recv(), timeout=10.0)
-                        parsed = self._parse_binary_frame(response)
-                        
-                        if not parsed:
-                            continue
-                        
-                        event = parsed.get('event')
-                        payload = parsed.get('payload')
-                        
-                        if event == 352:  # TTSResponse - 音频数据
-                            if isinstance(payload, bytes):
-                                yield payload
-                            elif isinstance(payload, dict) and 'data' in payload:
-                                # payload中可能包含base64编码的音频数据
-                                import base64
-                                try:
-                                    audio_data = base64.b64decode(payload['data'])
-                                    yield audio_data
-                                except:
-                                    pass
-                        elif event == 351:  # TTSSentenceEnd
-                            logger.info("句子合成结束")
-                        elif event == 152:  # SessionFinished
-                            logger.info("Session结束")
+                    task_frame = encode_json_request(EVENT_TASK_REQUEST, session_id, task_payload)
+                    await websocket.send(task_frame)
+                    
+                    # 3. 发送FinishSession
+                    finish_frame = encode_json_request(EVENT_FINISH_SESSION, session_id)
+                    await websocket.send(finish_frame)
+                    
+                    # 4. 接收音频数据
+                    while True:
+                        try:
+                            response = await asyncio.wait_for(websocket.recv(), timeout=10.0)
+                            frame = parse_frame(response)
+                            
+                            if not frame:
+                                continue
+                            
+                            event = frame.event
+                            
+                            if event == 352:  # TTSResponse - 音频数据
+                                if first_audio:
+                                    # 首包延迟（含借用连接）计入滚动统计，用于计算对冲截止时间
+                                    policy.record_first_byte(time.monotonic() - started_at)
+                                    first_audio = False
+                                if frame.is_audio:
+                                    yield frame.payload  # 原消息上的memoryview，不拷贝
+                                else:
+                                    # payload中可能包含base64编码的音频数据
+                                    payload = frame.json()
+                                    if payload and 'data' in payload:
+                                        import base64
+                                        try:
+                                            audio_data = base64.b64decode(payload['data'])
+                                            yield audio_data
+                                        except:
+                                            pass
+                            elif event == 351:  # TTSSentenceEnd
+                                logger.info("句子合成结束")
+                            elif event == 152:  # SessionFinished
+                                logger.info("Session结束")
+                                conn.reusable = True  # 会话正常结束，连接可归还复用
+                                if session_status is not None:
+                                    session_status['finished'] = True
+                                break
+                            elif event == 153:  # SessionFailed
+                                logger.error(f"Session失败: {frame.json()}")
+                                break
+                                
+                        except asyncio.TimeoutError:
+                            logger.warning("接收音频数据超时")
                             break
-                        elif event == 153:  # SessionFailed
-                            logger.error(f"Session失败: {payload}")
+                        except Exception as e:
+                            logger.error(f"接收音频数据错误: {e}")
                             break
-                            
-                    except asyncio.TimeoutError:
-                        logger.warning("接收音频数据超时")
-                        break
-                    except Exception as e:
-                        logger.error(f"接收音频数据错误: {e}")
-                        break
-                
-                # 6. 发送FinishConnection
-                finish_conn_payload = json.dumps({}).encode('utf-8')
-                finish_conn_frame = self._create_binary_frame(
-                    message_type=1,  # Full-client request
-                    event=2,  # FinishConnection
-                    payload=finish_conn_payload
-                )
-                await websocket.send(finish_conn_frame)
-                
+                    
         except Exception as e:
             logger.error(f"豆包TTS连接错误: {e}")
     
+    def _assemble_audio(self, chunks: list[bytes], options: TTSOptions) -> bytes:
+        """拼接一次会话的音频块（单会话逐句切分时后续句子不带WAV头，按会话采样率补头）"""
+        if options.audio_format == "wav":
+            return concat_wav(chunks, PCMFormat(sample_rate=options.sample_rate))
+        return concat_audio(chunks, options.audio_format)
+    
+    async def text_to_speech_cached(self, text: str, user_id: str = "default", emotion: str = "neutral",
+                                    pin: bool = False, options: Optional[TTSOptions] = None,
+                                    priority: int = PRIORITY_SENTENCE,
+                                    on_start: Optional[Callable[[], None]] = None) -> bytes:
+        """
+        合成完整音频，优先读取音频缓存；只有完整结束的会话才写入缓存（pin=True常驻内存）
+        缓存命中不占用会话名额；priority为未命中时的会话排队优先级，on_start见text_to_speech
+        WAV格式会整理成只带一个正确长度头的文件
+        """
+        options = options or self.default_options(emotion)
+        cache = get_shared_audio_cache()
+        if not pin and not cache.is_cacheable(text):
+            return self._assemble_audio([chunk async for chunk in self.text_to_speech(text, user_id, options=options, priority=priority, on_start=on_start)], options)
+        
+        cache_key = make_cache_key(text, options.voice_type, options.speed, options.emotion,
+                                   options.audio_format, options.sample_rate)
+        audio_data = await cache.get(cache_key)
+        if audio_data is not None:
+            logger.info(f"🗃️  TTS缓存命中: {text[:20]}（{len(audio_data)} bytes）")
+            if pin:
+                cache.pin(cache_key, audio_data)
+            return audio_data
+        
+        session_status = {}
+        audio_data = self._assemble_audio([chunk async for chunk in self.text_to_speech(text, user_id, session_status=session_status, options=options,
+                                                                 priority=priority, on_start=on_start)], options)
+        if audio_data and session_status.get('finished'):
+            await cache.put(cache_key, audio_data, pinned=pin)
+        return audio_data
+    
     async def text_to_speech_bidirectional(self, text_generator: AsyncGenerator[str, None], 
-                                           user_id: str = "default", emotion: str = "neutral") -> AsyncGenerator[bytes, None]:
+                                           user_id: str = "default", emotion: str = "neutral",
+                                           options: Optional[TTSOptions] = None,
+                                           priority: int = PRIORITY_FIRST_SENTENCE,
+                                           sentence_marks: bool = False) -> AsyncGenerator[Optional[bytes], None]:
         """
         真正的双向流式TTS
         接受文本生成器作为输入，边接收文本边发送给TTS，边接收音频
         参考文档：推荐将流式输出的文本直接输入该接口
+        sentence_marks=True 时，每收到一个351（TTSSentenceEnd）额外产出一个None作为句子边界
         """
         if not all([self.app_id, self.access_token]):
             logger.error("豆包TTS配置不完整")
             return
         
-        connection_id = str(uuid.uuid4())
-        session_id = str(uuid.uuid4())
+        options = options or self.default_options(emotion)
         
-        headers = {
-            'X-Api-App-Key': self.app_id,
-            'X-Api-Access-Key': self.access_token,
-            'X-Api-Resource-Id': self.resource_id,
-            'X-Api-Connect-Id': connection_id
-        }
+        session_id = str(uuid.uuid4())
         
         try:
-            async with websockets.connect(self.websocket_url, extra_headers=headers) as websocket:
-                logger.info(f"豆包TTS双向流式连接成功: {connection_id}")
-                
-                # 1. 发送StartConnection
-                start_conn_payload = json.dumps({}).encode('utf-8')
-                start_conn_frame = self._create_binary_frame(
-                    message_type=1,
-                    event=1,
-                    payload=start_conn_payload
-                )
-                await websocket.send(start_conn_frame)
-                
-                # 等待ConnectionStarted响应
-                response = await websocket.recv()
-                parsed = self._parse_binary_frame(response)
-                if not parsed or parsed.get('event') != 50:
-                    logger.error("StartConnection失败")
-                    return
+            # 占用会话名额后从连接池借用已完成StartConnection的连接（整段回复一个会话，默认按首句优先级）
+            async with get_shared_tts_scheduler().slot(priority), get_shared_pool(self).connection() as conn:
+                websocket = conn.websocket
+                logger.info(f"豆包TTS双向流式复用连接: {conn.connection_id}（第{conn.session_count}个会话）")
                 
-                logger.info("TTS双向流式Connection建立成功")
-                
-                # 2. 发送StartSession（不包含完整text，让TTS自己处理切句）
-                # 根据文档：speech_rate范围[-50,100]，100代表2.0倍速，-50代表0.5倍速，0代表1.0倍速
-                # 公式：speech_rate = (倍速 - 1.0) * 100
-                speech_rate = int((self.speed - 1.0) * 100)
-                speech_rate = max(-50, min(100, speech_rate))  # 限制范围[-50, 100]
-                logger.info(f"⚡ 双向流式语速: {self.speed}x → speech_rate={speech_rate}")
-                
-                audio_params = {
-                    "format": "wav",
-                    "sample_rate": 24000,
-                    "speech_rate": speech_rate,
-                    "loudness_rate": 0
-                }
-                
-                if emotion and emotion != "neutral":
-                    audio_params["emotion"] = emotion
+                # 1. 发送StartSession（不包含完整text，让TTS自己处理切句）
+                logger.info(f"⚡ 双向流式音色={options.voice_type}, 语速: {options.speed}x → speech_rate={options.speech_rate}")
                 
                 # 注意：StartSession不包含text，text通过TaskRequest发送
                 session_payload = {
@@ -400,30 +412,24 @@ class DoubaoTTSClient:
                     "event": 100,
                     "namespace": "BidirectionalTTS",
                     "req_params": {
-                        "speaker": self.voice_type,
-                        "audio_params": audio_params
+                        "speaker": options.voice_type,
+                        "audio_params": options.audio_params()
                     }
                 }
                 
-                session_payload_bytes = json.dumps(session_payload).encode('utf-8')
-                start_session_frame = self._create_binary_frame(
-                    message_type=1,
-                    event=100,
-                    session_id=session_id,
-                    payload=session_payload_bytes
-                )
+                start_session_frame = encode_json_request(EVENT_START_SESSION, session_id, session_payload)
                 await websocket.send(start_session_frame)
                 
                 # 等待SessionStarted响应
                 response = await websocket.recv()
-                parsed = self._parse_binary_frame(response)
-                if not parsed or parsed.get('event') != 150:
+                frame = parse_frame(response)
+                if not frame or frame.event != 150:
                     logger.error("StartSession失败")
                     return
                 
                 logger.info("TTS双向流式Session建立成功")
                 
-                # 3. 创建发送任务和接收任务并发执行
+                # 2. 创建发送任务和接收任务并发执行
                 async def send_text_chunks():
                     """发送文本片段任务"""
                     import time
@@ -444,25 +450,13 @@ class DoubaoTTSClient:
                                         "text": text_chunk
                                     }
                                 }
-                                task_payload_bytes = json.dumps(task_payload).encode('utf-8')
-                                task_frame = self._create_binary_frame(
-                                    message_type=1,
-                                    event=200,
-                                    session_id=session_id,
-                                    payload=task_payload_bytes
-                                )
+                                task_frame = encode_json_request(EVENT_TASK_REQUEST, session_id, task_payload)
                                 await websocket.send(task_frame)
                         
                         # 文本发送完毕，发送FinishSession
                         elapsed = (time.time() - start_time) * 1000
                         logger.info(f"⏱️  [{elapsed:.0f}ms] 📤 文本发送完毕，发送FinishSession")
-                        finish_payload = json.dumps({}).encode('utf-8')
-                        finish_frame = self._create_binary_frame(
-                            message_type=1,
-                            event=102,
-                            session_id=session_id,
-                            payload=finish_payload
-                        )
+                        finish_frame = encode_json_request(EVENT_FINISH_SESSION, session_id)
                         await websocket.send(finish_frame)
                         
                     except Exception as e:
@@ -477,35 +471,39 @@ class DoubaoTTSClient:
                     try:
                         while True:
                             response = await asyncio.wait_for(websocket.recv(), timeout=30.0)
-                            parsed = self._parse_binary_frame(response)
+                            frame = parse_frame(response)
                             
-                            if not parsed:
+                            if not frame:
                                 continue
                             
-                            event = parsed.get('event')
-                            payload = parsed.get('payload')
+                            event = frame.event
                             elapsed = (time.time() - start_time) * 1000
                             
                             if event == 352:  # TTSResponse - 音频数据
                                 audio_count += 1
-                                logger.info(f"⏱️  [{elapsed:.0f}ms] 🔊 收到音频#{audio_count}: {len(payload) if isinstance(payload, bytes) else 'base64'}")
+                                logger.info(f"⏱️  [{elapsed:.0f}ms] 🔊 收到音频#{audio_count}: {len(frame.payload) if frame.is_audio else 'base64'}")
                                 
-                                if isinstance(payload, bytes):
-                                    yield payload
-                                elif isinstance(payload, dict) and 'data' in payload:
-                                    import base64
-                                    try:
-                                        audio_data = base64.b64decode(payload['data'])
-                                        yield audio_data
-                                    except:
-                                        pass
+                                if frame.is_audio:
+                                    yield frame.payload
+                                else:
+                                    payload = frame.json()
+                                    if payload and 'data' in payload:
+                                        import base64
+                                        try:
+                                            audio_data = base64.b64decode(payload['data'])
+                                            yield audio_data
+                                        except:
+                                            pass
                             elif event == 351:  # TTSSentenceEnd
                                 logger.info(f"⏱️  [{elapsed:.0f}ms] 🔊 TTS句子合成结束")
+                                if sentence_marks:
+                                    yield None
                             elif event == 152:  # SessionFinished
                                 logger.info(f"⏱️  [{elapsed:.0f}ms] 🔊 TTS Session结束")
+                                conn.reusable = True  # 会话正常结束，连接可归还复用
                                 break
                             elif event == 153:  # SessionFailed
-                                logger.error(f"TTS Session失败: {payload}")
+                                logger.error(f"TTS Session失败: {frame.json()}")
                                 break
                                 
                     except asyncio.TimeoutError:
@@ -513,7 +511,7 @@ class DoubaoTTSClient:
                     except Exception as e:
                         logger.error(f"接收音频数据错误: {e}")
                 
-                # 4. 并发执行发送和接收任务
+                # 3. 并发执行发送和接收任务
                 send_task = asyncio.create_task(send_text_chunks())
                 
                 # 边发送边接收音频
@@ -523,18 +521,30 @@ class DoubaoTTSClient:
                 # 等待发送任务完成
                 await send_task
                 
-                # 5. 发送FinishConnection
-                finish_conn_payload = json.dumps({}).encode('utf-8')
-                finish_conn_frame = self._create_binary_frame(
-                    message_type=1,
-                    event=2,
-                    payload=finish_conn_payload
-                )
-                await websocket.send(finish_conn_frame)
-                
         except Exception as e:
             logger.error(f"豆包TTS双向流式错误: {e}")
     
+    async def text_to_speech_sentences(self, text_generator: AsyncGenerator[str, None],
+                                       user_id: str = "default", emotion: str = "neutral",
+                                       options: Optional[TTSOptions] = None,
+                                       priority: int = PRIORITY_FIRST_SENTENCE) -> AsyncGenerator[bytes, None]:
+        """
+        单会话逐句合成：整段文本流送入一个双向会话，按351事件切分，每句产出一段完整音频
+        （WAV每句带正确长度的头），便于按句编号发送
+        """
+        options = options or self.default_options(emotion)
+        chunks = []
+        async for chunk in self.text_to_speech_bidirectional(text_generator, user_id, options=options,
+                                                             priority=priority, sentence_marks=True):
+            if chunk is not None:
+                chunks.append(chunk)
+            elif chunks:
+                yield self._assemble_audio(chunks, options)
+                chunks = []
+        # 会话异常结束时，最后一句可能没有351
+        if chunks:
+            yield self._assemble_audio(chunks, options)
+    
     async def test_connection(self) -> bool:
         """测试TTS连接"""
         try:
@@ -0,0 +1,251 @@
+"""
+豆包双向流式TTS二进制帧编解码
+编码时定长部分按预编译布局一次写出；固定事件（1/2/100/102/200）的帧头预先算好，连接级帧整帧预先编码
+解码时只按偏移读取定长字段，不做切片拷贝；音频负载直接返回 memoryview，JSON负载按需解析
+
+帧格式：4字节头 [版本|头长][消息类型|标志][序列化|压缩][保留]
+       + 事件号(可选) + 会话ID长度+会话ID(会话级事件) + 负载长度+负载
+"""
+
+import gzip
+import json
+import struct
+import time
+from typing import Optional, Union
+
+# 消息类型
+FULL_CLIENT_REQUEST = 1
+AUDIO_ONLY_REQUEST = 2
+FULL_SERVER_RESPONSE = 9
+AUDIO_ONLY_RESPONSE = 11
+ERROR_INFORMATION = 15
+
+# 序列化 / 压缩方式
+SERIALIZATION_RAW = 0
+SERIALIZATION_JSON = 1
+COMPRESSION_NONE = 0
+COMPRESSION_GZIP = 1
+
+FLAG_WITH_EVENT = 0x04
+
+# 事件号
+EVENT_START_CONNECTION = 1
+EVENT_FINISH_CONNECTION = 2
+EVENT_CONNECTION_STARTED = 50
+EVENT_CONNECTION_FAILED = 51
+EVENT_CONNECTION_FINISHED = 52
+EVENT_START_SESSION = 100
+EVENT_FINISH_SESSION = 102
+EVENT_SESSION_STARTED = 150
+EVENT_SESSION_FINISHED = 152
+EVENT_SESSION_FAILED = 153
+EVENT_TASK_REQUEST = 200
+EVENT_TTS_SENTENCE_START = 350
+EVENT_TTS_SENTENCE_END = 351
+EVENT_TTS_RESPONSE = 352
+
+# 服务端连接级事件可能带连接ID；会话级事件（>=100）一定带会话ID
+_CONNECTION_EVENTS_WITH_ID = (EVENT_CONNECTION_STARTED, EVENT_CONNECTION_FAILED, EVENT_CONNECTION_FINISHED)
+
+_U32 = struct.Struct('!I')
+_HEADER = struct.Struct('!BBBB')
+_HEADER_WITH_EVENT = struct.Struct('!BBBBI')
+_SESSION_PREFIX = struct.Struct('!BBBBII')  # 4字节头 + 事件号 + 会话ID长度
+
+
+def _header(message_type: int, event: Optional[int], serialization: int, compression: int) -> bytes:
+    flags = FLAG_WITH_EVENT if event is not None else 0
+    fields = (0x11, (message_type << 4) | flags, (serialization << 4) | compression, 0x00)
+    if event is None:
+        return _HEADER.pack(*fields)
+    return _HEADER_WITH_EVENT.pack(*fields, event)
+
+
+# 客户端固定事件（JSON、不压缩）的帧头 + 事件号
+_FIXED_PREFIXES = {
+    event: _header(FULL_CLIENT_REQUEST, event, SERIALIZATION_JSON, COMPRESSION_NONE)
+    for event in (EVENT_START_CONNECTION, EVENT_FINISH_CONNECTION, EVENT_START_SESSION,
+                  EVENT_FINISH_SESSION, EVENT_TASK_REQUEST)
+}
+
+
+_prefix_layouts: dict[tuple[bytes, int], struct.Struct] = {}
+
+
+def _prefix_layout(prefix: bytes, session_len: int) -> struct.Struct:
+    """帧头 + 会话ID + 负载长度 的定长布局（按帧头和会话ID长度缓存，会话ID通常是36字节UUID）"""
+    key = (prefix, session_len)
+    layout = _prefix_layouts.get(key)
+    if layout is None:
+        if session_len:
+            layout = struct.Struct(f'!{len(prefix)}sI{session_len}sI')
+        else:
+            layout = struct.Struct(f'!{len(prefix)}sI')
+        _prefix_layouts[key] = layout
+    return layout
+
+
+def encode_frame(message_type: int, event: Optional[int] = None, session_id: Optional[str] = None,
+                 payload: Union[bytes, bytearray, memoryview] = b'{}',
+                 serialization: int = SERIALIZATION_JSON, compression: int = COMPRESSION_NONE) -> bytes:
+    """
+    编码一帧：定长部分用预编译的布局一次写出，再接上负载，不做逐字段拼接
+    （实测CPython中逐帧分配bytearray再pack_into比一次pack+拼接更慢，因此采用后者）
+    """
+    prefix = None
+    if message_type == FULL_CLIENT_REQUEST and serialization == SERIALIZATION_JSON and compression == COMPRESSION_NONE:
+        prefix = _FIXED_PREFIXES.get(event)
+    if prefix is None:
+        prefix = _header(message_type, event, serialization, compression)
+
+    if session_id:
+        session_bytes = session_id.encode('utf-8')
+        head = _prefix_layout(prefix, len(session_bytes)).pack(prefix, len(session_bytes), session_bytes, len(payload))
+    else:
+        head = _prefix_layout(prefix, 0).pack(prefix, len(payload))
+    return head + payload
+
+
+def encode_json_request(event: int, session_id: Optional[str] = None, body: Optional[dict] = None) -> bytes:
+    """编码客户端JSON请求帧（StartSession/TaskRequest/FinishSession等）"""
+    payload = json.dumps(body, ensure_ascii=False).encode('utf-8') if body else b'{}'
+    return encode_frame(FULL_CLIENT_REQUEST, event, session_id, payload)
+
+
+# 负载固定为{}的连接级帧，整帧预先编码
+START_CONNECTION_FRAME = encode_frame(FULL_CLIENT_REQUEST, EVENT_START_CONNECTION)
+FINISH_CONNECTION_FRAME = encode_frame(FULL_CLIENT_REQUEST, EVENT_FINISH_CONNECTION)
+
+
+class Frame:
+    """解析后的帧；payload是原消息上的memoryview（未拷贝）"""
+
+    __slots__ = ('message_type', 'serialization', 'compression', 'event', 'session_id', 'error_code', 'payload')
+
+    def __init__(self, message_type: int, serialization: int, compression: int, event: Optional[int],
+                 session_id: Optional[str], error_code: Optional[int], payload: memoryview):
+        self.message_type = message_type
+        self.serialization = serialization
+        self.compression = compression
+        self.event = event
+        self.session_id = session_id  # 连接级事件中为连接ID
+        self.error_code = error_code
+        self.payload = payload
+
+    @property
+    def is_audio(self) -> bool:
+        return self.event == EVENT_TTS_RESPONSE and self.serialization == SERIALIZATION_RAW
+
+    def raw_payload(self) -> bytes:
+        """解压后的负载（会拷贝，控制帧使用）"""
+        if self.compression == COMPRESSION_GZIP:
+            return gzip.decompress(self.payload)
+        return bytes(self.payload)
+
+    def json(self) -> Optional[dict]:
+        """按需解析JSON负载，非JSON或解析失败时返回None"""
+        if self.serialization != SERIALIZATION_JSON:
+            return None
+        try:
+            return json.loads(self.raw_payload())
+        except (ValueError, OSError):
+            return None
+
+    def __repr__(self) -> str:
+        return (f"Frame(type={self.message_type}, event={self.event}, session_id={self.session_id}, "
+                f"error_code={self.error_code}, payload={len(self.payload)} bytes)")
+
+
+def parse_frame(data: Union[bytes, bytearray, memoryview]) -> Optional[Frame]:
+    """解析一帧，格式不完整时返回None；只读取定长字段，负载以memoryview返回"""
+    size = len(data)
+    if size < 4:
+        return None
+
+    # 快速路径：标准4字节头的会话级事件（352音频帧都走这里），一次解出头、事件号和会话ID长度
+    if size >= 12 and data[0] == 0x11 and data[1] & FLAG_WITH_EVENT and data[1] >> 4 != ERROR_INFORMATION:
+        _, header_byte1, header_byte2, _, event, id_len = _SESSION_PREFIX.unpack_from(data, 0)
+        if event >= EVENT_START_SESSION:
+            id_end = 12 + id_len
+            if size < id_end + 4:
+                return None
+            payload_len = _U32.unpack_from(data, id_end)[0]
+            offset = id_end + 4
+            if size < offset + payload_len:
+                return None
+            return Frame(header_byte1 >> 4, header_byte2 >> 4, header_byte2 & 0x0F, event,
+                         str(data[12:id_end], 'utf-8'), None, memoryview(data)[offset:offset + payload_len])
+
+    header_byte0, header_byte1, header_byte2, _ = _HEADER.unpack_from(data, 0)
+    message_type = header_byte1 >> 4
+    serialization = header_byte2 >> 4
+    compression = header_byte2 & 0x0F
+    offset = (header_byte0 & 0x0F) * 4
+
+    error_code = None
+    if message_type == ERROR_INFORMATION:
+        if size < offset + 4:
+            return None
+        error_code = _U32.unpack_from(data, offset)[0]
+        offset += 4
+
+    event = None
+    if header_byte1 & FLAG_WITH_EVENT:
+        if size < offset + 4:
+            return None
+        event = _U32.unpack_from(data, offset)[0]
+        offset += 4
+
+    session_id = None
+    if event is not None and (event >= EVENT_START_SESSION or event in _CONNECTION_EVENTS_WITH_ID):
+        if size < offset + 4:
+            return None
+        id_len = _U32.unpack_from(data, offset)[0]
+        id_end = offset + 4 + id_len
+        # 连接级事件的连接ID可选：只有后续长度字段与剩余字节数恰好吻合时才按ID解析
+        has_id = event >= EVENT_START_SESSION or (
+            id_end + 4 <= size and _U32.unpack_from(data, id_end)[0] == size - id_end - 4
+        )
+        if has_id:
+            if id_end > size:
+                return None
+            session_id = str(data[offset + 4:id_end], 'utf-8')
+            offset = id_end
+
+    if size < offset + 4:
+        return None
+    payload_len = _U32.unpack_from(data, offset)[0]
+    offset += 4
+    if size < offset + payload_len:
+        return None
+
+    return Frame(message_type, serialization, compression, event, session_id, error_code,
+                 memoryview(data)[offset:offset + payload_len])
+
+
+def benchmark(iterations: int = 200000, audio_bytes: int = 4800):
+    """微基准：编码TaskRequest帧、解析352音频帧（默认100ms的24kHz 16bit音频）"""
+    from loguru import logger
+
+    session_id = "3f6c2a9e-5d1b-4c8e-9a7f-0b2d4e6f8a1c"
+    task_payload = json.dumps({"req_params": {"text": "今天天气很好，我们去公园散步吧。"}}, ensure_ascii=False).encode('utf-8')
+    audio_frame = encode_frame(AUDIO_ONLY_RESPONSE, EVENT_TTS_RESPONSE, session_id,
+                               b'\x00' * audio_bytes, serialization=SERIALIZATION_RAW)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        encode_frame(FULL_CLIENT_REQUEST, EVENT_TASK_REQUEST, session_id, task_payload)
+    encode_ns = (time.perf_counter() - start) / iterations * 1e9
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        parse_frame(audio_frame).payload
+    parse_ns = (time.perf_counter() - start) / iterations * 1e9
+
+    logger.info(f"📦 编码TaskRequest: {encode_ns:.0f}ns/帧；解析352音频帧({audio_bytes} bytes): {parse_ns:.0f}ns/帧"
+                f"（{iterations}次）")
+    return encode_ns, parse_ns
+
+
+if __name__ == "__main__":
+    benchmark()
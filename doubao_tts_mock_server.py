@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+豆包双向流式TTS协议本地替身服务
+使用与 DoubaoTTSClient 相同的二进制帧，返回合成的PCM音频，用于压测语音链路而不消耗配额
+
+支持的事件：
+    StartConnection 1 → 50（失败 51），FinishConnection 2 → 52
+    StartSession 100 → 150，TaskRequest 200，FinishSession 102
+    350 句子开始 → 352 音频 → 351 句子结束，会话结束 152 / 失败 153
+
+启动：
+    python doubao_tts_mock_server.py
+客户端指向替身服务（鉴权变量填任意值即可）：
+    DOUBAO_TTS_WS_URL=ws://127.0.0.1:8765 DOUBAO_TTS_APPID=mock DOUBAO_TTS_ACCESS_TOKEN=mock DOUBAO_TTS_SECRET_KEY=mock
+
+行为通过环境变量配置（MOCK_TTS_*），见 MockTTSConfig
+"""
+
+import os
+import re
+import json
+import random
+import asyncio
+from dataclasses import dataclass, field
+from typing import Optional
+import numpy as np
+import websockets
+from loguru import logger
+from doubao_tts_codec import (AUDIO_ONLY_RESPONSE, EVENT_TTS_RESPONSE, FULL_SERVER_RESPONSE, SERIALIZATION_RAW,
+                              encode_frame, parse_frame)
+from audio_assembly import PCMFormat, build_wav_header
+
+SENTENCE_END = re.compile(r'[。！？.!?；;\n]')
+
+
+@dataclass
+class MockTTSConfig:
+    """替身服务行为参数"""
+    host: str = "127.0.0.1"
+    port: int = 8765
+    first_byte_ms: float = 150.0       # TaskRequest到首个音频的延迟
+    jitter_ms: float = 50.0            # 首包和每个音频块额外的随机延迟（0~jitter）
+    realtime_factor: float = 5.0       # 吞吐：每秒墙钟时间生成多少秒音频
+    chunk_ms: float = 100.0            # 每个352音频块包含的音频时长
+    ms_per_char: float = 180.0         # 每个字对应的音频时长（再除以语速）
+    lead_silence_ms: float = 80.0      # 每句开头的静音
+    session_failure_rate: float = 0.0  # 会话返回153的概率
+    drop_rate: float = 0.0             # 音频中途直接断开连接的概率
+    connect_failure_rate: float = 0.0  # StartConnection返回51的概率
+
+    @classmethod
+    def from_env(cls) -> "MockTTSConfig":
+        return cls(
+            host=os.getenv("MOCK_TTS_HOST", cls.host),
+            port=int(os.getenv("MOCK_TTS_PORT", cls.port)),
+            first_byte_ms=float(os.getenv("MOCK_TTS_FIRST_BYTE_MS", cls.first_byte_ms)),
+            jitter_ms=float(os.getenv("MOCK_TTS_JITTER_MS", cls.jitter_ms)),
+            realtime_factor=float(os.getenv("MOCK_TTS_REALTIME_FACTOR", cls.realtime_factor)),
+            chunk_ms=float(os.getenv("MOCK_TTS_CHUNK_MS", cls.chunk_ms)),
+            ms_per_char=float(os.getenv("MOCK_TTS_MS_PER_CHAR", cls.ms_per_char)),
+            lead_silence_ms=float(os.getenv("MOCK_TTS_LEAD_SILENCE_MS", cls.lead_silence_ms)),
+            session_failure_rate=float(os.getenv("MOCK_TTS_SESSION_FAILURE_RATE", cls.session_failure_rate)),
+            drop_rate=float(os.getenv("MOCK_TTS_DROP_RATE", cls.drop_rate)),
+            connect_failure_rate=float(os.getenv("MOCK_TTS_CONNECT_FAILURE_RATE", cls.connect_failure_rate)),
+        )
+
+
+def synthesize_pcm(text: str, fmt: PCMFormat, speech_rate: int, config: MockTTSConfig) -> bytes:
+    """生成与文本长度成正比的合成语音：句首静音 + 每个字一个不同音高的正弦音（空白为静音）"""
+    speed = 1.0 + speech_rate / 100
+    samples_per_char = max(1, int(fmt.sample_rate * config.ms_per_char / 1000 / max(speed, 0.1)))
+    lead_samples = int(fmt.sample_rate * config.lead_silence_ms / 1000)
+
+    frequencies = np.array([0 if char.isspace() else 160 + (ord(char) % 24) * 10 for char in text], dtype=np.float32)
+    t = np.arange(samples_per_char, dtype=np.float32) / fmt.sample_rate
+    tone = 6000 * np.sin(2 * np.pi * np.outer(frequencies, t))
+    pcm = np.concatenate([np.zeros(lead_samples, dtype=np.float32), tone.ravel()])
+    if fmt.channels > 1:
+        pcm = np.repeat(pcm, fmt.channels)
+    return pcm.astype('<i2').tobytes()
+
+
+@dataclass
+class MockSession:
+    session_id: str
+    audio_format: str = "wav"
+    fmt: PCMFormat = field(default_factory=PCMFormat)
+    speech_rate: int = 0
+    texts: asyncio.Queue = field(default_factory=asyncio.Queue)  # None 表示FinishSession
+    header_sent: bool = False
+
+
+class MockDoubaoTTSServer:
+    """替身服务：每个连接串行处理会话，会话内按句子生成音频"""
+
+    def __init__(self, config: Optional[MockTTSConfig] = None):
+        self.config = config or MockTTSConfig.from_env()
+        self.stats = {"connections": 0, "sessions": 0, "sentences": 0, "audio_bytes": 0,
+                      "failed_sessions": 0, "dropped": 0, "failed_connections": 0}
+
+    def _jitter(self) -> float:
+        return random.uniform(0, self.config.jitter_ms) / 1000
+
+    async def _send_event(self, ws, event: int, session_id: Optional[str] = None, payload: dict = None):
+        frame = encode_frame(FULL_SERVER_RESPONSE, event, session_id,
+                             json.dumps(payload or {}, ensure_ascii=False).encode('utf-8'))
+        await ws.send(frame)
+
+    async def _send_audio(self, ws, session: MockSession, audio: bytes):
+        frame = encode_frame(AUDIO_ONLY_RESPONSE, EVENT_TTS_RESPONSE, session.session_id, audio,
+                             serialization=SERIALIZATION_RAW)
+        await ws.send(frame)
+        self.stats["audio_bytes"] += len(audio)
+
+    async def _speak_sentence(self, ws, session: MockSession, text: str, first: bool):
+        """一个句子：350 → 若干352（按吞吐节奏发送）→ 351；会话首句前先等待首包延迟"""
+        config = self.config
+        if first:
+            await asyncio.sleep(config.first_byte_ms / 1000 + self._jitter())
+        await self._send_event(ws, 350, session.session_id, {"text": text})
+        pcm = synthesize_pcm(text, session.fmt, session.speech_rate, config)
+        if session.audio_format == "wav" and not session.header_sent:
+            # 会话首个音频块带一个流式WAV头，之后只发PCM
+            pcm = build_wav_header(session.fmt) + pcm
+            session.header_sent = True
+
+        chunk_bytes = max(session.fmt.block_align,
+                          int(session.fmt.byte_rate * config.chunk_ms / 1000) // session.fmt.block_align * session.fmt.block_align)
+        chunk_seconds = config.chunk_ms / 1000 / max(config.realtime_factor, 0.01)
+        for offset in range(0, len(pcm), chunk_bytes):
+            if offset and random.random() < config.drop_rate / max(1, len(pcm) // chunk_bytes):
+                self.stats["dropped"] += 1
+                logger.warning(f"🧪 模拟断连: {session.session_id}")
+                await ws.close(code=1011, reason="mock drop")
+                return
+            await self._send_audio(ws, session, pcm[offset:offset + chunk_bytes])
+            await asyncio.sleep(chunk_seconds + (self._jitter() if offset else 0))
+
+        await self._send_event(ws, 351, session.session_id, {"text": text})
+        self.stats["sentences"] += 1
+
+    async def _run_session(self, ws, session: MockSession):
+        """消费会话文本：凑满一句就合成，FinishSession后合成剩余文本并结束"""
+        buffer = ""
+        first = True
+        try:
+            if random.random() < self.config.session_failure_rate:
+                await asyncio.sleep(self.config.first_byte_ms / 1000)
+                self.stats["failed_sessions"] += 1
+                await self._send_event(ws, 153, session.session_id, {"status_code": 50000000, "message": "mock failure"})
+                return
+
+            while True:
+                text = await session.texts.get()
+                if text is None:
+                    break
+                buffer += text
+                while (match := SENTENCE_END.search(buffer)):
+                    sentence, buffer = buffer[:match.end()].strip(), buffer[match.end():]
+                    if sentence:
+                        await self._speak_sentence(ws, session, sentence, first)
+                        first = False
+
+            if buffer.strip():
+                await self._speak_sentence(ws, session, buffer.strip(), first)
+            await self._send_event(ws, 152, session.session_id, {"status_code": 20000000})
+        except websockets.ConnectionClosed:
+            pass
+
+    async def handle_connection(self, ws):
+        self.stats["connections"] += 1
+        sessions: dict[str, MockSession] = {}
+        tasks = set()
+        try:
+            async for message in ws:
+                frame = parse_frame(message)
+                if not frame:
+                    continue
+                event = frame.event
+                session_id = frame.session_id
+                payload = frame.json() or {}
+
+                if event == 1:  # StartConnection
+                    if random.random() < self.config.connect_failure_rate:
+                        self.stats["failed_connections"] += 1
+                        await self._send_event(ws, 51, payload={"message": "mock connect failure"})
+                        await ws.close()
+                        return
+                    await self._send_event(ws, 50)
+                elif event == 2:  # FinishConnection
+                    await self._send_event(ws, 52)
+                    await ws.close()
+                    return
+                elif event == 100:  # StartSession
+                    audio_params = payload.get('req_params', {}).get('audio_params', {})
+                    session = MockSession(
+                        session_id=session_id,
+                        audio_format=audio_params.get('format', 'wav'),
+                        fmt=PCMFormat(sample_rate=int(audio_params.get('sample_rate', 24000))),
+                        speech_rate=int(audio_params.get('speech_rate', 0))
+                    )
+                    if session.audio_format not in ("wav", "pcm"):
+                        logger.warning(f"替身服务不编码 {session.audio_format}，按PCM返回")
+                    sessions[session_id] = session
+                    self.stats["sessions"] += 1
+                    await self._send_event(ws, 150, session_id)
+                    task = asyncio.create_task(self._run_session(ws, session))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                elif event == 200 and session_id in sessions:  # TaskRequest
+                    sessions[session_id].texts.put_nowait(payload.get('req_params', {}).get('text', ''))
+                elif event == 102 and session_id in sessions:  # FinishSession
+                    sessions.pop(session_id).texts.put_nowait(None)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def serve(self):
+        config = self.config
+        async with websockets.serve(self.handle_connection, config.host, config.port, max_size=None):
+            logger.info(f"🧪 豆包TTS替身服务已启动: ws://{config.host}:{config.port} {config}")
+            try:
+                await asyncio.Future()
+            finally:
+                logger.info(f"🧪 豆包TTS替身服务统计: {self.stats}")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(MockDoubaoTTSServer().serve())
+    except KeyboardInterrupt:
+        pass
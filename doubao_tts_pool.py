@@ -0,0 +1,223 @@
+"""
+豆包TTS WebSocket连接池
+保持已完成StartConnection握手的连接，在同一连接上串行运行多次StartSession/FinishSession
+连接池本身不限制借出数量，并发会话数只由 tts_scheduler 按优先级控制；这里只限制保留的空闲连接数
+"""
+
+import os
+import time
+import uuid
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional
+import websockets
+from loguru import logger
+from doubao_tts_codec import EVENT_CONNECTION_STARTED, FINISH_CONNECTION_FRAME, START_CONNECTION_FRAME, parse_frame
+from tts_scheduler import get_shared_tts_scheduler
+
+
+class PooledTTSConnection:
+    """连接池中的单个连接（已完成StartConnection）"""
+
+    def __init__(self, websocket, connection_id: str):
+        self.websocket = websocket
+        self.connection_id = connection_id
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.session_count = 0
+        self.reusable = False  # 由调用方在收到SessionFinished后置为True
+
+    @property
+    def is_open(self) -> bool:
+        return not self.websocket.closed
+
+    @property
+    def idle_seconds(self) -> float:
+        return time.monotonic() - self.last_used
+
+
+class DoubaoTTSConnectionPool:
+    """豆包TTS连接池：复用TLS连接，每次合成只付出StartSession的开销"""
+
+    def __init__(self, client, max_size: Optional[int] = None,
+                 max_sessions_per_connection: Optional[int] = None,
+                 idle_timeout: Optional[float] = None,
+                 health_check_interval: Optional[float] = None,
+                 connect_timeout: float = 10.0):
+        self.client = client
+        # 最多保留的空闲连接数，默认与调度器的并发会话上限一致
+        self.max_size = max_size or int(os.getenv("DOUBAO_TTS_POOL_SIZE", "0")) or get_shared_tts_scheduler().max_sessions
+        self.max_sessions_per_connection = max_sessions_per_connection or int(os.getenv("DOUBAO_TTS_POOL_MAX_SESSIONS", "100"))
+        self.idle_timeout = idle_timeout or float(os.getenv("DOUBAO_TTS_POOL_IDLE_TIMEOUT", "60"))
+        self.health_check_interval = health_check_interval or float(os.getenv("DOUBAO_TTS_POOL_HEALTH_INTERVAL", "10"))
+        self.connect_timeout = connect_timeout
+
+        self._idle: deque[PooledTTSConnection] = deque()
+        self._in_use = 0
+        self._closing = False
+
+        # 统计信息
+        self.created_count = 0
+        self.reused_count = 0
+        self.evicted_count = 0
+
+    async def _open_connection(self) -> PooledTTSConnection:
+        """建立新连接并完成StartConnection握手"""
+        connection_id = str(uuid.uuid4())
+        headers = {
+            'X-Api-App-Key': self.client.app_id,
+            'X-Api-Access-Key': self.client.access_token,
+            'X-Api-Resource-Id': self.client.resource_id,
+            'X-Api-Connect-Id': connection_id
+        }
+
+        websocket = await asyncio.wait_for(
+            websockets.connect(self.client.websocket_url, extra_headers=headers),
+            timeout=self.connect_timeout
+        )
+
+        try:
+            await websocket.send(START_CONNECTION_FRAME)
+
+            response = await asyncio.wait_for(websocket.recv(), timeout=self.connect_timeout)
+            frame = parse_frame(response)
+            if not frame or frame.event != EVENT_CONNECTION_STARTED:
+                raise ConnectionError(f"StartConnection失败: {frame.json() if frame else response!r}")
+        except BaseException:
+            await websocket.close()
+            raise
+
+        self.created_count += 1
+        logger.info(f"🔌 TTS连接池新建连接: {connection_id}（当前空闲 {len(self._idle)}）")
+        return PooledTTSConnection(websocket, connection_id)
+
+    async def _close_connection(self, conn: PooledTTSConnection):
+        """发送FinishConnection并关闭连接"""
+        try:
+            if conn.is_open:
+                await conn.websocket.send(FINISH_CONNECTION_FRAME)
+            await conn.websocket.close()
+        except Exception as e:
+            logger.debug(f"关闭TTS连接 {conn.connection_id} 时出错: {e}")
+
+    def _is_expired(self, conn: PooledTTSConnection) -> bool:
+        return (not conn.is_open
+                or conn.idle_seconds > self.idle_timeout
+                or conn.session_count >= self.max_sessions_per_connection)
+
+    def _evict_idle(self):
+        """淘汰已关闭、空闲过久或会话数达到上限的连接"""
+        kept = deque()
+        while self._idle:
+            conn = self._idle.popleft()
+            if self._is_expired(conn):
+                self.evicted_count += 1
+                asyncio.ensure_future(self._close_connection(conn))
+            else:
+                kept.append(conn)
+        self._idle = kept
+
+    async def _check_health(self, conn: PooledTTSConnection) -> bool:
+        """空闲超过检查间隔的连接，借出前先ping一次"""
+        if not conn.is_open:
+            return False
+        if conn.idle_seconds < self.health_check_interval:
+            return True
+        try:
+            pong_waiter = await conn.websocket.ping()
+            await asyncio.wait_for(pong_waiter, timeout=2.0)
+            return True
+        except Exception as e:
+            logger.debug(f"TTS连接 {conn.connection_id} 健康检查失败: {e}")
+            return False
+
+    async def acquire(self) -> PooledTTSConnection:
+        """借出一个可用连接（优先复用最近使用的空闲连接）；并发数由调用方经调度器控制"""
+        self._evict_idle()
+        while self._idle:
+            conn = self._idle.pop()
+            if await self._check_health(conn):
+                self.reused_count += 1
+                break
+            self.evicted_count += 1
+            asyncio.ensure_future(self._close_connection(conn))
+        else:
+            conn = await self._open_connection()
+
+        self._in_use += 1
+        conn.session_count += 1
+        conn.reusable = False
+        return conn
+
+    def release(self, conn: PooledTTSConnection):
+        """归还连接；会话未正常结束的连接或超出空闲上限的连接直接丢弃"""
+        self._in_use -= 1
+        conn.last_used = time.monotonic()
+
+        if (conn.reusable and not self._closing and not self._is_expired(conn)
+                and len(self._idle) < self.max_size):
+            self._idle.append(conn)
+        else:
+            # 关闭放到后台，避免在生成器清理阶段await
+            asyncio.ensure_future(self._close_connection(conn))
+        self._evict_idle()
+
+    @asynccontextmanager
+    async def connection(self):
+        """借用连接的上下文管理器"""
+        conn = await self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    async def prefill(self, count: int = 1):
+        """预先建立连接放入空闲队列"""
+        conns = []
+        try:
+            for _ in range(min(count, self.max_size)):
+                conn = await self.acquire()
+                conn.session_count -= 1  # 预建连接不计入会话数
+                conn.reusable = True
+                conns.append(conn)
+        finally:
+            for conn in conns:
+                self.release(conn)
+
+    async def close(self):
+        """关闭所有空闲连接（借出中的连接归还时关闭）"""
+        self._closing = True
+        while self._idle:
+            await self._close_connection(self._idle.popleft())
+
+    def stats(self) -> dict:
+        return {
+            "max_size": self.max_size,
+            "idle": len(self._idle),
+            "in_use": self._in_use,
+            "created": self.created_count,
+            "reused": self.reused_count,
+            "evicted": self.evicted_count
+        }
+
+
+# 进程内共享连接池，按鉴权信息区分
+_shared_pools: dict[tuple, DoubaoTTSConnectionPool] = {}
+
+
+def get_shared_pool(client) -> DoubaoTTSConnectionPool:
+    """获取与客户端鉴权信息对应的共享连接池"""
+    key = (client.websocket_url, client.app_id, client.access_token, client.resource_id)
+    pool = _shared_pools.get(key)
+    if pool is None or pool._closing:
+        pool = DoubaoTTSConnectionPool(client)
+        _shared_pools[key] = pool
+    return pool
+
+
+async def close_shared_pools():
+    """关闭所有共享连接池（服务关闭时调用）"""
+    for pool in list(_shared_pools.values()):
+        await pool.close()
+    _shared_pools.clear()
@@ -1,4 +1,3 @@
-import httpx
 import json
 import asyncio
 import random
@@ -7,6 +6,7 @@ from loguru import logger
 import os
 from dotenv import load_dotenv
 from .conversation_stage_manager import ConversationStageManager
+from ark_http_client import ArkHTTPError, get_shared_ark_transport
 
 load_dotenv()
 
@@ -372,33 +372,33 @@ class LLMClient:
         
         try:
             logger.info("开始LLM预热...")
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                headers = {
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {self.api_key}"
-                }
-                
-                data = {
-                    "model": self.model,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": "你好"
-                        }
-                    ]
-                }
-                
-                endpoint = f"{self.base_url}/api/v3/chat/completions"
-                logger.info(f"尝试连接: {endpoint}")
-                
-                response = await client.post(endpoint, headers=headers, json=data)
+            transport = get_shared_ark_transport()
+            headers = {
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {self.api_key}"
+            }
+            
+            data = {
+                "model": self.model,
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": "你好"
+                    }
+                ]
+            }
+            
+            endpoint = f"{self.base_url}/api/v3/chat/completions"
+            logger.info(f"尝试连接: {endpoint}")
+            
+            response = await transport.post(endpoint, headers=headers, payload=data)
+            
+            if response.status_code == 200:
+                self.is_warmed_up = True
+                logger.info("LLM预热完成")
+            else:
+                logger.error(f"LLM预热失败: {response.status_code} - {response.text}")
                 
-                if response.status_code == 200:
-                    self.is_warmed_up = True
-                    logger.info("LLM预热完成")
-                else:
-                    logger.error(f"LLM预热失败: {response.status_code} - {response.text}")
-                    
         except Exception as e:
             logger.error(f"LLM预热错误: {e}")
     
@@ -448,179 +448,171 @@ class LLMClient:
             return
         
         try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                headers = {
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {self.api_key}"
+            transport = get_shared_ark_transport()
+            headers = {
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {self.api_key}"
+            }
+            
+            # 注释掉随机对话模式 - 不再随机控制陈述句/问句比例
+            # random_mode_instruction = self._generate_random_conversation_mode()
+            
+            # 使用提示词路由系统（完全替代原有阶段管理）
+            user_prompt_mode = self.get_user_prompt_mode(user_id)
+            prompt_template = self.prompt_templates[user_prompt_mode]
+            system_content = prompt_template["prompt"]
+            logger.info(f"用户 {user_id} 使用提示词模式: {user_prompt_mode} ({prompt_template['name']} - {prompt_template['description']})")
+            
+            # 注释掉随机对话模式指令
+            # system_content = random_mode_instruction + "\n\n" + system_content
+
+            # 添加历史对话使用指令
+            if context_messages and len(context_messages) > 0:
+                system_content += "\n\n🔥 **重要提醒**：上面的历史对话是你和用户刚才聊过的内容，必须保持对话的连续性！"
+                system_content += "\n- 如果用户问相同或相关的问题，要基于之前说过的内容回答"
+                system_content += "\n- 不能给出与之前对话矛盾的答案"
+                system_content += "\n- 要记住用户告诉你的所有信息（比如口号、偏好等）"
+                system_content += "\n- 像真实朋友一样记住聊天内容，不要重复问已经聊过的问题"
+                system_content += "\n\n🚫 **记忆使用严格约束**："
+                system_content += "\n- 绝对禁止虚构用户未曾提及的信息，如'你说过喜欢吃酸甜口的'、'你提到过喜欢小动物'等"
+                system_content += "\n- 只能引用上面历史对话中用户明确说过的内容"
+                system_content += "\n- 如果不确定用户是否说过某事，宁可重新询问，也不要虚构记忆"
+                system_content += "\n- 禁止使用'我记得你说过...'、'你之前提到...'等表述，除非确实有明确记录"
+                system_content += "\n\n🚫 **严禁重复行为**："
+                system_content += "\n- 绝对不要给出和历史对话中完全相同或高度相似的回答"
+                system_content += "\n- 不要重复自我介绍（除非是第一次见面）"
+                system_content += "\n- 同样的问题要从不同角度回答，展现对话的自然性"
+                system_content += "\n- 避免使用相同的开头、结尾或表达方式"
+
+            # 如果有增强上下文，添加到系统消息中
+            if enhanced_context:
+                system_content += enhanced_context
+
+            # 构建消息列表
+            messages = [
+                {
+                    "role": "system",
+                    "content": system_content
                 }
-                
-                # 注释掉随机对话模式 - 不再随机控制陈述句/问句比例
-                # random_mode_instruction = self._generate_random_conversation_mode()
-                
-                # 使用提示词路由系统（完全替代原有阶段管理）
-                user_prompt_mode = self.get_user_prompt_mode(user_id)
-                prompt_template = self.prompt_templates[user_prompt_mode]
-                system_content = prompt_template["prompt"]
-                logger.info(f"用户 {user_id} 使用提示词模式: {user_prompt_mode} ({prompt_template['name']} - {prompt_template['description']})")
-                
-                # 注释掉随机对话模式指令
-                # system_content = random_mode_instruction + "\n\n" + system_content
-
-                # 添加历史对话使用指令
-                if context_messages and len(context_messages) > 0:
-                    system_content += "\n\n🔥 **重要提醒**：上面的历史对话是你和用户刚才聊过的内容，必须保持对话的连续性！"
-                    system_content += "\n- 如果用户问相同或相关的问题，要基于之前说过的内容回答"
-                    system_content += "\n- 不能给出与之前对话矛盾的答案"
-                    system_content += "\n- 要记住用户告诉你的所有信息（比如口号、偏好等）"
-                    system_content += "\n- 像真实朋友一样记住聊天内容，不要重复问已经聊过的问题"
-                    system_content += "\n\n🚫 **记忆使用严格约束**："
-                    system_content += "\n- 绝对禁止虚构用户未曾提及的信息，如'你说过喜欢吃酸甜口的'、'你提到过喜欢小动物'等"
-                    system_content += "\n- 只能引用上面历史对话中用户明确说过的内容"
-                    system_content += "\n- 如果不确定用户是否说过某事，宁可重新询问，也不要虚构记忆"
-                    system_content += "\n- 禁止使用'我记得你说过...'、'你之前提到...'等表述，除非确实有明确记录"
-                    system_content += "\n\n🚫 **严禁重复行为**："
-                    system_content += "\n- 绝对不要给出和历史对话中完全相同或高度相似的回答"
-                    system_content += "\n- 不要重复自我介绍（除非是第一次见面）"
-                    system_content += "\n- 同样的问题要从不同角度回答，展现对话的自然性"
-                    system_content += "\n- 避免使用相同的开头、结尾或表达方式"
-
-                # 如果有增强上下文，添加到系统消息中
-                if enhanced_context:
-                    system_content += enhanced_context
-
-                # 构建消息列表
-                messages = [
-                    {
-                        "role": "system",
-                        "content": system_content
-                    }
-                ]
-                
-                # 添加历史对话上下文
-                if context_messages:
-                    messages.extend(context_messages)
-                
-                # 构建当前用户消息
-                current_message = {"role": "user", "content": message}
-                
-                # 处理图片和文件
-                if image_url:
-                    # 如果是本地文件路径，检查是否为图片
-                    if image_url.startswith('http://localhost:8000/uploads/'):
-                        # 从URL获取本地文件路径
-                        import os
-                        from core.file_manager import FileManager
-                        file_manager = FileManager()
-                        
-                        # 提取文件路径
-                        relative_path = image_url.replace('http://localhost:8000/uploads/', '')
-                        local_path = os.path.join(file_manager.upload_dir, relative_path)
-                        
-                        # 检查是否为图片文件
-                        image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'}
-                        file_extension = os.path.splitext(local_path)[1].lower()
-                        
-                        if file_extension in image_extensions:
-                            # 是图片文件，转换为base64并使用多模态API
-                            base64_image = file_manager.encode_image_to_base64(local_path)
-                            if base64_image:
-                                current_message = {
-                                    "role": "user",
-                                    "content": [
-                                        {
-                                            "type": "text",
-                                            "text": message
-                                        },
-                                        {
-                                            "type": "image_url",
-                                            "image_url": {
-                                                "url": base64_image
-                                            }
+            ]
+            
+            # 添加历史对话上下文
+            if context_messages:
+                messages.extend(context_messages)
+            
+            # 构建当前用户消息
+            current_message = {"role": "user", "content": message}
+            
+            # 处理图片和文件
+            if image_url:
+                # 如果是本地文件路径，检查是否为图片
+                if image_url.startswith('http://localhost:8000/uploads/'):
+                    # 从URL获取本地文件路径
+                    import os
+                    from core.file_manager import FileManager
+                    file_manager = FileManager()
+                    
+                    # 提取文件路径
+                    relative_path = image_url.replace('http://localhost:8000/uploads/', '')
+                    local_path = os.path.join(file_manager.upload_dir, relative_path)
+                    
+                    # 检查是否为图片文件
+                    image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'}
+                    file_extension = os.path.splitext(local_path)[1].lower()
+                    
+                    if file_extension in image_extensions:
+                        # 是图片文件，转换为base64并使用多模态API
+                        base64_image = file_manager.encode_image_to_base64(local_path)
+                        if base64_image:
+                            current_message = {
+                                "role": "user",
+                                "content": [
+                                    {
+                                        "type": "text",
+                                        "text": message
+                                    },
+                                    {
+                                        "type": "image_url",
+                                        "image_url": {
+                                            "url": base64_image
                                         }
-                                    ]
-                                }
-                            else:
-                                logger.error(f"图片编码失败: {local_path}")
-                                yield "图片处理失败，请重试。"
-                                return
+                                    }
+                                ]
+                            }
                         else:
-                            # 不是图片文件，读取文件内容
-                            filename = os.path.basename(local_path)
-                            file_content = file_manager.read_file_content(local_path)
-                            
-                            if file_content:
-                                file_mention = f"[用户上传了文件: {filename}]\n\n文件内容:\n{file_content}\n\n用户消息: {message}"
-                            else:
-                                file_mention = f"[用户上传了文件: {filename}，但无法读取文件内容]\n\n用户消息: {message}"
-                            
-                            current_message["content"] = file_mention
+                            logger.error(f"图片编码失败: {local_path}")
+                            yield "图片处理失败，请重试。"
+                            return
                     else:
-                        # 外部图片URL，直接使用多模态API
-                        current_message = {
-                            "role": "user",
-                            "content": [
-                            {
-                                "type": "text",
-                                "text": message
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": image_url
-                                }
+                        # 不是图片文件，读取文件内容
+                        filename = os.path.basename(local_path)
+                        file_content = file_manager.read_file_content(local_path)
+                        
+                        if file_content:
+                            file_mention = f"[用户上传了文件: {filename}]\n\n文件内容:\n{file_content}\n\n用户消息: {message}"
+                        else:
+                            file_mention = f"[用户上传了文件: {filename}，但无法读取文件内容]\n\n用户消息: {message}"
+                        
+                        current_message["content"] = file_mention
+                else:
+                    # 外部图片URL，直接使用多模态API
+                    current_message = {
+                        "role": "user",
+                        "content": [
+                        {
+                            "type": "text",
+                            "text": message
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": image_url
                             }
-                        ]
                         }
-                        
-                # 如果有搜索结果，添加到用户消息中
-                if search_results:
-                    if isinstance(current_message["content"], list):
-                        # 多模态消息，修改文本部分
-                        current_message["content"][0]["text"] += f"\n\n【搜索信息】\n{search_results}"
-                    else:
-                        # 纯文本消息
-                        current_message["content"] += f"\n\n【搜索信息】\n{search_results}"
-                
-                messages.append(current_message)
-                
-                # 根据深度推理模式调整参数
-                thinking_config = {
-                    "type": "enabled" if self.deep_reasoning else "disabled"
-                }
-                
-                logger.info(f"深度推理状态: {self.deep_reasoning}, thinking: {thinking_config['type']}")
-                
-                data = {
-                    "model": self.model,
-                    "messages": messages,
-                    "stream": True,
-                    "thinking": thinking_config
-                }
-                
-                endpoint = f"{self.base_url}/api/v3/chat/completions"
-                logger.info(f"发送流式请求到: {endpoint}")
-
-                async with client.stream("POST", endpoint, headers=headers, json=data) as response:
-                    if response.status_code != 200:
-                        error_text = await response.aread()
-                        logger.error(f"API请求失败: {response.status_code} - {error_text}")
-                        yield f"API请求失败: {response.status_code}"
-                        return
+                    ]
+                    }
                     
-                    async for line in response.aiter_lines():
-                        if line.startswith("data: "):
-                            data_str = line[6:]
-                            if data_str.strip() == "[DONE]":
-                                break
-                            try:
-                                chunk_data = json.loads(data_str)
-                                if "choices" in chunk_data and len(chunk_data["choices"]) > 0:
-                                    delta = chunk_data["choices"][0].get("delta", {})
-                                    if "content" in delta:
-                                        yield delta["content"]
-                            except json.JSONDecodeError:
-                                continue
-                                
+            # 如果有搜索结果，添加到用户消息中
+            if search_results:
+                if isinstance(current_message["content"], list):
+                    # 多模态消息，修改文本部分
+                    current_message["content"][0]["text"] += f"\n\n【搜索信息】\n{search_results}"
+                else:
+                    # 纯文本消息
+                    current_message["content"] += f"\n\n【搜索信息】\n{search_results}"
+            
+            messages.append(current_message)
+            
+            # 根据深度推理模式调整参数
+            thinking_config = {
+                "type": "enabled" if self.deep_reasoning else "disabled"
+            }
+            
+            logger.info(f"深度推理状态: {self.deep_reasoning}, thinking: {thinking_config['type']}")
+            
+            data = {
+                "model": self.model,
+                "messages": messages,
+                "stream": True,
+                "thinking": thinking_config
+            }
+            
+            endpoint = f"{self.base_url}/api/v3/chat/completions"
+            logger.info(f"发送流式请求到: {endpoint}")
+
+            async for data_str in transport.stream_chat(endpoint, headers=headers, payload=data):
+                try:
+                    chunk_data = json.loads(data_str)
+                    if "choices" in chunk_data and len(chunk_data["choices"]) > 0:
+                        delta = chunk_data["choices"][0].get("delta", {})
+                        if "content" in delta:
+                            yield delta["content"]
+                except json.JSONDecodeError:
+                    continue
+                            
+        except ArkHTTPError as e:
+            logger.error(f"API请求失败: {e.status_code} - {e.body}")
+            yield f"API请求失败: {e.status_code}"
         except Exception as e:
             logger.error(f"流式生成错误: {e}")
             yield f"生成回复时出现错误: {str(e)}"
@@ -7,16 +7,26 @@
 import os
 import json
 import asyncio
-import aiohttp
 import re
-from typing import AsyncGenerator
+import time
+from collections import deque
+from typing import AsyncGenerator, Callable, Optional
 from loguru import logger
 from dotenv import load_dotenv
-from doubao_tts_client import DoubaoTTSClient
+from doubao_tts_client import DoubaoTTSClient, TTSOptions
+from audio_assembly import concat_audio, stream_wav
+from audio_trim import load_trim_config, trim_silence
+from tts_scheduler import PRIORITY_FIRST_SENTENCE, PRIORITY_SENTENCE, PRIORITY_BATCH
+from ark_http_client import ArkHTTPError, get_shared_ark_transport
 
 load_dotenv('.env.local')
 load_dotenv()
 
+# TTS引擎：每句一个会话并行合成 / 整段回复一个双向会话（按351事件切句）
+TTS_ENGINE_SENTENCE = "sentence"
+TTS_ENGINE_SESSION = "bidirectional"
+TTS_ENGINES = (TTS_ENGINE_SENTENCE, TTS_ENGINE_SESSION)
+
 def clean_text_for_tts(text: str) -> str:
     """
     清理文本用于TTS：去除动作、表情、心理活动描述、Agentic AI提示词
@@ -40,6 +50,134 @@ def clean_text_for_tts(text: str) -> str:
     return text
 
 
+class AudioReorderBuffer:
+    """
+    服务端音频重排缓冲区（jitter buffer）
+    句子N在1..N-1都已发出（或被跳过）后立即释放；队首句子卡住超过stall_timeout则跳过它
+    卡住时间从队首句子的TTS会话真正开始（拿到调度名额）时算起，排队等待名额不算卡住
+    """
+
+    def __init__(self, stall_timeout: float = 6.0):
+        self.stall_timeout = stall_timeout
+        self._outstanding = deque()  # 已登记、尚未发出的句子序号（递增）
+        self._ready = {}  # {order: audio_data}，空字节表示合成失败
+        self._skipped = set()
+        self._started = set()  # TTS会话已开始（或无需排队）的句子
+        self._head_since = time.monotonic()
+        self.emitted_count = 0
+
+    def register(self, order: int, started: bool = True):
+        """登记一个已派发TTS的句子；started=False表示会话还在排队，开始后调用mark_started"""
+        if not self._outstanding:
+            self._head_since = time.monotonic()
+        self._outstanding.append(order)
+        if started:
+            self._started.add(order)
+
+    def mark_started(self, order: int):
+        """句子的TTS会话开始合成；若它是队首，卡住时间从现在算起"""
+        if order in self._started or order not in self._outstanding:
+            return
+        self._started.add(order)
+        if self._outstanding[0] == order:
+            self._head_since = time.monotonic()
+
+    def put(self, order: int, audio_data: bytes):
+        """放入句子的合成结果（失败时传入空字节）"""
+        if order in self._skipped:
+            logger.info(f"⏭️  句子#{order} 已被跳过，丢弃迟到的音频")
+            self._skipped.discard(order)
+            return
+        self._ready[order] = audio_data
+
+    def pop_ready(self) -> list[tuple[int, int, bytes]]:
+        """按顺序取出可发送的音频: [(发送序号, 句子序号, 音频)]"""
+        released = []
+        while self._outstanding and self._outstanding[0] in self._ready:
+            order = self._outstanding.popleft()
+            audio_data = self._ready.pop(order)
+            self._started.discard(order)
+            self._head_since = time.monotonic()
+            if audio_data:
+                self.emitted_count += 1
+                released.append((self.emitted_count, order, audio_data))
+            else:
+                logger.warning(f"⏭️  句子#{order} 合成失败，跳过")
+        return released
+
+    def time_until_stall(self) -> Optional[float]:
+        """距离队首句子判定为卡住还剩多少秒；没有待发句子或队首仍在排队时返回None"""
+        if not self._outstanding or self._outstanding[0] not in self._started:
+            return None
+        return max(0.0, self.stall_timeout - (time.monotonic() - self._head_since))
+
+    def skip_head(self) -> Optional[int]:
+        """跳过卡住的队首句子，返回其序号"""
+        if not self._outstanding:
+            return None
+        order = self._outstanding.popleft()
+        self._skipped.add(order)
+        self._started.discard(order)
+        self._head_since = time.monotonic()
+        logger.warning(f"⏭️  句子#{order} 超过 {self.stall_timeout}s 未就绪，跳过以免阻塞后续句子")
+        return order
+
+
+class SentenceCoalescer:
+    """
+    短句合并：连续的短句攒到字数阈值、或等待超过时间窗口后，作为一个TTS会话派发
+    第一句总是立即派发，首音频延迟不变；min_chars<=0 时不合并
+    """
+
+    def __init__(self, dispatch: Callable[[str], None], min_chars: int = 10, window: Optional[float] = 0.4):
+        self.dispatch = dispatch
+        self.min_chars = min_chars
+        self.window = window  # None表示不按时间派发（整段文本已知时）
+        self._parts: list[str] = []
+        self._chars = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._first_sent = False
+        self.merged_count = 0  # 被合并掉的会话数
+
+    def add(self, sentence: str):
+        """加入一个已清理的句子，满足条件时派发"""
+        if not self._first_sent or self.min_chars <= 0:
+            self._first_sent = True
+            self.dispatch(sentence)
+            return
+
+        self._parts.append(sentence)
+        self._chars += len(sentence)
+        if self._chars >= self.min_chars:
+            self.flush()
+        elif self._timer is None and self.window is not None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self.flush)
+
+    def flush(self):
+        """立即派发已攒的句子（时间窗口到期、提示词前、文本结束时调用）"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._parts:
+            return
+        text = self._parts[0]
+        for part in self._parts[1:]:
+            # 中文标点后直接连接，英文句子之间补一个空格
+            text += part if text[-1] in '。！？；，…' else f" {part}"
+        self.merged_count += len(self._parts) - 1
+        self._parts.clear()
+        self._chars = 0
+        self.dispatch(text)
+
+    def cancel(self):
+        """丢弃未派发的句子（客户端断开时）"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._parts.clear()
+        self._chars = 0
+
+
 class LLMTTSStreamer:
     """LLM到TTS的双向流式处理器"""
     
@@ -59,15 +197,31 @@ class LLMTTSStreamer:
         }
     }
     
-    def __init__(self, voice_type: str = "zh_female_sajiaonvyou_moon_bigtts"):
+    def __init__(self, voice_type: str = "zh_female_sajiaonvyou_moon_bigtts",
+                 tts_client: DoubaoTTSClient = None, speed: float = 1.0,
+                 audio_format: str = "wav", sample_rate: int = 24000, tts_engine: Optional[str] = None):
         self.ark_api_key = os.getenv("ARK_API_KEY")
         # 使用支持thinking和文件阅读的flash模型
         self.llm_model = "doubao-seed-1-6-flash-250828"
-        self.tts_client = DoubaoTTSClient()
-        self.tts_client.voice_type = voice_type
+        # 可传入共享的TTS客户端；音色和语速通过tts_options随每次调用传入，不修改客户端
+        self.tts_client = tts_client or DoubaoTTSClient()
         self.voice_type = voice_type
+        self.tts_options = TTSOptions(voice_type=voice_type, speed=speed,
+                                      audio_format=audio_format, sample_rate=sample_rate)
         self.is_llm_warmed_up = False
         self.is_tts_warmed_up = False
+        # 队首句子音频最长等待时间，超时则跳过，避免整段回复静音
+        self.audio_stall_timeout = float(os.getenv("TTS_AUDIO_STALL_TIMEOUT", "6.0"))
+        # 逐句音频的首尾静音裁剪参数（None表示不裁剪）
+        self.trim_config = load_trim_config()
+        # 短句合并：字数不足阈值的连续短句合并为一个TTS会话，最多等待时间窗口
+        self.coalesce_min_chars = int(os.getenv("TTS_COALESCE_MIN_CHARS", "10"))
+        self.coalesce_window = float(os.getenv("TTS_COALESCE_WINDOW_MS", "400")) / 1000
+        # TTS引擎（可按请求指定，默认取TTS_ENGINE）
+        self.tts_engine = tts_engine or os.getenv("TTS_ENGINE", TTS_ENGINE_SENTENCE)
+        if self.tts_engine not in TTS_ENGINES:
+            logger.warning(f"未知的TTS引擎 {self.tts_engine}，使用 {TTS_ENGINE_SENTENCE}")
+            self.tts_engine = TTS_ENGINE_SENTENCE
         
         # 获取人设配置
         self.persona = self.VOICE_PERSONAS.get(voice_type, {
@@ -106,7 +260,7 @@ class LLMTTSStreamer:
                 
                 # 测试双向流式
                 audio_count = 0
-                async for audio_chunk in self.tts_client.text_to_speech_bidirectional(test_text_gen()):
+                async for audio_chunk in self.tts_client.text_to_speech_bidirectional(test_text_gen(), options=self.tts_options):
                     audio_count += 1
                 
                 self.is_tts_warmed_up = True
@@ -629,64 +783,52 @@ AI生成的文件（可以说"生成了X份"）：
         """
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, headers=headers, json=payload) as response:
-                    if response.status != 200:
-                        logger.error(f"豆包LLM错误: {response.status}")
-                        return
+            async for data in get_shared_ark_transport().stream_chat(url, headers, payload):
+                try:
+                    chunk = json.loads(data)
                     
-                    # 读取SSE流
-                    async for line in response.content:
-                        line = line.decode('utf-8').strip()
+                    # 打印完整响应结构用于调试
+                    logger.info(f"📦 豆包响应完整结构: {json.dumps(chunk, ensure_ascii=False)}")
+                    
+                    # 获取 choices
+                    choices = chunk.get('choices', [])
+                    if not choices:
+                        logger.info("⚠️ 响应中没有 choices")
+                        continue
+                    
+                    choice = choices[0]
+                    delta = choice.get('delta', {})
+                    message = choice.get('message', {})
+                    
+                    # 检查 reasoning_content (Doubao API 的实际字段名)
+                    reasoning_content = delta.get('reasoning_content', '')
+                    
+                    if reasoning_content:
+                        logger.info(f"🧠 收到 reasoning_content: {reasoning_content}")
+                        reasoning_event = {"type": "reasoning", "content": reasoning_content}
+                        logger.info(f"📤 准备 yield reasoning 事件: {reasoning_event}")
+                        yield reasoning_event
+                        logger.info(f"✅ 已 yield reasoning 事件")
+                    
+                    # 检查是否有普通 content（流式）
+                    content = delta.get('content', '')
+                    if content:
+                        logger.info(f"📝 文本内容: {content[:50]}")
+                        yield {"type": "text", "content": content}
+                    
+                    # 检查是否有 message.content（非流式）
+                    if not content and 'content' in message:
+                        msg_content = message['content']
+                        if isinstance(msg_content, str):
+                            logger.info(f"📝 message 文本内容: {msg_content[:50]}")
+                            yield {"type": "text", "content": msg_content}
                         
-                        if line.startswith('data: '):
-                            data = line[6:]
-                            if data == '[DONE]':
-                                break
-                            
-                            try:
-                                chunk = json.loads(data)
-                                
-                                # 打印完整响应结构用于调试
-                                logger.info(f"📦 豆包响应完整结构: {json.dumps(chunk, ensure_ascii=False)}")
-                                
-                                # 获取 choices
-                                choices = chunk.get('choices', [])
-                                if not choices:
-                                    logger.info("⚠️ 响应中没有 choices")
-                                    continue
-                                
-                                choice = choices[0]
-                                delta = choice.get('delta', {})
-                                message = choice.get('message', {})
-                                
-                                # 检查 reasoning_content (Doubao API 的实际字段名)
-                                reasoning_content = delta.get('reasoning_content', '')
-                                
-                                if reasoning_content:
-                                    logger.info(f"🧠 收到 reasoning_content: {reasoning_content}")
-                                    reasoning_event = {"type": "reasoning", "content": reasoning_content}
-                                    logger.info(f"📤 准备 yield reasoning 事件: {reasoning_event}")
-                                    yield reasoning_event
-                                    logger.info(f"✅ 已 yield reasoning 事件")
-                                
-                                # 检查是否有普通 content（流式）
-                                content = delta.get('content', '')
-                                if content:
-                                    logger.info(f"📝 文本内容: {content[:50]}")
-                                    yield {"type": "text", "content": content}
-                                
-                                # 检查是否有 message.content（非流式）
-                                if not content and 'content' in message:
-                                    msg_content = message['content']
-                                    if isinstance(msg_content, str):
-                                        logger.info(f"📝 message 文本内容: {msg_content[:50]}")
-                                        yield {"type": "text", "content": msg_content}
-                                    
-                            except json.JSONDecodeError as e:
-                                logger.error(f"❌ JSON解析失败: {e}, data: {data[:100]}")
-                                continue
-                                
+                except json.JSONDecodeError as e:
+                    logger.error(f"❌ JSON解析失败: {e}, data: {data[:100]}")
+                    continue
+                    
+        except ArkHTTPError as e:
+            logger.error(f"豆包LLM错误: {e.status_code}")
         except Exception as e:
             logger.error(f"豆包LLM流式错误: {e}")
     
@@ -694,97 +836,156 @@ AI生成的文件（可以说"生成了X份"）：
         """
         Agent总结流式生成（参考8:4 2实现：句子切分+独立TTS）
         LLM流式生成 → 按标点切句 → 每句独立TTS → 并行合成
+        WAV格式输出为一路流式WAV：首块是不带长度的WAV头，之后按句子顺序输出PCM
         """
         full_text = ""
-        sentence_buffer = ""
         tts_tasks = []
-        sentence_order = 0
         
-        try:
-            # LLM流式生成总结
+        async def summary_sentences():
+            """LLM流式生成总结 → 按标点切句 → 清理后的句子"""
+            nonlocal full_text
+            sentence_buffer = ""
             async for text_chunk in self.generate_summary_stream(agent_content):
                 full_text += text_chunk
                 sentence_buffer += text_chunk
                 
                 # 检查是否有完整句子
                 if any(p in sentence_buffer for p in ['。', '！', '？', '.', '!', '?', '；', ';']):
-                    sentences, remaining = self._split_sentences(sentence_buffer)
-                    
-                    # 为每个完整句子创建独立的TTS任务
+                    sentences, sentence_buffer = self._split_sentences(sentence_buffer)
                     for sentence in sentences:
-                        if sentence.strip():
-                            sentence_order += 1
-                            cleaned = clean_text_for_tts(sentence)
-                            if cleaned.strip():
-                                logger.info(f"📤 [总结]句子#{sentence_order}: {cleaned}")
-                                tts_task = asyncio.create_task(
-                                    self._synthesize_sentence(cleaned, sentence_order)
-                                )
-                                tts_tasks.append((sentence_order, tts_task))
-                    
-                    sentence_buffer = remaining
+                        cleaned = clean_text_for_tts(sentence)
+                        if cleaned.strip():
+                            yield cleaned
             
             # 处理剩余文本
             if sentence_buffer.strip():
-                sentence_order += 1
                 cleaned = clean_text_for_tts(sentence_buffer)
                 if cleaned.strip():
-                    logger.info(f"📤 [总结]句子#{sentence_order}（结尾）: {cleaned}")
-                    tts_task = asyncio.create_task(
-                        self._synthesize_sentence(cleaned, sentence_order)
-                    )
-                    tts_tasks.append((sentence_order, tts_task))
-            
-            # 等待所有TTS任务完成并收集结果
-            logger.info(f"等待 {len(tts_tasks)} 个总结TTS任务完成...")
-            audio_results = []  # (order, audio_data)
-            
-            # 并行等待所有任务
-            for order, task in tts_tasks:
-                try:
-                    audio_data = await task
+                    yield cleaned
+        
+        dispatched = asyncio.Queue()  # 按派发顺序排列的 (order, task)，None表示LLM结束、不再派发
+        
+        def start_tts(cleaned: str):
+            order = len(tts_tasks) + 1
+            logger.info(f"📤 [总结]句子#{order}: {cleaned}")
+            entry = (order, asyncio.create_task(self._synthesize_sentence(cleaned, order)))
+            tts_tasks.append(entry)
+            dispatched.put_nowait(entry)
+        
+        # 短句合并后再派发（首句立即派发）
+        coalescer = SentenceCoalescer(start_tts, self.coalesce_min_chars, self.coalesce_window)
+        
+        async def dispatch_sentences():
+            """后台读取LLM总结并派发TTS，前台同时按顺序输出已合成的句子"""
+            try:
+                async for cleaned in summary_sentences():
+                    coalescer.add(cleaned)
+                coalescer.flush()
+                logger.info(f"总结LLM输出结束，共派发 {len(tts_tasks)} 个TTS任务")
+            except Exception as e:
+                logger.error(f"Agent总结LLM错误: {e}")
+            finally:
+                dispatched.put_nowait(None)
+        
+        async def ordered_clips():
+            """逐句TTS引擎：每句独立会话并行合成，按句子顺序输出，先到先发，不等LLM结束"""
+            producer = asyncio.create_task(dispatch_sentences())
+            try:
+                while (entry := await dispatched.get()) is not None:
+                    order, task = entry
+                    try:
+                        audio_data = await task
+                    except Exception as e:
+                        logger.error(f"[总结]句子#{order} TTS失败: {e}")
+                        continue
                     if audio_data:
-                        audio_results.append((order, audio_data))
-                        logger.info(f"✅ [总结]句子#{order} 音频已生成: {len(audio_data)} bytes")
-                except Exception as e:
-                    logger.error(f"[总结]句子#{order} TTS失败: {e}")
-            
-            # 按顺序号排序
-            audio_results.sort(key=lambda x: x[0])
-            
-            # 按顺序yield音频（合并后返回）
-            logger.info(f"📦 排序后总结音频顺序: {[o for o, _ in audio_results]}")
-            for order, audio_data in audio_results:
+                        logger.info(f"📤 返回总结句子#{order} 音频: {len(audio_data)} bytes")
+                        yield audio_data
+            finally:
+                if not producer.done():
+                    producer.cancel()
+        
+        async def session_clips():
+            """单会话引擎：所有句子送入同一个双向会话，按351事件逐句输出"""
+            order = 0
+            async for audio_data in self._session_clips(summary_sentences()):
+                order += 1
+                logger.info(f"📤 返回总结句子#{order} 音频: {len(audio_data)} bytes")
                 yield audio_data
-                logger.info(f"📤 返回总结句子#{order}/{len(audio_results)} 音频: {len(audio_data)} bytes")
+        
+        clips = session_clips() if self.tts_engine == TTS_ENGINE_SESSION else ordered_clips()
+        try:
+            # WAV输出一路流式WAV（一个不带长度的头 + 各句PCM），压缩格式按句顺序直接输出
+            audio_stream = stream_wav(clips) if self.tts_options.audio_format == "wav" else clips
+            async for audio_chunk in audio_stream:
+                yield audio_chunk
             
             logger.info(f"✅ Agent总结完成，全文: {full_text.strip()}")
                     
         except Exception as e:
             logger.error(f"Agent总结流式错误: {e}")
+        finally:
+            coalescer.cancel()
+            for _, task in tts_tasks:
+                if not task.done():
+                    task.cancel()
     
     
     async def chat_bidirectional_yield(self, user_message: str, history: list = None, agent_working: bool = False, deep_thinking: bool = False) -> AsyncGenerator[dict, None]:
         """
         闲聊流式生成器（参考8:4 2实现：句子切分+独立TTS）
         LLM流式生成 → 按标点切句 → 每句独立TTS → 并行合成
+        LLM仍在输出时，已合成好的句子音频就与文本事件交错发送，不等整段回复结束
+        音频经重排缓冲区按句子顺序发出，order为连续的发送序号，sentence为原句子序号；
+        done事件的total为实际发出的音频段数
         yield: {"type": "text", "content": "文本片段"} 或 {"type": "audio", "data": b"音频数据"} 或 {"type": "reasoning", "content": "推理内容"}
         """
         full_text = ""
         sentence_buffer = ""
-        tts_tasks = []  # 存储TTS任务
+        tts_tasks = {}  # {order: task}，尚未发送音频的TTS任务
         sentence_order = 0
         in_prompt = False  # 标记是否在提示词内部
+        events = asyncio.Queue()  # LLM文本事件与TTS完成事件共用一个队列
+        llm_done = False
+        dispatched_count = 0
+        reorder_buffer = AudioReorderBuffer(self.audio_stall_timeout)
+        # 单会话引擎：句子送入同一个双向TTS会话（None表示文本结束）
+        use_session = self.tts_engine == TTS_ENGINE_SESSION
+        session_texts = asyncio.Queue()
+        session_active = use_session
+        session_task = None
         
-        try:
-            # LLM流式生成（传递agent_working和deep_thinking状态）
+        def start_tts(cleaned: str):
+            """创建独立TTS任务，完成时把结果放入事件队列"""
+            nonlocal dispatched_count, sentence_order
+            if use_session:
+                logger.info(f"📤 送入TTS会话: {cleaned}")
+                session_texts.put_nowait(cleaned)
+                return
+            sentence_order += 1
+            order = sentence_order
+            dispatched_count += 1
+            logger.info(f"📤 句子#{order}: {cleaned}")
+            tts_task = asyncio.create_task(self._synthesize_sentence(
+                cleaned, order, on_start=lambda: events.put_nowait(("tts_started", order))))
+            tts_task.add_done_callback(lambda t: events.put_nowait(("audio", order, t)))
+            tts_tasks[order] = tts_task
+            reorder_buffer.register(order, started=False)
+        
+        # 短句合并后再派发（首句立即派发）；单会话引擎由服务端切句，不需要合并
+        coalescer = SentenceCoalescer(start_tts, 0 if use_session else self.coalesce_min_chars, self.coalesce_window)
+        
+        async def produce_llm():
+            """LLM流式生成（传递agent_working和deep_thinking状态），边切句边启动TTS"""
+            nonlocal full_text, sentence_buffer, in_prompt
+            
             async for chunk in self.generate_chat_stream(user_message, history, agent_working, deep_thinking):
                 # 处理不同类型的chunk
                 chunk_type = chunk.get("type", "text")
                 
                 if chunk_type == "reasoning":
                     # 直接传递推理内容给前端
-                    yield {"type": "reasoning", "content": chunk["content"]}
+                    events.put_nowait(("event", {"type": "reasoning", "content": chunk["content"]}))
                     continue
                 
                 # 处理文本内容
@@ -792,7 +993,7 @@ AI生成的文件（可以说"生成了X份"）：
                 full_text += text_chunk
                 
                 # 推送文本到前端显示
-                yield {"type": "text", "content": text_chunk}
+                events.put_nowait(("event", {"type": "text", "content": text_chunk}))
                 
                 # 检测提示词边界
                 if '{' in text_chunk and not in_prompt:
@@ -814,34 +1015,21 @@ AI生成的文件（可以说"生成了X份"）：
                             sentences, remaining = self._split_sentences(sentence_buffer)
                             for sentence in sentences:
                                 if sentence.strip():
-                                    sentence_order += 1
                                     cleaned = clean_text_for_tts(sentence)
                                     if cleaned.strip():
-                                        logger.info(f"📤 句子#{sentence_order}（提示词前）: {cleaned}")
-                                        tts_task = asyncio.create_task(
-                                            self._synthesize_sentence(cleaned, sentence_order)
-                                        )
-                                        tts_tasks.append((sentence_order, tts_task))
+                                        coalescer.add(cleaned)
                             # 剩余内容也要TTS（如果有）
                             if remaining.strip():
-                                sentence_order += 1
                                 cleaned = clean_text_for_tts(remaining)
                                 if cleaned.strip():
-                                    logger.info(f"📤 句子#{sentence_order}（提示词前-剩余）: {cleaned}")
-                                    tts_task = asyncio.create_task(
-                                        self._synthesize_sentence(cleaned, sentence_order)
-                                    )
-                                    tts_tasks.append((sentence_order, tts_task))
+                                    coalescer.add(cleaned)
                         else:
                             # 没有标点，整个缓冲区作为一句TTS
-                            sentence_order += 1
                             cleaned = clean_text_for_tts(sentence_buffer)
                             if cleaned.strip():
-                                logger.info(f"📤 句子#{sentence_order}（提示词前-无标点）: {cleaned}")
-                                tts_task = asyncio.create_task(
-                                    self._synthesize_sentence(cleaned, sentence_order)
-                                )
-                                tts_tasks.append((sentence_order, tts_task))
+                                coalescer.add(cleaned)
+                    # 提示词前的内容不再等待合并
+                    coalescer.flush()
                     
                     # 清空缓冲区
                     sentence_buffer = ""
@@ -867,73 +1055,125 @@ AI生成的文件（可以说"生成了X份"）：
                     # 为每个完整句子创建独立的TTS任务
                     for sentence in sentences:
                         if sentence.strip():
-                            sentence_order += 1
                             # 过滤括号
                             cleaned = clean_text_for_tts(sentence)
                             if cleaned.strip():
-                                logger.info(f"📤 句子#{sentence_order}: {cleaned}")
-                                # 独立TTS请求
-                                tts_task = asyncio.create_task(
-                                    self._synthesize_sentence(cleaned, sentence_order)
-                                )
-                                tts_tasks.append((sentence_order, tts_task))
+                                # 独立TTS请求（短句先合并）
+                                coalescer.add(cleaned)
                     
                     sentence_buffer = remaining
             
             # 处理剩余文本（不在提示词内的）
             if not in_prompt and sentence_buffer.strip():
-                sentence_order += 1
                 cleaned = clean_text_for_tts(sentence_buffer)
                 if cleaned.strip():
-                    logger.info(f"📤 句子#{sentence_order}（结尾）: {cleaned}")
-                    tts_task = asyncio.create_task(
-                        self._synthesize_sentence(cleaned, sentence_order)
-                    )
-                    tts_tasks.append((sentence_order, tts_task))
-            
-            # 等待TTS任务完成并立即发送（按完成顺序，不等待全部）
-            logger.info(f"🎵 开始流式音频生成，共 {len(tts_tasks)} 个句子...")
-            total_tasks = len(tts_tasks)
+                    coalescer.add(cleaned)
+            coalescer.flush()
+            if coalescer.merged_count:
+                logger.info(f"🧩 短句合并减少了 {coalescer.merged_count} 个TTS会话")
+        
+        async def run_llm():
+            try:
+                await produce_llm()
+                events.put_nowait(("llm_done", None))
+            except Exception as e:
+                events.put_nowait(("llm_error", e))
+            finally:
+                session_texts.put_nowait(None)
+        
+        async def run_session():
+            """单会话引擎：按351事件逐句取出音频放入事件队列"""
+            async def texts():
+                while (text := await session_texts.get()) is not None:
+                    yield text
             
-            if tts_tasks:
-                # 方法：监听任务完成并立即发送
-                remaining = dict(tts_tasks)  # {order: task}
+            clip_count = 0
+            try:
+                async for clip in self._session_clips(texts()):
+                    clip_count += 1
+                    events.put_nowait(("session_audio", clip_count, clip))
+            except Exception as e:
+                logger.error(f"TTS会话错误: {e}")
+            finally:
+                events.put_nowait(("session_done", clip_count))
+        
+        if use_session:
+            # 会话任务与LLM同时启动，等到第一句文本再StartSession
+            session_task = asyncio.create_task(run_session())
+        llm_task = asyncio.create_task(run_llm())
+        
+        try:
+            # 并发发射：文本事件与TTS完成事件按到达顺序交错输出
+            while not llm_done or tts_tasks or session_active:
+                try:
+                    kind, *item = await asyncio.wait_for(events.get(), timeout=reorder_buffer.time_until_stall())
+                except asyncio.TimeoutError:
+                    # 队首句子卡住：跳过它，释放后面已就绪的句子
+                    skipped = reorder_buffer.skip_head()
+                    stalled_task = tts_tasks.pop(skipped, None)
+                    if stalled_task and not stalled_task.done():
+                        stalled_task.cancel()
+                    kind, item = "flush", []
                 
-                while remaining:
-                    # 等待任意一个任务完成
-                    done, pending = await asyncio.wait(
-                        list(remaining.values()),
-                        return_when=asyncio.FIRST_COMPLETED
-                    )
-                    
-                    for completed_task in done:
-                        # 找到对应的order
-                        order = None
-                        for o, t in remaining.items():
-                            if t == completed_task:
-                                order = o
-                                break
-                        
-                        if order:
-                            try:
-                                audio_data = completed_task.result()
-                                if audio_data:
-                                    logger.info(f"✅ 句子#{order} 音频已生成: {len(audio_data)} bytes")
-                                    # 立即发送音频
-                                    yield {"type": "audio", "data": audio_data, "order": order, "total": total_tasks}
-                                    logger.info(f"📤 立即发送句子#{order} 音频到前端")
-                            except Exception as e:
-                                logger.error(f"句子#{order} TTS失败: {e}")
-                            
-                            # 从待处理列表中移除
-                            del remaining[order]
+                if kind == "event":
+                    yield item[0]
+                
+                elif kind == "llm_done":
+                    llm_done = True
+                    logger.info(f"🎵 LLM输出结束，共 {dispatched_count} 个句子，剩余 {len(tts_tasks)} 个TTS任务...")
+                
+                elif kind == "session_audio":
+                    # 单会话音频本身有序，登记后立即放入重排缓冲区
+                    order, audio_data = item
+                    reorder_buffer.register(order)
+                    reorder_buffer.put(order, audio_data)
+                
+                elif kind == "session_done":
+                    session_active = False
+                    logger.info(f"🎵 TTS会话结束，共 {item[0]} 个句子音频")
+                
+                elif kind == "llm_error":
+                    raise item[0]
+                
+                elif kind == "tts_started":
+                    # 会话拿到调度名额，开始计算卡住时间
+                    reorder_buffer.mark_started(item[0])
+                
+                elif kind == "audio":
+                    order, completed_task = item
+                    if tts_tasks.pop(order, None) is None:
+                        continue  # 已跳过并取消的任务
+                    audio_data = b''
+                    try:
+                        audio_data = completed_task.result()
+                        if audio_data:
+                            logger.info(f"✅ 句子#{order} 音频已生成: {len(audio_data)} bytes")
+                    except Exception as e:
+                        logger.error(f"句子#{order} TTS失败: {e}")
+                    reorder_buffer.put(order, audio_data)
+                
+                # 按顺序发送已就绪的音频
+                for seq, order, audio_data in reorder_buffer.pop_ready():
+                    yield {"type": "audio", "data": audio_data, "order": seq, "sentence": order}
+                    logger.info(f"📤 按序发送句子#{order}（第{seq}段）音频到前端")
             
             logger.info(f"✅ 闲聊完成，全文: {full_text.strip()}")
-            yield {"type": "done", "full_text": full_text.strip()}
+            # 失败或被跳过的句子不占发送序号，total即最后一段音频的order
+            yield {"type": "done", "full_text": full_text.strip(), "total": reorder_buffer.emitted_count}
                     
         except Exception as e:
             logger.error(f"闲聊流式错误: {e}")
             yield {"type": "error", "error": str(e)}
+        finally:
+            # 客户端断开或出错时，取消仍在进行的LLM和TTS任务
+            coalescer.cancel()
+            if not llm_task.done():
+                llm_task.cancel()
+            if session_task and not session_task.done():
+                session_task.cancel()
+            for pending_task in tts_tasks.values():
+                if not pending_task.done():
+                    pending_task.cancel()
     
     def _split_sentences(self, text: str) -> tuple[list[str], str]:
         """智能句子切分（参考8:4 2）"""
@@ -970,20 +1210,41 @@ AI生成的文件（可以说"生成了X份"）：
         
         return sentences, current_sentence
     
-    async def _synthesize_sentence(self, text: str, order: int) -> bytes:
-        """为单个句子合成语音（独立TTS请求）"""
+    async def _synthesize_sentence(self, text: str, order: int, priority: Optional[int] = None,
+                                   on_start: Optional[Callable[[], None]] = None) -> bytes:
+        """
+        为单个句子合成语音（独立TTS请求，优先读取音频缓存），并裁掉首尾静音
+        未指定priority时，首句按最高优先级排队，其余句子按普通优先级；on_start在会话拿到调度名额时调用
+        """
+        if priority is None:
+            priority = PRIORITY_FIRST_SENTENCE if order == 1 else PRIORITY_SENTENCE
         try:
-            audio_chunks = []
-            async for chunk in self.tts_client.text_to_speech(text):
-                audio_chunks.append(chunk)
-            
-            if audio_chunks:
-                return b''.join(audio_chunks)
-            return b''
+            audio_data = await self.tts_client.text_to_speech_cached(text, options=self.tts_options, priority=priority,
+                                                                     on_start=on_start)
+            return trim_silence(audio_data, self.tts_options.audio_format,
+                                self.tts_options.sample_rate, self.trim_config)
         except Exception as e:
             logger.error(f"句子#{order} TTS错误: {e}")
             return b''
     
+    async def _session_clips(self, sentences: AsyncGenerator[str, None]) -> AsyncGenerator[bytes, None]:
+        """
+        单会话引擎：把句子流送入一个双向TTS会话，按句产出音频（裁掉首尾静音）
+        收到第一句后才开启会话：深度思考等阶段LLM可能很久没有正文，此时不占用会话名额，也不会触发TTS接收超时
+        """
+        try:
+            first = await sentences.__anext__()
+        except StopAsyncIteration:
+            return
+        
+        async def with_first():
+            yield first
+            async for sentence in sentences:
+                yield sentence
+        
+        async for clip in self.tts_client.text_to_speech_sentences(with_first(), options=self.tts_options):
+            yield trim_silence(clip, self.tts_options.audio_format, self.tts_options.sample_rate, self.trim_config)
+    
     async def generate_and_speak(self, agent_content: str) -> dict:
         """生成总结并返回完整音频和总结文本"""
         audio_chunks = []
@@ -998,32 +1259,31 @@ AI生成的文件（可以说"生成了X份"）：
         # 然后为总结文本生成音频
         sentence_buffer = ""
         tts_tasks = []
-        sentence_order = 0
         
-        # 按句子切分并并行TTS
+        def start_tts(cleaned: str):
+            order = len(tts_tasks) + 1
+            tts_tasks.append((order, asyncio.create_task(self._synthesize_sentence(cleaned, order, PRIORITY_BATCH))))
+        
+        # 全文已知，只按字数合并短句
+        coalescer = SentenceCoalescer(start_tts, self.coalesce_min_chars, window=None)
+        
+        # 按句子切分并并行TTS（批量总结，排在实时回复之后）
         for char in summary_text:
             sentence_buffer += char
             if char in ['。', '！', '？', '.', '!', '?', '；', ';']:
                 sentence = sentence_buffer.strip()
                 if sentence:
-                    sentence_order += 1
                     cleaned = clean_text_for_tts(sentence)
                     if cleaned.strip():
-                        tts_task = asyncio.create_task(
-                            self._synthesize_sentence(cleaned, sentence_order)
-                        )
-                        tts_tasks.append((sentence_order, tts_task))
+                        coalescer.add(cleaned)
                 sentence_buffer = ""
         
         # 处理剩余文本
         if sentence_buffer.strip():
-            sentence_order += 1
             cleaned = clean_text_for_tts(sentence_buffer)
             if cleaned.strip():
-                tts_task = asyncio.create_task(
-                    self._synthesize_sentence(cleaned, sentence_order)
-                )
-                tts_tasks.append((sentence_order, tts_task))
+                coalescer.add(cleaned)
+        coalescer.flush()
         
         # 等待所有TTS任务完成
         audio_results = []
@@ -1035,12 +1295,12 @@ AI生成的文件（可以说"生成了X份"）：
             except Exception as e:
                 logger.error(f"句子#{order} TTS失败: {e}")
         
-        # 按顺序合并音频
+        # 按顺序合并音频（WAV去掉每句的头，只保留一个正确长度的头）
         audio_results.sort(key=lambda x: x[0])
         audio_chunks = [audio_data for _, audio_data in audio_results]
         
         if audio_chunks:
-            audio_data = b''.join(audio_chunks)
+            audio_data = concat_audio(audio_chunks, self.tts_options.audio_format)
             return {
                 "success": True,
                 "audio_data": audio_data,
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+测试 Agent总结流式输出：首句音频在LLM总结结束前就发出
+不访问真实的LLM/TTS服务，可直接运行或用 pytest 运行
+"""
+
+import asyncio
+from llm_tts_stream import LLMTTSStreamer
+
+
+def test_summary_first_clip_before_llm_ends():
+    """LLM仍在输出总结时，已合成的首句音频就应该发给客户端"""
+    streamer = LLMTTSStreamer(audio_format="mp3")
+    streamer.coalesce_min_chars = 0  # 不合并短句
+    timeline = []
+
+    async def fake_summary_stream(agent_content: str):
+        for part in ["第一句话已经很长了。", "第二句话。", "第三句话。"]:
+            yield part
+            await asyncio.sleep(0.3)
+        timeline.append("llm_done")
+
+    async def fake_synthesize(text: str, order: int, priority=None, on_start=None) -> bytes:
+        await asyncio.sleep(0.05)
+        return text.encode()
+
+    streamer.generate_summary_stream = fake_summary_stream
+    streamer._synthesize_sentence = fake_synthesize
+
+    async def run():
+        clips = []
+        async for clip in streamer.llm_tts_bidirectional_stream("总结内容"):
+            timeline.append("clip")
+            clips.append(clip.decode())
+        return clips
+
+    clips = asyncio.run(run())
+    assert clips == ["第一句话已经很长了。", "第二句话。", "第三句话。"]
+    assert timeline.index("clip") < timeline.index("llm_done"), timeline
+
+
+if __name__ == "__main__":
+    test_summary_first_clip_before_llm_ends()
+    print("✅ 首句音频在LLM总结结束前发出")
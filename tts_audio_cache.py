@@ -0,0 +1,169 @@
+"""
+TTS合成音频缓存
+按 规范化文本 + 音色 + 语速 + 情感 + 音频格式 做内容寻址，内存LRU（按字节数限制）+ 可选磁盘层
+"""
+
+import os
+import json
+import asyncio
+import hashlib
+import unicodedata
+import re
+from collections import OrderedDict
+from typing import Optional
+from loguru import logger
+
+
+def normalize_tts_text(text: str) -> str:
+    """规范化文本：全半角统一、去除首尾及多余空白"""
+    text = unicodedata.normalize('NFKC', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+
+def make_cache_key(text: str, voice_type: str, speed: float, emotion: str,
+                   audio_format: str = "wav", sample_rate: int = 24000) -> str:
+    """生成缓存键（sha256）"""
+    key_source = json.dumps([
+        normalize_tts_text(text),
+        voice_type,
+        round(float(speed), 3),
+        emotion or "neutral",
+        audio_format,
+        sample_rate
+    ], ensure_ascii=False)
+    return hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+
+
+class TTSAudioCache:
+    """两级音频缓存：内存LRU + 可选磁盘目录"""
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, disk_dir: Optional[str] = None,
+                 max_text_chars: int = 64):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_text_chars = max_text_chars  # 只缓存短句，长文本几乎不会重复
+
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._size = 0
+        self._pinned: dict[str, bytes] = {}  # 预合成短语，不参与LRU淘汰
+
+        # 统计信息
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def is_cacheable(self, text: str) -> bool:
+        return 0 < len(normalize_tts_text(text)) <= self.max_text_chars
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.audio")
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._disk_path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, key: str, audio_data: bytes):
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(audio_data)
+        os.replace(tmp_path, path)
+
+    def _store_memory(self, key: str, audio_data: bytes):
+        if len(audio_data) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._size -= len(self._entries.pop(key))
+        self._entries[key] = audio_data
+        self._size += len(audio_data)
+        # 超出字节上限时淘汰最久未使用的条目
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def get_memory(self, key: str) -> Optional[bytes]:
+        """只查内存层（同步）"""
+        audio_data = self._pinned.get(key)
+        if audio_data is not None:
+            return audio_data
+        audio_data = self._entries.get(key)
+        if audio_data is not None:
+            self._entries.move_to_end(key)
+        return audio_data
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """查询缓存，磁盘命中会提升到内存层"""
+        audio_data = self.get_memory(key)
+        if audio_data is not None:
+            self.hits += 1
+            return audio_data
+
+        if self.disk_dir:
+            try:
+                audio_data = await asyncio.to_thread(self._read_disk, key)
+            except Exception as e:
+                logger.warning(f"读取TTS磁盘缓存失败: {e}")
+                audio_data = None
+            if audio_data:
+                self.hits += 1
+                self.disk_hits += 1
+                self._store_memory(key, audio_data)
+                return audio_data
+
+        self.misses += 1
+        return None
+
+    def pin(self, key: str, audio_data: bytes):
+        """把条目固定在内存中（不写磁盘）"""
+        if audio_data:
+            self._pinned[key] = audio_data
+
+    async def put(self, key: str, audio_data: bytes, pinned: bool = False):
+        """写入缓存（pinned=True的条目常驻内存）"""
+        if not audio_data:
+            return
+        if pinned:
+            self._pinned[key] = audio_data
+        else:
+            self._store_memory(key, audio_data)
+        if self.disk_dir:
+            try:
+                await asyncio.to_thread(self._write_disk, key, audio_data)
+            except Exception as e:
+                logger.warning(f"写入TTS磁盘缓存失败: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "pinned": len(self._pinned),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+
+_shared_cache: Optional[TTSAudioCache] = None
+
+
+def get_shared_audio_cache() -> TTSAudioCache:
+    """获取进程内共享的音频缓存（由环境变量配置）"""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = TTSAudioCache(
+            max_bytes=int(os.getenv("TTS_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+            disk_dir=os.getenv("TTS_CACHE_DIR") or None,
+            max_text_chars=int(os.getenv("TTS_CACHE_MAX_TEXT_CHARS", "64"))
+        )
+        logger.info(f"🗃️  TTS音频缓存已启用: {_shared_cache.stats()}, 磁盘目录={_shared_cache.disk_dir}")
+    return _shared_cache
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+TTS引擎对比基准：逐句会话（sentence）vs 单个双向会话（bidirectional）
+用脚本化的LLM文本流驱动 chat_bidirectional_yield，统计首个音频事件时间、总耗时和消耗的TTS会话数
+
+默认在进程内启动豆包TTS替身服务（doubao_tts_mock_server），不消耗配额：
+    python tts_engine_bench.py
+指向真实服务或已启动的替身服务：
+    python tts_engine_bench.py --url wss://openspeech.bytedance.com/api/v3/tts/bidirection
+"""
+
+import os
+import time
+import asyncio
+import argparse
+import statistics
+from typing import Optional
+from loguru import logger
+
+# 模拟一段LLM流式回复（短句、长句混合）
+SCRIPTED_REPLY = [
+    "好的，", "我来帮你", "看一下。", "今天北京", "晴，", "最高气温", "二十三度。",
+    "傍晚", "有微风，", "很适合", "出门散步。", "记得", "带上水。", "还有别的", "需要吗？",
+]
+
+
+async def _run_once(streamer, token_interval: float) -> dict:
+    """跑一轮闲聊，返回首音频时间、总耗时、音频事件数和会话数"""
+    from tts_scheduler import get_shared_tts_scheduler
+
+    async def scripted_chat(*args, **kwargs):
+        for part in SCRIPTED_REPLY:
+            await asyncio.sleep(token_interval)
+            yield {"type": "text", "content": part}
+
+    streamer.generate_chat_stream = scripted_chat
+    scheduler = get_shared_tts_scheduler()
+    granted_before = scheduler.granted
+    start = time.perf_counter()
+    first_audio = None
+    audio_events = 0
+    async for event in streamer.chat_bidirectional_yield("benchmark"):
+        if event["type"] == "audio":
+            audio_events += 1
+            if first_audio is None:
+                first_audio = time.perf_counter() - start
+    return {
+        "first_audio": first_audio,
+        "total": time.perf_counter() - start,
+        "audio_events": audio_events,
+        "sessions": scheduler.granted - granted_before,
+    }
+
+
+async def _benchmark(rounds: int, url: Optional[str], token_interval: float) -> dict:
+    import websockets
+    from doubao_tts_client import DoubaoTTSClient
+    from doubao_tts_pool import close_shared_pools
+    from llm_tts_stream import LLMTTSStreamer, TTS_ENGINES
+
+    server = None
+    if url is None:
+        from doubao_tts_mock_server import MockDoubaoTTSServer
+        mock = MockDoubaoTTSServer()
+        server = await websockets.serve(mock.handle_connection, "127.0.0.1", 0, max_size=None)
+        url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        for name in ("DOUBAO_TTS_APPID", "DOUBAO_TTS_ACCESS_TOKEN", "DOUBAO_TTS_SECRET_KEY"):
+            os.environ.setdefault(name, "mock")
+    os.environ["DOUBAO_TTS_WS_URL"] = url
+    # 关闭音频缓存，否则第二轮起逐句引擎的短句会直接命中缓存
+    os.environ["TTS_CACHE_MAX_TEXT_CHARS"] = "0"
+
+    tts_client = DoubaoTTSClient()
+    results = {engine: [] for engine in TTS_ENGINES}
+    try:
+        for _ in range(rounds):
+            for engine in TTS_ENGINES:
+                streamer = LLMTTSStreamer(tts_client=tts_client, tts_engine=engine)
+                results[engine].append(await _run_once(streamer, token_interval))
+    finally:
+        await close_shared_pools()
+        if server:
+            server.close()
+            await server.wait_closed()
+
+    summary = {}
+    for engine, runs in results.items():
+        first_audio = [run["first_audio"] for run in runs if run["first_audio"] is not None]
+        summary[engine] = {
+            "first_audio_ms": round(statistics.median(first_audio) * 1000) if first_audio else None,
+            "total_ms": round(statistics.median(run["total"] for run in runs) * 1000),
+            "audio_events": runs[-1]["audio_events"],
+            "sessions": runs[-1]["sessions"],
+        }
+        logger.info(f"📊 {engine:>13}: 首音频 {summary[engine]['first_audio_ms']}ms, "
+                    f"总耗时 {summary[engine]['total_ms']}ms, 音频事件 {summary[engine]['audio_events']} 个, "
+                    f"TTS会话 {summary[engine]['sessions']} 个（{rounds}轮中位数）")
+    return summary
+
+
+def benchmark(rounds: int = 3, url: Optional[str] = None, token_interval: float = 0.05) -> dict:
+    """对比两种TTS引擎；url为空时使用进程内替身服务"""
+    return asyncio.run(_benchmark(rounds, url, token_interval))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="对比逐句会话与单双向会话两种TTS引擎")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--url", default=None, help="TTS服务地址，默认使用进程内替身服务")
+    parser.add_argument("--token-interval", type=float, default=0.05, help="模拟LLM每个文本片段的间隔（秒）")
+    args = parser.parse_args()
+    benchmark(args.rounds, args.url, args.token_interval)
@@ -0,0 +1,97 @@
+"""
+TTS对冲请求（hedged request）
+统计首包（第一个352音频事件）延迟的滚动分位数，超过截止时间仍无音频时在另一条池化连接上发起重复会话，先出音频者胜
+"""
+
+import os
+import math
+from collections import deque
+from typing import Optional
+from loguru import logger
+
+
+class RollingLatencyStats:
+    """最近N次首包延迟（秒）的滚动统计"""
+
+    def __init__(self, window: int = 200):
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def record(self, latency: float):
+        self._samples.append(latency)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """最近窗口内的分位数（最近秩法），无样本时返回None"""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+        return ordered[index]
+
+
+class HedgePolicy:
+    """对冲策略：根据滚动首包延迟计算截止时间，并记录对冲次数"""
+
+    def __init__(self, enabled: Optional[bool] = None, percentile: Optional[float] = None,
+                 multiplier: Optional[float] = None, min_deadline: Optional[float] = None,
+                 max_deadline: Optional[float] = None, default_deadline: Optional[float] = None,
+                 min_samples: Optional[int] = None, window: Optional[int] = None):
+        if enabled is None:
+            enabled = os.getenv("DOUBAO_TTS_HEDGE_ENABLED", "false").lower() == "true"
+        self.enabled = enabled
+        self.percentile = percentile or float(os.getenv("DOUBAO_TTS_HEDGE_PERCENTILE", "0.95"))
+        self.multiplier = multiplier or float(os.getenv("DOUBAO_TTS_HEDGE_MULTIPLIER", "1.0"))
+        self.min_deadline = min_deadline or float(os.getenv("DOUBAO_TTS_HEDGE_MIN_DEADLINE", "0.3"))
+        self.max_deadline = max_deadline or float(os.getenv("DOUBAO_TTS_HEDGE_MAX_DEADLINE", "3.0"))
+        # 样本不足时使用的截止时间
+        self.default_deadline = default_deadline or float(os.getenv("DOUBAO_TTS_HEDGE_DEFAULT_DEADLINE", "1.2"))
+        self.min_samples = min_samples or int(os.getenv("DOUBAO_TTS_HEDGE_MIN_SAMPLES", "20"))
+        self.latency = RollingLatencyStats(window or int(os.getenv("DOUBAO_TTS_HEDGE_WINDOW", "200")))
+
+        # 统计信息
+        self.sessions = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.hedge_skipped = 0  # 到截止时间但没有空闲会话名额，未对冲
+        self.failovers = 0  # 首个会话未产出音频即结束，重试
+
+    def record_first_byte(self, latency: float):
+        self.latency.record(latency)
+
+    def deadline(self) -> float:
+        """当前首包截止时间（秒）：p95 × 倍数，限制在[min, max]之间"""
+        if len(self.latency) < self.min_samples:
+            return self.default_deadline
+        deadline = self.latency.percentile(self.percentile) * self.multiplier
+        return max(self.min_deadline, min(self.max_deadline, deadline))
+
+    def stats(self) -> dict:
+        p50 = self.latency.percentile(0.5)
+        p95 = self.latency.percentile(0.95)
+        return {
+            "enabled": self.enabled,
+            "deadline_ms": round(self.deadline() * 1000),
+            "first_byte_p50_ms": round(p50 * 1000) if p50 is not None else None,
+            "first_byte_p95_ms": round(p95 * 1000) if p95 is not None else None,
+            "samples": len(self.latency),
+            "sessions": self.sessions,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "hedge_skipped": self.hedge_skipped,
+            "failovers": self.failovers
+        }
+
+
+_shared_policy: Optional[HedgePolicy] = None
+
+
+def get_shared_hedge_policy() -> HedgePolicy:
+    """获取进程内共享的对冲策略（由环境变量配置）"""
+    global _shared_policy
+    if _shared_policy is None:
+        _shared_policy = HedgePolicy()
+        if _shared_policy.enabled:
+            logger.info(f"⏱️  TTS对冲请求已启用: {_shared_policy.stats()}")
+    return _shared_policy
@@ -0,0 +1,88 @@
+"""
+常用短语预合成
+服务启动后在后台为每个音色预先合成应答/过渡短语并常驻缓存，命中时无需请求豆包TTS
+"""
+
+import os
+import json
+import asyncio
+from loguru import logger
+from doubao_tts_client import DoubaoTTSClient, TTSOptions
+from llm_tts_stream import clean_text_for_tts
+from tts_scheduler import PRIORITY_BACKGROUND
+
+# 默认短语目录：闲聊提示词要求模型使用的接任务开场白 + 常见应答/过渡语
+DEFAULT_PHRASES = [
+    # 接任务开场白（见 get_chat_prompt 中的示例回复）
+    "马上处理",
+    "这就去查",
+    "来了",
+    "这就来",
+    "这就去",
+    "马上做",
+    # 应答/过渡语
+    "好的",
+    "好的。",
+    "收到",
+    "收到。",
+    "嗯",
+    "嗯。",
+    "好嘞",
+    "稍等一下",
+    "稍等一下。",
+    "我看看",
+    "没问题",
+]
+
+
+def load_phrase_catalog() -> list[str]:
+    """
+    读取短语目录
+    TTS_PHRASE_CATALOG_FILE: JSON数组文件；TTS_PHRASE_CATALOG: 用"|"分隔的短语；都未设置时使用默认目录
+    """
+    phrases = DEFAULT_PHRASES
+    catalog_file = os.getenv("TTS_PHRASE_CATALOG_FILE")
+    catalog_inline = os.getenv("TTS_PHRASE_CATALOG")
+
+    if catalog_file:
+        try:
+            with open(catalog_file, 'r', encoding='utf-8') as f:
+                phrases = json.load(f)
+        except Exception as e:
+            logger.error(f"读取短语目录 {catalog_file} 失败，使用默认目录: {e}")
+    elif catalog_inline:
+        phrases = catalog_inline.split('|')
+
+    # 与句子合成走同样的清理，保证与实际句子的缓存键一致；去重并保持顺序
+    cleaned = [clean_text_for_tts(p) for p in phrases]
+    return list(dict.fromkeys(p for p in cleaned if p))
+
+
+async def presynthesize_phrase_catalog(voice_speeds: dict[str, float], phrases: list[str] = None,
+                                       concurrency: int = None, client: DoubaoTTSClient = None):
+    """为每个音色预合成短语目录（后台任务，失败只记录日志）"""
+    client = client or DoubaoTTSClient()
+    phrases = phrases if phrases is not None else load_phrase_catalog()
+    concurrency = concurrency or int(os.getenv("TTS_PRESYNTH_CONCURRENCY", "2"))
+    semaphore = asyncio.Semaphore(concurrency)
+    done_count = 0
+
+    async def render(options: TTSOptions, phrase: str):
+        nonlocal done_count
+        async with semaphore:
+            try:
+                audio_data = await client.text_to_speech_cached(phrase, pin=True, options=options,
+                                                              priority=PRIORITY_BACKGROUND)
+                if audio_data:
+                    done_count += 1
+            except Exception as e:
+                logger.warning(f"预合成短语失败 [{options.voice_type}] {phrase}: {e}")
+
+    tasks = []
+    for voice_type, speed in voice_speeds.items():
+        options = TTSOptions(voice_type=voice_type, speed=speed)
+        tasks.extend(render(options, phrase) for phrase in phrases)
+
+    logger.info(f"🗂️  开始预合成短语目录: {len(voice_speeds)} 个音色 × {len(phrases)} 条短语")
+    await asyncio.gather(*tasks)
+    logger.info(f"✅ 短语目录预合成完成: {done_count}/{len(tasks)}")
@@ -0,0 +1,137 @@
+"""
+TTS会话调度器
+进程内限制同时进行的豆包TTS会话数（避免超出并发配额），排队时按优先级放行：回复首句 > 后续句子 > 批量总结 > 后台预合成
+"""
+
+import os
+import time
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from typing import Optional
+from loguru import logger
+
+# 优先级（数值越小越先放行）
+PRIORITY_FIRST_SENTENCE = 0
+PRIORITY_SENTENCE = 1
+PRIORITY_BATCH = 2
+PRIORITY_BACKGROUND = 3
+
+PRIORITY_NAMES = {
+    PRIORITY_FIRST_SENTENCE: "first_sentence",
+    PRIORITY_SENTENCE: "sentence",
+    PRIORITY_BATCH: "batch",
+    PRIORITY_BACKGROUND: "background",
+}
+
+
+class TTSScheduler:
+    """带优先级队列的会话并发限制器，同优先级先到先得"""
+
+    def __init__(self, max_sessions: Optional[int] = None):
+        self.max_sessions = max_sessions or int(os.getenv("TTS_MAX_CONCURRENT_SESSIONS", "4"))
+        self._active = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []  # 小顶堆 (优先级, 序号, future)
+        self._sequence = itertools.count()
+        self._queued = {priority: 0 for priority in PRIORITY_NAMES}
+
+        # 统计信息
+        self.granted = 0
+        self.waited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.max_queue_depth = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(self._queued.values())
+
+    async def acquire(self, priority: int = PRIORITY_SENTENCE):
+        """获取一个会话名额，名额用完时按优先级排队"""
+        if self._active < self.max_sessions and not self._waiters:
+            self._active += 1
+            self.granted += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self._queued[priority] += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        enqueued_at = time.monotonic()
+        self._wake()  # 堆中可能只剩已取消的条目，此时有空闲名额应直接放行
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                # 排队中被取消，_wake会跳过该条目
+                self._queued[priority] -= 1
+            else:
+                # 已分到名额但调用方被取消，归还名额
+                self.release()
+            raise
+
+        wait = time.monotonic() - enqueued_at
+        self.waited += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        if wait > 1.0:
+            logger.warning(f"TTS会话排队 {wait * 1000:.0f}ms（{PRIORITY_NAMES[priority]}），当前队列: {self.queue_depth}")
+
+    def try_acquire(self) -> bool:
+        """有空闲名额且无人排队时立即占用并返回True，否则不排队直接返回False（对冲会话使用）"""
+        if self._active < self.max_sessions and not self._waiters:
+            self._active += 1
+            self.granted += 1
+            return True
+        return False
+
+    def release(self):
+        self._active -= 1
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self._active < self.max_sessions:
+            priority, _, future = heapq.heappop(self._waiters)
+            if future.done():  # 已取消
+                continue
+            self._queued[priority] -= 1
+            self._active += 1
+            self.granted += 1
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_SENTENCE, acquired: bool = False):
+        """async with scheduler.slot(priority): 占用一个会话名额；acquired=True表示已用try_acquire占到，只负责归还"""
+        if not acquired:
+            await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_sessions": self.max_sessions,
+            "active": self._active,
+            "queue_depth": self.queue_depth,
+            "queued": {PRIORITY_NAMES[p]: count for p, count in self._queued.items()},
+            "max_queue_depth": self.max_queue_depth,
+            "granted": self.granted,
+            "waited": self.waited,
+            "avg_wait_ms": round(self.total_wait / self.waited * 1000) if self.waited else 0,
+            "max_wait_ms": round(self.max_wait * 1000)
+        }
+
+
+_shared_scheduler: Optional[TTSScheduler] = None
+
+
+def get_shared_tts_scheduler() -> TTSScheduler:
+    """获取进程内共享的TTS会话调度器（由环境变量配置）"""
+    global _shared_scheduler
+    if _shared_scheduler is None:
+        _shared_scheduler = TTSScheduler()
+        logger.info(f"🚦 TTS会话调度器: 最多 {_shared_scheduler.max_sessions} 个并发会话")
+    return _shared_scheduler
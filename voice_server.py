@@ -8,10 +8,11 @@ import os
 import base64
 import asyncio
 import json
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
+from typing import Optional
+from pydantic import BaseModel, ValidationError
 from loguru import logger
 from dotenv import load_dotenv
 
@@ -20,9 +21,20 @@ load_dotenv('.env.local')
 load_dotenv()  # 备用
 
 # 导入已有的客户端
-from doubao_tts_client import DoubaoTTSClient
+from doubao_tts_client import DoubaoTTSClient, TTSOptions
 from xfyun_asr_client import XFYunASRClient
-from llm_tts_stream import LLMTTSStreamer
+from llm_tts_stream import LLMTTSStreamer, TTS_ENGINES
+from doubao_tts_pool import get_shared_pool, close_shared_pools
+from tts_audio_cache import get_shared_audio_cache
+from tts_hedging import get_shared_hedge_policy
+from tts_scheduler import PRIORITY_FIRST_SENTENCE, get_shared_tts_scheduler
+from tts_phrase_catalog import presynthesize_phrase_catalog
+from audio_assembly import concat_audio, AUDIO_MIME_TYPES, SUPPORTED_SAMPLE_RATES
+from audio_decoding import STREAM_INPUT_FORMATS, DecoderBusy, decode_stream, get_shared_decode_pool
+from asr_vad import load_vad_config, apply_vad
+from asr_long_audio import recognize_long_audio
+from asr_connection_pool import close_shared_asr_pools
+from ark_http_client import get_shared_ark_transport, close_shared_ark_transport
 
 app = FastAPI(title="语音服务API", version="1.0.0")
 
@@ -51,6 +63,13 @@ app.add_middleware(
 # 初始化客户端
 tts_client = DoubaoTTSClient()
 asr_client = XFYunASRClient()
+asr_vad_config = load_vad_config()  # 上传识别前裁掉首尾静音、压缩长停顿
+ASR_LONG_AUDIO_SECONDS = float(os.getenv("ASR_LONG_AUDIO_SECONDS", "30"))  # 超过该时长的录音分段并行识别
+ASR_MAX_UPLOAD_BYTES = int(float(os.getenv("ASR_MAX_UPLOAD_MB", "50")) * 1024 * 1024)
+ASR_REALTIME_FRAME_BYTES = 1280  # 实时模式每帧40ms @ 16kHz (16000 * 2 bytes * 0.04)
+
+# 二进制上传中按16kHz单声道16bit裸PCM处理的类型
+PCM_CONTENT_TYPES = ("audio/l16", "audio/pcm", "audio/x-pcm")
 
 # 音色对应的语速配置
 VOICE_SPEED_CONFIG = {
@@ -58,21 +77,51 @@ VOICE_SPEED_CONFIG = {
     'zh_male_shaonianzixin_moon_bigtts': 1.2,  # 小远 1.2倍速
 }
 
+def tts_options_for(voice: str, audio_format: str = "wav", sample_rate: int = 24000) -> TTSOptions:
+    """按音色构建本次请求的合成参数（含该音色的语速和请求的输出格式）"""
+    if audio_format not in AUDIO_MIME_TYPES:
+        raise HTTPException(status_code=400, detail=f"不支持的音频格式: {audio_format}，可选: {', '.join(AUDIO_MIME_TYPES)}")
+    if sample_rate not in SUPPORTED_SAMPLE_RATES:
+        raise HTTPException(status_code=400, detail=f"不支持的采样率: {sample_rate}")
+    return TTSOptions(voice_type=voice, speed=VOICE_SPEED_CONFIG.get(voice, 1.0),
+                      audio_format=audio_format, sample_rate=sample_rate)
+
+def streamer_for(voice: str, audio_format: str = "wav", sample_rate: int = 24000,
+                 tts_engine: Optional[str] = None) -> LLMTTSStreamer:
+    """创建使用共享TTS客户端的流式处理器（tts_engine为空时使用TTS_ENGINE配置）"""
+    options = tts_options_for(voice, audio_format, sample_rate)
+    if tts_engine and tts_engine not in TTS_ENGINES:
+        raise HTTPException(status_code=400, detail=f"不支持的TTS引擎: {tts_engine}，可选: {', '.join(TTS_ENGINES)}")
+    return LLMTTSStreamer(voice, tts_client=tts_client, speed=options.speed,
+                          audio_format=options.audio_format, sample_rate=options.sample_rate,
+                          tts_engine=tts_engine)
+
+# 后台预合成任务
+presynth_task = None
+
 # 请求模型
 class TTSRequest(BaseModel):
     text: str
     voice: str = "zh_female_sajiaonvyou_moon_bigtts"
+    format: str = "wav"  # wav/mp3/ogg_opus/pcm，移动端弱网建议mp3或ogg_opus
+    sample_rate: int = 24000
 
 class ASRRequest(BaseModel):
     audioBase64: str
+    realtime: bool = False  # 按实时节奏发送（默认文件模式，尽快上传）
 
 class LLMTTSRequest(BaseModel):
     agentContent: str
     voice: str = "zh_female_sajiaonvyou_moon_bigtts"
+    format: str = "wav"
+    sample_rate: int = 24000
+    tts_engine: Optional[str] = None  # sentence（逐句会话）/ bidirectional（单会话），为空时取TTS_ENGINE
 
 class PlanningRequest(BaseModel):
     userQuestion: str
     voice: str = "zh_female_sajiaonvyou_moon_bigtts"
+    format: str = "wav"
+    sample_rate: int = 24000
 
 class ChatMessage(BaseModel):
     role: str
@@ -85,10 +134,14 @@ class ChatRequest(BaseModel):
     agent_working: bool = False  # Agentic AI工作状态
     deep_thinking: bool = False  # 深度思考模式
     uploaded_files: list[str] = []  # 上传的文件路径
+    format: str = "wav"  # 音频输出格式
+    sample_rate: int = 24000
+    tts_engine: Optional[str] = None  # sentence（逐句会话）/ bidirectional（单会话），为空时取TTS_ENGINE
 
 @app.on_event("startup")
 async def startup_event():
     """启动时预热"""
+    global presynth_task
     logger.info("🚀 语音服务启动中...")
     
     # 预热TTS
@@ -107,14 +160,30 @@ async def startup_event():
     
     # 预热LLM-TTS双向流式（使用默认音色）
     try:
-        streamer = LLMTTSStreamer('zh_female_sajiaonvyou_moon_bigtts')
+        streamer = LLMTTSStreamer('zh_female_sajiaonvyou_moon_bigtts', tts_client=tts_client)
         await streamer.warm_up()
         logger.info("✅ LLM-TTS双向流式预热完成")
     except Exception as e:
         logger.error(f"LLM-TTS预热失败: {e}")
     
+    # 后台预合成常用短语（每个音色按其语速），不阻塞启动
+    if os.getenv("TTS_PRESYNTH_ENABLED", "1") != "0":
+        voices = dict.fromkeys(list(LLMTTSStreamer.VOICE_PERSONAS) + list(VOICE_SPEED_CONFIG))
+        voice_speeds = {voice: VOICE_SPEED_CONFIG.get(voice, 1.0) for voice in voices}
+        presynth_task = asyncio.create_task(presynthesize_phrase_catalog(voice_speeds, client=tts_client))
+    
     logger.info("🎉 语音服务启动完成")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """关闭时释放TTS连接池、ASR预建连接和Ark HTTP连接"""
+    if presynth_task and not presynth_task.done():
+        presynth_task.cancel()
+    await close_shared_pools()
+    await close_shared_asr_pools()
+    await close_shared_ark_transport()
+    logger.info("👋 TTS连接池、ASR预建连接、Ark HTTP连接已关闭")
+
 @app.get("/")
 async def root():
     return {
@@ -123,6 +192,8 @@ async def root():
         "endpoints": {
             "tts": "/api/tts",
             "asr": "/api/asr",
+            "asr_stream": "/ws/asr",
+            "asr_prewarm": "/api/asr/prewarm",
             "health": "/health"
         }
     }
@@ -132,7 +203,15 @@ async def health():
     return {
         "status": "ok",
         "tts_ready": tts_client.is_warmed_up,
-        "asr_ready": asr_client.is_warmed_up
+        "asr_ready": asr_client.is_warmed_up,
+        "tts_pool": get_shared_pool(tts_client).stats(),
+        "tts_cache": get_shared_audio_cache().stats(),
+        "tts_hedging": get_shared_hedge_policy().stats(),
+        "tts_scheduler": get_shared_tts_scheduler().stats(),
+        "asr_decoder": get_shared_decode_pool().stats(),
+        "asr_watchdog": asr_client.watchdog.stats(),
+        "asr_connections": asr_client.connection_pool.stats(),
+        "llm_http": get_shared_ark_transport().stats()
     }
 
 @app.post("/api/tts")
@@ -141,21 +220,16 @@ async def text_to_speech(request: TTSRequest):
     try:
         logger.info(f"🎤 TTS请求: 音色={request.voice}, 文本长度={len(request.text)}")
         
-        # 设置音色和语速
-        tts_client.voice_type = request.voice
-        tts_client.speed = VOICE_SPEED_CONFIG.get(request.voice, 1.0)
-        logger.info(f"⚡ 设置语速: {tts_client.speed}x")
+        # 音色和语速随本次请求传入，不修改共享客户端
+        tts_options = tts_options_for(request.voice, request.format, request.sample_rate)
+        logger.info(f"⚡ 设置语速: {tts_options.speed}x")
         
-        # 收集音频数据
-        audio_chunks = []
-        async for audio_chunk in tts_client.text_to_speech(request.text):
-            audio_chunks.append(audio_chunk)
+        # 合成音频（优先读取音频缓存）
+        audio_data = await tts_client.text_to_speech_cached(request.text, options=tts_options,
+                                                            priority=PRIORITY_FIRST_SENTENCE)
         
-        if not audio_chunks:
+        if not audio_data:
             raise HTTPException(status_code=500, detail="未生成音频数据")
-        
-        # 合并音频
-        audio_data = b''.join(audio_chunks)
         audio_base64 = base64.b64encode(audio_data).decode('utf-8')
         
         logger.info(f"✅ TTS成功: {len(audio_data)} 字节")
@@ -164,94 +238,266 @@ async def text_to_speech(request: TTSRequest):
             "success": True,
             "audioBase64": audio_base64,
             "audioSize": len(audio_data),
+            "format": tts_options.audio_format,
+            "mimeType": AUDIO_MIME_TYPES[tts_options.audio_format],
             "voice": request.voice,
             "text": request.text
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"TTS错误: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def read_request_body(request: Request) -> bytearray:
+    """流式读取请求体到一个缓冲区（不经过JSON和base64），超过上限时返回413"""
+    buffer = bytearray()
+    async for chunk in request.stream():
+        buffer += chunk
+        if len(buffer) > ASR_MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail=f"音频超过 {ASR_MAX_UPLOAD_BYTES // 1024 // 1024}MB")
+    return buffer
+
+async def recognize_stream(audio_stream, realtime: bool = False) -> tuple[str, bool]:
+    """识别一路16kHz PCM音频流，返回 (识别文本, 是否因会话超时只得到部分结果)"""
+    recognized_text = ""
+    timed_out = False
+    async for result in asr_client.speech_to_text(audio_stream, realtime=realtime):
+        logger.debug(f"ASR结果: {result}")
+        
+        if result.get('error'):
+            error_msg = result['error']
+            logger.error(f"ASR识别错误: {error_msg}")
+            raise HTTPException(status_code=500, detail=f"ASR识别失败: {error_msg}")
+        
+        if result.get('text'):
+            recognized_text = result['text']
+            logger.info(f"识别到文本: {recognized_text}")
+        
+        if result.get('is_final'):
+            timed_out = result.get('timed_out', False)
+            logger.info("ASR识别完成（最终结果）" if not timed_out else f"ASR会话超时（{result['timeout']}），使用部分结果")
+            break
+    
+    if not recognized_text:
+        logger.warning("ASR未识别到任何文本")
+    logger.info(f"✅ ASR成功: {recognized_text}")
+    return recognized_text, timed_out
+
+async def recognize_audio(audio_data, input_format: Optional[str] = None, realtime: bool = False) -> dict:
+    """整段上传音频的识别：解码 → 长录音分段并行识别 / VAD后单会话识别"""
+    logger.info(f"解码后音频大小: {len(audio_data)} bytes")
+    
+    # 转换为 16kHz 单声道 PCM（在ffmpeg子进程中解码，不阻塞事件循环；已是16kHz PCM/WAV时跳过）
+    decoded = False
+    try:
+        pcm_data = await get_shared_decode_pool().to_pcm(audio_data, input_format)
+        decoded = True
+        logger.info(f"✅ 音频转换成功: {len(pcm_data)} bytes PCM @ 16kHz")
+    except DecoderBusy as e:
+        logger.warning(str(e))
+        raise HTTPException(status_code=503, detail="语音识别繁忙，请稍后重试")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="音频解码超时")
+    except FileNotFoundError:
+        # 未安装ffmpeg，尝试直接使用音频数据
+        logger.warning("未安装 ffmpeg，尝试直接使用音频数据")
+        pcm_data = audio_data
+    except Exception as e:
+        logger.error(f"音频转换失败: {e}")
+        # 降级方案：直接使用原始数据
+        pcm_data = audio_data
+    
+    # 长录音：按停顿分段，多个会话并行识别
+    if decoded and not realtime and len(pcm_data) / 32000 > ASR_LONG_AUDIO_SECONDS:
+        result = await recognize_long_audio(asr_client, pcm_data, asr_vad_config)
+        return {
+            "success": True,
+            "text": result["text"],
+            "isFinal": True,
+            "timedOut": any(segment.get("timedOut") for segment in result["segments"]),
+            "segments": result["segments"]
+        }
+    
+    if decoded and asr_vad_config:
+        voiced = apply_vad(pcm_data, asr_vad_config)
+        logger.info(f"🎚️  VAD: {len(pcm_data) / 32000:.1f}s → {len(voiced) / 32000:.1f}s")
+        pcm_data = voiced
+    
+    # 创建音频流生成器：文件模式整段交给ASR客户端切成大帧，实时模式按40ms分块
+    async def audio_generator():
+        if not realtime:
+            yield pcm_data
+            return
+        for i in range(0, len(pcm_data), ASR_REALTIME_FRAME_BYTES):
+            yield pcm_data[i:i + ASR_REALTIME_FRAME_BYTES]
+    
+    recognized_text, timed_out = await recognize_stream(audio_generator(), realtime)
+    return {
+        "success": True,
+        "text": recognized_text,
+        "isFinal": True,
+        "timedOut": timed_out
+    }
+
 @app.post("/api/asr")
-async def speech_to_text(request: ASRRequest):
-    """语音转文字 - 支持WebM格式自动转换"""
+async def speech_to_text(request: Request, format: Optional[str] = None, realtime: bool = False):
+    """
+    语音转文字 - 支持WebM等格式自动转换
+    请求体三种形式：
+      application/json：{"audioBase64": ..., "realtime": false}（兼容旧客户端）
+      multipart/form-data：文件字段 audio
+      原始音频字节（audio/webm、audio/wav、application/octet-stream、audio/L16等）：流式读取，不做base64
+    二进制上传用查询参数 format=pcm 声明16kHz单声道16bit裸PCM；裸PCM且 realtime=true 时边接收边识别
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
     try:
-        logger.info(f"🎙️ ASR请求: 音频长度={len(request.audioBase64)}")
-        
-        # 解码音频数据
-        audio_data = base64.b64decode(request.audioBase64)
-        logger.info(f"解码后音频大小: {len(audio_data)} bytes")
+        if content_type == "application/json":
+            try:
+                body = ASRRequest(**await request.json())
+            except (ValidationError, ValueError, TypeError) as e:
+                raise HTTPException(status_code=422, detail=f"请求格式错误: {e}")
+            logger.info(f"🎙️ ASR请求: 音频长度={len(body.audioBase64)}")
+            return await recognize_audio(base64.b64decode(body.audioBase64), realtime=body.realtime)
         
-        # 检测音频格式并转换为 PCM
-        import io
-        import tempfile
+        if content_type == "multipart/form-data":
+            form = await request.form()
+            upload = form.get("audio")
+            if upload is None or isinstance(upload, str):
+                raise HTTPException(status_code=400, detail="缺少音频文件字段 audio")
+            if upload.size and upload.size > ASR_MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail=f"音频超过 {ASR_MAX_UPLOAD_BYTES // 1024 // 1024}MB")
+            if not format and (upload.content_type or "").lower() in PCM_CONTENT_TYPES:
+                format = "pcm"
+            logger.info(f"🎙️ ASR请求（表单上传）: {upload.filename}, {upload.size} bytes")
+            return await recognize_audio(await upload.read(), format, realtime)
         
-        # 使用 pydub 进行格式转换
-        try:
-            from pydub import AudioSegment
-            
-            # 从bytes创建AudioSegment
-            audio_segment = AudioSegment.from_file(io.BytesIO(audio_data))
+        if not format and content_type in PCM_CONTENT_TYPES:
+            format = "pcm"
+        if format == "pcm" and realtime:
+            # 裸PCM实时上传：请求体边到达边按40ms重新切帧送入识别，不缓存整段
+            logger.info("🎙️ ASR请求（PCM流式上传）")
+            received = 0
             
-            # 转换为 16kHz 单声道 PCM
-            audio_segment = audio_segment.set_frame_rate(16000).set_channels(1).set_sample_width(2)
+            async def body_audio():
+                nonlocal received
+                pending = bytearray()
+                async for chunk in request.stream():
+                    received += len(chunk)
+                    if received > ASR_MAX_UPLOAD_BYTES:
+                        return  # 超限：结束音频流，识别会话收尾后返回413
+                    pending += chunk
+                    frames_end = len(pending) - len(pending) % ASR_REALTIME_FRAME_BYTES
+                    for i in range(0, frames_end, ASR_REALTIME_FRAME_BYTES):
+                        yield bytes(pending[i:i + ASR_REALTIME_FRAME_BYTES])
+                    del pending[:frames_end]
+                if pending:
+                    yield bytes(pending)
             
-            # 导出为 raw PCM
-            pcm_data = audio_segment.raw_data
-            logger.info(f"✅ 音频转换成功: {len(pcm_data)} bytes PCM @ 16kHz")
-            
-        except ImportError:
-            # 如果没有安装 pydub，尝试简单处理
-            logger.warning("未安装 pydub，尝试直接使用音频数据")
-            pcm_data = audio_data
-        except Exception as e:
-            logger.error(f"音频转换失败: {e}")
-            # 降级方案：直接使用原始数据
-            pcm_data = audio_data
+            recognized_text, timed_out = await recognize_stream(body_audio(), realtime=True)
+            if received > ASR_MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail=f"音频超过 {ASR_MAX_UPLOAD_BYTES // 1024 // 1024}MB")
+            return {
+                "success": True,
+                "text": recognized_text,
+                "isFinal": True,
+                "timedOut": timed_out
+            }
         
-        # 创建音频流生成器
-        async def audio_generator():
-            # 分块发送音频数据
-            chunk_size = 1280  # 40ms @ 16kHz (16000 * 2 bytes * 0.04)
-            for i in range(0, len(pcm_data), chunk_size):
-                chunk = pcm_data[i:i + chunk_size]
-                if len(chunk) > 0:
-                    yield chunk
-                    await asyncio.sleep(0.04)  # 40ms间隔
+        audio_data = await read_request_body(request)
+        logger.info(f"🎙️ ASR请求（二进制上传）: {content_type or '未知类型'}, {len(audio_data)} bytes")
+        return await recognize_audio(audio_data, format, realtime)
         
-        # 识别语音
-        recognized_text = ""
-        async for result in asr_client.speech_to_text(audio_generator()):
-            logger.debug(f"ASR结果: {result}")
-            
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"ASR错误: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/asr/prewarm")
+async def prewarm_asr():
+    """
+    预告即将识别（如用户打开麦克风）：后台准备已签名、已握手的ASR连接，
+    随后的识别请求直接在现成连接上发送首帧
+    """
+    asr_client.connection_pool.prewarm()
+    return {"success": True, "pool": asr_client.connection_pool.stats()}
+
+@app.websocket("/ws/asr")
+async def speech_to_text_stream(websocket: WebSocket, format: str = "pcm", sample_rate: int = 16000):
+    """
+    实时语音识别：用户说话时即上传音频，识别与说话同时进行
+    客户端：连接 /ws/asr?format=pcm|opus|webm|ogg&sample_rate=16000，发送二进制音频帧
+           （pcm为16bit单声道小端；opus/webm/ogg为MediaRecorder输出的封装流），说完发送文本 {"type": "end"}
+    服务端：推送 {"type": "partial", "text", "stable"}（stable为不会再被修订的前缀，可提前交给下游），
+           最后推送 {"type": "final", "text", "timedOut"} 或 {"type": "error", "error"} 后关闭
+    """
+    await websocket.accept()
+    if format not in STREAM_INPUT_FORMATS:
+        await websocket.send_json({"type": "error", "error": f"不支持的音频格式: {format}，可选: {', '.join(STREAM_INPUT_FORMATS)}"})
+        await websocket.close()
+        return
+    logger.info(f"🎙️ 实时ASR连接: 格式={format}, 采样率={sample_rate}")
+    
+    frames: asyncio.Queue = asyncio.Queue()  # None 表示音频结束
+    
+    async def receive_audio():
+        """接收客户端音频帧，收到结束消息或断开时结束音频流"""
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes"):
+                    frames.put_nowait(message["bytes"])
+                elif message.get("text"):
+                    try:
+                        control = json.loads(message["text"])
+                    except ValueError:
+                        continue
+                    if control.get("type") == "end":
+                        break
+        finally:
+            frames.put_nowait(None)
+    
+    async def client_audio():
+        while (chunk := await frames.get()) is not None:
+            yield chunk
+    
+    receiver = asyncio.create_task(receive_audio())
+    recognized_text = ""
+    timed_out = False
+    try:
+        # 音频本身按实时到达，不再重新切帧
+        audio_stream = decode_stream(client_audio(), format, sample_rate)
+        async for result in asr_client.speech_to_text(audio_stream, realtime=True):
             if result.get('error'):
-                error_msg = result['error']
-                logger.error(f"ASR识别错误: {error_msg}")
-                raise HTTPException(status_code=500, detail=f"ASR识别失败: {error_msg}")
+                logger.error(f"实时ASR识别错误: {result['error']}")
+                await websocket.send_json({"type": "error", "error": result['error']})
+                return
             
             if result.get('text'):
                 recognized_text = result['text']
-                logger.info(f"识别到文本: {recognized_text}")
-            
             if result.get('is_final'):
-                logger.info("ASR识别完成（最终结果）")
+                timed_out = result.get('timed_out', False)
                 break
+            if result.get('text'):
+                await websocket.send_json({"type": "partial", "text": recognized_text,
+                                           "stable": result.get('stable_text', "")})
         
-        if not recognized_text:
-            logger.warning("ASR未识别到任何文本")
-            recognized_text = ""
-        
-        logger.info(f"✅ ASR成功: {recognized_text}")
-        
-        return {
-            "success": True,
-            "text": recognized_text,
-            "isFinal": True
-        }
-        
+        logger.info(f"✅ 实时ASR完成: {recognized_text}")
+        await websocket.send_json({"type": "final", "text": recognized_text, "timedOut": timed_out})
+    except WebSocketDisconnect:
+        logger.info("实时ASR客户端已断开")
     except Exception as e:
-        logger.error(f"ASR错误: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        logger.error(f"实时ASR错误: {e}")
+    finally:
+        receiver.cancel()
+        try:
+            await websocket.close()
+        except Exception:
+            pass
 
 @app.post("/api/avatar-planning")
 async def avatar_planning(request: PlanningRequest):
@@ -259,10 +505,9 @@ async def avatar_planning(request: PlanningRequest):
     try:
         logger.info(f"📋 数字人计划: 音色={request.voice}, 问题={request.userQuestion[:30]}...")
         
-        # 创建流式处理器并设置语速
-        streamer = LLMTTSStreamer(request.voice)
-        streamer.tts_client.speed = VOICE_SPEED_CONFIG.get(request.voice, 1.0)
-        logger.info(f"⚡ 设置语速: {streamer.tts_client.speed}x")
+        # 创建流式处理器（共享TTS客户端，音色和语速随请求传入）
+        streamer = streamer_for(request.voice, request.format, request.sample_rate)
+        logger.info(f"⚡ 设置语速: {streamer.tts_options.speed}x")
         
         # 生成任务计划
         planning_text = ""
@@ -273,11 +518,11 @@ async def avatar_planning(request: PlanningRequest):
         
         # 合成语音
         audio_chunks = []
-        async for audio_chunk in streamer.tts_client.text_to_speech(planning_text):
+        async for audio_chunk in streamer.tts_client.text_to_speech(planning_text, options=streamer.tts_options):
             audio_chunks.append(audio_chunk)
         
         if audio_chunks:
-            audio_data = b''.join(audio_chunks)
+            audio_data = concat_audio(audio_chunks, streamer.tts_options.audio_format)
             audio_base64 = base64.b64encode(audio_data).decode('utf-8')
             
             logger.info(f"✅ 任务计划成功: {len(audio_data)} 字节")
@@ -286,12 +531,16 @@ async def avatar_planning(request: PlanningRequest):
                 "success": True,
                 "audioBase64": audio_base64,
                 "audioSize": len(audio_data),
+                "format": streamer.tts_options.audio_format,
+                "mimeType": AUDIO_MIME_TYPES[streamer.tts_options.audio_format],
                 "planningText": planning_text,
                 "voice": request.voice
             }
         else:
             raise HTTPException(status_code=500, detail="未生成音频")
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"任务计划错误: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -302,10 +551,9 @@ async def llm_tts_bidirectional(request: LLMTTSRequest):
     try:
         logger.info(f"🔄 LLM-TTS双向流式请求: 音色={request.voice}, 内容长度={len(request.agentContent)}")
         
-        # 创建流式处理器并设置语速
-        streamer = LLMTTSStreamer(request.voice)
-        streamer.tts_client.speed = VOICE_SPEED_CONFIG.get(request.voice, 1.0)
-        logger.info(f"⚡ 设置语速: {streamer.tts_client.speed}x")
+        # 创建流式处理器（共享TTS客户端，音色和语速随请求传入）
+        streamer = streamer_for(request.voice, request.format, request.sample_rate, request.tts_engine)
+        logger.info(f"⚡ 设置语速: {streamer.tts_options.speed}x")
         
         # 生成总结并合成音频
         result = await streamer.generate_and_speak(request.agentContent)
@@ -319,16 +567,32 @@ async def llm_tts_bidirectional(request: LLMTTSRequest):
                 "success": True,
                 "audioBase64": audio_base64,
                 "audioSize": result["audio_size"],
+                "format": streamer.tts_options.audio_format,
+                "mimeType": AUDIO_MIME_TYPES[streamer.tts_options.audio_format],
                 "summaryText": result.get("summary_text", ""),  # 返回总结文本
                 "voice": request.voice
             }
         else:
             raise HTTPException(status_code=500, detail=result.get("error", "生成失败"))
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"LLM-TTS错误: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/llm-tts-stream-audio")
+async def llm_tts_stream_audio(request: LLMTTSRequest):
+    """LLM-TTS总结的流式音频：逐句合成完成即输出（WAV使用流式头）"""
+    logger.info(f"🔄 LLM-TTS流式音频请求: 音色={request.voice}, 内容长度={len(request.agentContent)}")
+    streamer = streamer_for(request.voice, request.format, request.sample_rate, request.tts_engine)
+    
+    return StreamingResponse(
+        streamer.llm_tts_bidirectional_stream(request.agentContent),
+        media_type=AUDIO_MIME_TYPES[streamer.tts_options.audio_format],
+        headers={"Cache-Control": "no-cache"}
+    )
+
 @app.post("/api/avatar-chat-stream")
 async def avatar_chat_bidirectional(request: ChatRequest):
     """数字人闲聊双向流式：LLM生成回复并实时合成语音（SSE流式返回）"""
@@ -338,10 +602,9 @@ async def avatar_chat_bidirectional(request: ChatRequest):
         try:
             logger.info(f"💬 数字员工闲聊: 音色={request.voice}, 消息={request.message[:30]}..., 历史={len(request.history)}条, Agent工作={request.agent_working}, 深度思考={request.deep_thinking}, 文件={len(request.uploaded_files)}个")
             
-            # 创建流式处理器并设置语速
-            streamer = LLMTTSStreamer(request.voice)
-            streamer.tts_client.speed = VOICE_SPEED_CONFIG.get(request.voice, 1.0)
-            logger.info(f"⚡ 设置语速: {streamer.tts_client.speed}x")
+            # 创建流式处理器（共享TTS客户端，音色和语速随请求传入）
+            streamer = streamer_for(request.voice, request.format, request.sample_rate, request.tts_engine)
+            logger.info(f"⚡ 设置语速: {streamer.tts_options.speed}x, TTS引擎: {streamer.tts_engine}")
             
             # 转换历史消息格式
             history_messages = [{"role": msg.role, "content": msg.content} for msg in request.history]
@@ -410,22 +673,26 @@ async def avatar_chat_bidirectional(request: ChatRequest):
                     logger.info(f"✅ [voice_server] reasoning 事件已发送")
                     
                 elif event["type"] == "audio":
-                    # 流式返回音频片段（Base64编码，携带顺序信息）
+                    # 流式返回音频片段（Base64编码，已按句子顺序发出）
                     audio_base64 = base64.b64encode(event["data"]).decode('utf-8')
                     payload = {
                         'type': 'audio',
-                        'data': audio_base64
+                        'data': audio_base64,
+                        'mimeType': AUDIO_MIME_TYPES[streamer.tts_options.audio_format]
                     }
                     if 'order' in event:
                         payload['order'] = event['order']
-                    if 'total' in event:
-                        payload['total'] = event['total']
+                    if 'sentence' in event:
+                        payload['sentence'] = event['sentence']
                     yield f"data: {json.dumps(payload)}\n\n"
                     
                 elif event["type"] == "done":
                     # 完成标记
                     logger.info(f"✅ 闲聊完成: {event.get('full_text', '')[:50]}...")
-                    yield f"data: {json.dumps({'type': 'done', 'full_text': event.get('full_text', '')})}\n\n"
+                    done_payload = {'type': 'done', 'full_text': event.get('full_text', '')}
+                    if 'total' in event:
+                        done_payload['total'] = event['total']
+                    yield f"data: {json.dumps(done_payload)}\n\n"
                     
                 elif event["type"] == "error":
                     # 错误
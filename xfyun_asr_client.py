@@ -10,6 +10,9 @@ from typing import AsyncGenerator, Optional
 from loguru import logger
 import websockets
 from dotenv import load_dotenv
+from asr_transcript import WpgsTranscript
+from asr_watchdog import ASRWatchdog, get_shared_asr_watchdog
+from asr_connection_pool import get_shared_asr_pool
 
 # 加载.env.local文件
 load_dotenv('.env.local')
@@ -18,7 +21,7 @@ load_dotenv()  # 备用
 class XFYunASRClient:
     """科大讯飞语音识别客户端"""
     
-    def __init__(self):
+    def __init__(self, watchdog: Optional[ASRWatchdog] = None):
         self.app_id = os.getenv("XFYUN_APPID")
         self.api_key = os.getenv("XFYUN_API_KEY") 
         self.api_secret = os.getenv("XFYUN_API_SECRET")
@@ -33,6 +36,16 @@ class XFYunASRClient:
         self.accent = "mandarin"  # 普通话
         self.sample_rate = 16000  # 采样率
         
+        # 文件模式（已录好的音频）：大帧 + 最小帧间隔；实时模式按音频时长节奏发送
+        self.file_frame_bytes = int(os.getenv("XFYUN_ASR_FILE_FRAME_BYTES", "8000"))  # 250ms @ 16kHz
+        self.file_frame_gap = float(os.getenv("XFYUN_ASR_FILE_FRAME_GAP_MS", "5")) / 1000
+        
+        # 会话截止时间（首结果 / 静默 / 总时长）
+        self.watchdog = watchdog or get_shared_asr_watchdog()
+        
+        # 预建连接（已签名、已完成握手），识别请求取到后立即发送首帧
+        self.connection_pool = get_shared_asr_pool(self)
+        
         if not all([self.app_id, self.api_key, self.api_secret]):
             logger.warning("科大讯飞ASR配置不完整，请检查环境变量")
     
@@ -135,11 +148,9 @@ class XFYunASRClient:
         
         try:
             logger.info("开始ASR预热...")
-            websocket_url = self._build_websocket_url()
-            logger.debug(f"ASR连接URL: {websocket_url[:100]}...")
             
-            # 尝试建立WebSocket连接进行预热
-            async with websockets.connect(websocket_url) as websocket:
+            # 尝试建立WebSocket连接进行预热（同时缓存DNS解析结果）
+            async with self.connection_pool.connection() as websocket:
                 logger.info("ASR预热WebSocket连接成功")
                 
                 # 发送首帧进行握手测试
@@ -180,16 +191,19 @@ class XFYunASRClient:
             elif "Invalid handshake response" in str(e):
                 logger.error("ASR握手失败，可能是URL或参数问题")
     
-    async def speech_to_text(self, audio_stream: AsyncGenerator[bytes, None]) -> AsyncGenerator[dict, None]:
-        """语音转文字流式识别"""
+    async def speech_to_text(self, audio_stream: AsyncGenerator[bytes, None],
+                             realtime: bool = False) -> AsyncGenerator[dict, None]:
+        """
+        语音转文字流式识别
+        realtime=False（文件模式）：音频重新切成大帧，以最小间隔尽快发送
+        realtime=True（实时模式）：按原始分块发送，发送进度不超过音频本身的时长（麦克风流）
+        """
         if not all([self.app_id, self.api_key, self.api_secret]):
             logger.error("科大讯飞ASR配置不完整")
             return
         
-        websocket_url = self._build_websocket_url()
-        
         try:
-            async with websockets.connect(websocket_url) as websocket:
+            async with self.connection_pool.connection() as websocket:
                 logger.info("ASR WebSocket连接成功")
                 
                 # 发送首帧
@@ -199,7 +213,7 @@ class XFYunASRClient:
                 
                 # 启动发送任务在后台运行
                 send_task = asyncio.create_task(
-                    self._send_audio_data(websocket, audio_stream)
+                    self._send_audio_data(websocket, audio_stream, realtime)
                 )
                 
                 # 直接处理接收结果
@@ -225,40 +239,85 @@ class XFYunASRClient:
             logger.error(f"ASR识别错误: {e}")
             yield {"error": str(e)}
     
-    async def _send_audio_data(self, websocket, audio_stream: AsyncGenerator[bytes, None]):
+    async def _file_frames(self, audio_stream: AsyncGenerator[bytes, None]) -> AsyncGenerator[bytes, None]:
+        """文件模式：把输入音频按 file_frame_bytes 重新切帧（整段输入时不拷贝）"""
+        frame_bytes = self.file_frame_bytes
+        pending = b""
+        async for chunk in audio_stream:
+            data = memoryview(pending + bytes(chunk) if pending else chunk)
+            usable = len(data) - len(data) % frame_bytes
+            for offset in range(0, usable, frame_bytes):
+                yield data[offset:offset + frame_bytes]
+            pending = bytes(data[usable:])
+        if pending:
+            yield pending
+    
+    async def _send_audio_data(self, websocket, audio_stream: AsyncGenerator[bytes, None], realtime: bool = False):
         """发送音频数据"""
         try:
             frame_count = 0
-            async for audio_chunk in audio_stream:
+            sent_bytes = 0
+            bytes_per_second = self.sample_rate * 2
+            started = time.monotonic()
+            frames = audio_stream if realtime else self._file_frames(audio_stream)
+            async for audio_chunk in frames:
                 if audio_chunk:
                     frame_count += 1
                     # 发送音频帧
                     audio_frame = self._create_audio_frame(audio_chunk, status=1)
                     await websocket.send(audio_frame)
+                    sent_bytes += len(audio_chunk)
                     logger.debug(f"已发送音频帧 #{frame_count}: {len(audio_chunk)} bytes")
                     
-                    # 控制发送频率，避免过快
-                    await asyncio.sleep(0.04)  # 40ms间隔
+                    if realtime:
+                        # 实时模式：发送进度不超过已发送音频的时长
+                        ahead = sent_bytes / bytes_per_second - (time.monotonic() - started)
+                        if ahead > 0:
+                            await asyncio.sleep(ahead)
+                    elif self.file_frame_gap:
+                        await asyncio.sleep(self.file_frame_gap)
             
             # 发送结束帧
             end_frame = self._create_audio_frame(b"", status=2)
             await websocket.send(end_frame)
-            logger.info("已发送ASR结束帧")
+            logger.info(f"已发送ASR结束帧（{'实时' if realtime else '文件'}模式: {frame_count}帧, "
+                        f"{sent_bytes / bytes_per_second:.1f}s音频, 用时{(time.monotonic() - started) * 1000:.0f}ms）")
             
         except Exception as e:
             logger.error(f"发送音频数据错误: {e}")
     
     async def _receive_results(self, websocket) -> AsyncGenerator[dict, None]:
-        """接收识别结果"""
+        """
+        接收识别结果，按动态修正（wpgs）语义拼装
+        每次产出当前完整文本 text 和不会再被修订的稳定前缀 stable_text
+        超过看门狗截止时间时产出已有的部分结果（is_final=True, timed_out=True）并结束
+        """
+        transcript = WpgsTranscript()
+        deadlines = self.watchdog.start_session()
+        outcome = "closed"
         try:
             while True:
-                response = await websocket.recv()
+                timeout, kind = deadlines.next_timeout()
+                try:
+                    response = await asyncio.wait_for(websocket.recv(), timeout)
+                except asyncio.TimeoutError:
+                    outcome = kind
+                    logger.warning(f"⏱️  ASR会话超时（{kind}），返回部分结果: {transcript.text}")
+                    yield {
+                        "text": transcript.text,
+                        "stable_text": transcript.stable_text,
+                        "is_final": True,
+                        "timed_out": True,
+                        "timeout": kind
+                    }
+                    break
                 result = json.loads(response)
                 
                 logger.debug(f"收到ASR响应: {result}")
                 
                 # 检查错误
                 if result.get('code') != 0:
+                    outcome = "error"
                     error_msg = result.get('message', 'Unknown error')
                     logger.error(f"ASR识别错误: code={result.get('code')}, message={error_msg}")
                     yield {"error": error_msg, "code": result.get('code')}
@@ -266,24 +325,23 @@ class XFYunASRClient:
                 
                 # 处理识别结果
                 data = result.get('data', {})
+                deadlines.activity(bool(data and data.get('result', {}).get('ws')))
                 if data:
-                    # 解析识别文本
                     ws_results = data.get('result', {}).get('ws', [])
-                    if ws_results:
-                        text_parts = []
-                        for ws in ws_results:
-                            for cw in ws.get('cw', []):
-                                text_parts.append(cw.get('w', ''))
-                        
-                        if text_parts:
-                            recognized_text = ''.join(text_parts)
-                            
-                            yield {
-                                "text": recognized_text,
-                                "is_final": data.get('status') == 2,  # status=2表示最终结果
-                                "confidence": ws_results[0].get('cw', [{}])[0].get('wp', 'normal') if ws_results else 'normal',
-                                "raw_data": result
-                            }
+                    is_final = data.get('status') == 2  # status=2表示最终结果
+                    transcript.apply(data.get('result', {}), final=is_final)
+                    if is_final:
+                        outcome = "completed"
+                    
+                    # 有新文本或识别结束（结束帧可能不带文本）时产出完整结果
+                    if ws_results or is_final:
+                        yield {
+                            "text": transcript.text,
+                            "stable_text": transcript.stable_text,
+                            "is_final": is_final,
+                            "confidence": ws_results[0].get('cw', [{}])[0].get('wp', 'normal') if ws_results else 'normal',
+                            "raw_data": result
+                        }
                 
                 # 检查是否结束
                 if data.get('status') == 2:
@@ -293,8 +351,11 @@ class XFYunASRClient:
         except websockets.exceptions.ConnectionClosed:
             logger.info("ASR WebSocket连接已关闭")
         except Exception as e:
+            outcome = "error"
             logger.error(f"接收ASR结果错误: {e}")
             yield {"error": str(e)}
+        finally:
+            deadlines.finish(outcome)
     
     def set_language(self, language: str):
         """设置识别语言"""